@@ -0,0 +1,193 @@
+# sqlite -> index of archived pages
+import sqlite3
+import datetime
+import gzip
+import logging
+import os
+import threading
+import uuid
+from collections import namedtuple
+
+from http_cache import digest_of
+from paths import data_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# raw pages -> data/archive/pages-<time>-<pid>.warc.gz, indexed in data/archive/index.sqlite
+ARCHIVE_FOLDER = f"{data_folder}/archive"
+
+# a segment is closed and a new one started past this size, in bytes
+DEFAULT_SEGMENT_SIZE = 1024 * 1024 * 1024
+
+# location of an archived page
+ArchivedPage = namedtuple('ArchivedPage', ['url', 'fetched_at', 'digest', 'segment', 'offset', 'length'])
+
+
+def warc_record(url: str, html: str, fetched_at: str, digest: str) -> bytes:
+    """
+    Build a WARC/1.1 resource record of the page, readable by any warc tool.
+    """
+    body = html.encode('utf-8')
+    headers = [
+        'WARC/1.1',
+        'WARC-Type: resource',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f'WARC-Target-URI: {url}',
+        f'WARC-Date: {fetched_at}',
+        f'WARC-Payload-Digest: sha256:{digest}',
+        'Content-Type: text/html; charset=utf-8',
+        f'Content-Length: {len(body)}',
+    ]
+    return '\r\n'.join(headers).encode('utf-8') + b'\r\n\r\n' + body + b'\r\n\r\n'
+
+
+class PageArchive:
+    """
+    Append-only archive of every fetched page, for offline re-parsing.
+
+    Pages are appended to WARC segments as separate gzip members, so any
+    record can be read back with a single seek. Every process writes its own
+    segment; the sqlite index maps (url, fetch time) to the record. A page
+    identical to the last archived version of its url is only indexed again,
+    not stored twice.
+    """
+
+    def __init__(self, folder=ARCHIVE_FOLDER, segment_size=DEFAULT_SEGMENT_SIZE):
+        """
+        Initialize the PageArchive instance.
+
+        Parameters:
+        - folder (str): Folder of the segments and the index.
+        - segment_size (int): Size in bytes after which a new segment is started.
+        """
+        self._folder = folder
+        self.segment_size = segment_size
+
+        os.makedirs(folder, exist_ok=True)
+
+        # fetchers run in worker threads -> one connection and one segment behind a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(folder, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+        ''')
+        self._conn.commit()
+
+        # segment of this process, opened on the first write
+        self._segment = None
+        self._file = None
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(DISTINCT url) FROM pages').fetchone()[0]
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._segment = f"pages-{datetime.datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}.warc.gz"
+        self._file = open(os.path.join(self._folder, self._segment), 'ab')
+
+    def add(self, url: str, html: str):
+        """
+        Archive a fetched page.
+        """
+        digest = digest_of(html)
+        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='microseconds')
+
+        with self._lock:
+            last = self._latest(url)
+
+            if last is not None and last.digest == digest:
+                # same content -> point at the stored record
+                segment, offset, length = last.segment, last.offset, last.length
+            else:
+                if self._file is None or self._file.tell() >= self.segment_size:
+                    self._open_segment()
+
+                # a gzip member per record -> random access by offset
+                record = gzip.compress(warc_record(url, html, fetched_at, digest), compresslevel=6)
+                segment, offset, length = self._segment, self._file.tell(), len(record)
+                self._file.write(record)
+                self._file.flush()
+
+            with self._conn:
+                self._conn.execute(
+                    'INSERT INTO pages (url, fetched_at, digest, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, fetched_at, digest, segment, offset, length))
+
+    def _latest(self, url, at=None):
+        query = 'SELECT url, fetched_at, digest, segment, offset, length FROM pages WHERE url = ?'
+        params = (url,)
+        if at is not None:
+            query += ' AND fetched_at <= ?'
+            params += (at,)
+        row = self._conn.execute(query + ' ORDER BY fetched_at DESC LIMIT 1', params).fetchone()
+        return ArchivedPage(*row) if row is not None else None
+
+    def read(self, page: ArchivedPage) -> str:
+        """
+        Read the html of an archived page.
+        """
+        with open(os.path.join(self._folder, page.segment), 'rb') as f:
+            f.seek(page.offset)
+            record = gzip.decompress(f.read(page.length))
+
+        body = record.split(b'\r\n\r\n', 1)[1]
+        return body[:-4].decode('utf-8')
+
+    def get(self, url: str, at=None):
+        """
+        Get the html of the url as last archived, or as archived at a given time.
+
+        Parameters:
+        - url (str): The url of the page.
+        - at (str): ISO time (utc), the version archived last before it.
+
+        Returns:
+        - str or None: The html, None if the url was never archived.
+        """
+        with self._lock:
+            page = self._latest(url, at)
+        return self.read(page) if page is not None else None
+
+    def latest(self, like='%'):
+        """
+        Iterate over the last archived version of every url.
+
+        Parameters:
+        - like (str): sql LIKE pattern of the urls, e.g. '%posel.xsp?id=%'.
+
+        Yields:
+        - ArchivedPage: Location of the page, read it with read().
+        """
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT url, MAX(fetched_at), digest, segment, offset, length
+                FROM pages WHERE url LIKE ? GROUP BY url ORDER BY segment, offset
+            ''', (like,)).fetchall()
+
+        for row in rows:
+            yield ArchivedPage(*row)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._conn.close()
+        logging.info(f"Closed page archive, last segment: {self._segment}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
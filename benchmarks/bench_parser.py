@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of MP profile page parsing over saved fixture pages.
+
+Compares the legacy path of main.scrape_mp_data (Scraper built the political
+and personal info in its constructor, then main built both again) with the
+single-pass parser backends of page_parser.
+
+Run from the repository root:
+    python -m benchmarks.bench_parser
+"""
+import argparse
+import glob
+import os
+import timeit
+
+from page_parser import PARSERS, parse_mp_page
+from paths import fixtures_folder
+from scraper import Scraper
+
+# ------------------------------------ < ------------------------------------ #
+
+
+def load_fixtures(pattern='posel_*.html'):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(fixtures_folder, pattern))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def legacy_parse(html):
+    # old Scraper.__init__ parsed everything once, main parsed it again
+    scraper = Scraper(html)
+    scraper.get_political_info()
+    scraper.get_personal_info()
+
+    scraper = Scraper(html)
+    political_info = scraper.get_political_info()
+    personal_info = scraper.get_personal_info()
+    return political_info, personal_info, scraper.get_email_address()
+
+
+def available_backends():
+    backends = []
+    for backend in PARSERS:
+        try:
+            parse_mp_page('<html></html>', backend)
+        except ImportError:
+            continue
+        except Exception:
+            pass
+        backends.append(backend)
+    return backends
+
+
+def check_results(pages, backends):
+    """
+    Check that every backend extracts the same fields as the legacy path.
+    """
+    for name, html in pages.items():
+        political_info, personal_info, email = legacy_parse(html)
+        for backend in backends:
+            page = parse_mp_page(html, backend)
+            if (page.get_political_info(), page.get_personal_info(), page.email) != (political_info, personal_info, email):
+                raise AssertionError(f"{backend} result differs from legacy for {name}")
+            if page.get_expiration_info() != Scraper(html).get_expiration_info():
+                raise AssertionError(f"{backend} expiration info differs from legacy for {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    if not pages:
+        raise SystemExit(f"No fixture pages in {fixtures_folder}")
+
+    backends = available_backends()
+    check_results(pages, backends)
+
+    candidates = [('legacy', legacy_parse)] + \
+        [(backend, lambda html, backend=backend: parse_mp_page(html, backend)) for backend in backends]
+
+    print(f"{len(pages)} pages, best of {args.repeat} x {args.number} passes")
+
+    baseline = None
+    for name, parse in candidates:
+        timer = timeit.Timer(lambda: [parse(html) for html in pages.values()])
+        best = min(timer.repeat(repeat=args.repeat, number=args.number))
+        per_page = best / args.number / len(pages) * 1000
+
+        baseline = baseline or per_page
+        print(f"{name:>12}: {per_page:8.3f} ms/page  {baseline / per_page:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
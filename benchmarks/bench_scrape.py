@@ -0,0 +1,278 @@
+"""
+End-to-end scrape benchmark against a local mock of sejm.gov.pl.
+
+Starts benchmarks.mock_server, then runs main's serial and concurrent
+scraping paths for every fetcher/parser/mode combination, each in a fresh
+process with its own temporary store, and reports pages/sec, p50/p99 fetch
+latency, CPU per page and peak RSS. Results are written as JSON to
+benchmarks/results/; --compare checks them against an earlier file and
+exits with 1 on a regression.
+
+Run from the repository root:
+    python -m benchmarks.bench_scrape --pages 200 --latency 0.02
+    python -m benchmarks.bench_scrape --compare benchmarks/results/scrape_<time>.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_parser import available_backends
+from benchmarks.mock_server import MockSejm
+from paths import current_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+RESULTS_FOLDER = os.path.join(current_folder, 'benchmarks', 'results')
+
+# mode -> main.py options
+MODES = {
+    'serial': ['--concurrency', '1'],
+    'concurrent': ['--concurrency', '{concurrency}'],
+    'pool': ['--concurrency', '{concurrency}', '--parse-workers', '{parse_workers}'],
+}
+
+# metrics compared by --compare -> True if higher is better
+COMPARED = {'pages_per_sec': True, 'cpu_ms_per_page': False}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+# ---------------------------------- child ----------------------------------- #
+
+
+class TimingFetcher:
+    """
+    Wraps a fetcher, records the latency of every fetch.
+    """
+
+    def __init__(self, fetcher):
+        self._fetcher = fetcher
+        self.name = fetcher.name
+        self.cache = fetcher.cache
+        self.latencies = []
+        self.failures = 0
+
+    def fetch(self, url):
+        start = time.perf_counter()
+        try:
+            html = self._fetcher.fetch(url)
+        except Exception:
+            self.failures += 1
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        return html
+
+    def close(self):
+        self._fetcher.close()
+
+
+def run_combination(options):
+    """
+    Scrape the mock site once with main's code paths, in this process.
+
+    Returns:
+    - dict: Metrics of the run.
+    """
+    # SEJM_URL is set by the parent -> imported here, after it
+    import main
+    import registry
+    from checkpoint import Checkpoint
+    from fetcher import create_fetcher
+    from metrics import metrics
+    from store import ResultStore
+
+    folder = tempfile.mkdtemp(prefix='bench_scrape_')
+
+    # listing of the mock site, cached apart from the real one
+    registry.registry = registry.MPRegistry(folder=folder)
+    args = main.parse_args(options['argv'])
+    tasks = [(9, mp_id) for mp_id in registry.get_mp_ids(9, 'A')][:options['pages']]
+
+    store = ResultStore(os.path.join(folder, 'mps.sqlite'), csv_path=os.path.join(folder, 'none.csv'))
+    checkpoint = Checkpoint(store.path)
+    fetcher = TimingFetcher(create_fetcher(args.fetcher, browsers=args.browsers, page_load_strategy=args.page_load,
+                                           pool_size=max(args.concurrency, 10)))
+
+    metrics.reset()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    try:
+        if args.concurrency > 1 or args.parse_workers:
+            asyncio.run(main.crawl_mp_data(tasks, fetcher, store, checkpoint, args))
+        else:
+            main.scrape_serially(tasks, fetcher, store, checkpoint, args)
+    finally:
+        seconds = time.perf_counter() - start
+        fetcher.close()
+        checkpoint.close()
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (self_usage.ru_utime - usage.ru_utime + self_usage.ru_stime - usage.ru_stime +
+           children.ru_utime + children.ru_stime)
+
+    pages = len(store)
+    store.close()
+
+    latencies = sorted(latency * 1000 for latency in fetcher.latencies)
+    return {
+        'pages': pages,
+        'failed_fetches': fetcher.failures,
+        'seconds': round(seconds, 3),
+        'pages_per_sec': round(pages / seconds, 2) if seconds else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+        'cpu_ms_per_page': round(cpu * 1000 / pages, 3) if pages else None,
+        # kilobytes on linux
+        'peak_rss_mb': round(max(self_usage.ru_maxrss, children.ru_maxrss) / 1024, 1),
+        # where the time went, from the scrape loop instrumentation
+        'stages': metrics.stage_totals(),
+    }
+
+
+# ---------------------------------- parent ---------------------------------- #
+
+
+def run_in_child(base_url, fetcher, parser, mode, args):
+    """
+    Run a combination in a fresh interpreter, so its cpu and memory are its own.
+    """
+    argv = ['--fetcher', fetcher, '--parser', parser, '--rate', str(args.rate), '--per-host', str(args.concurrency),
+            '--delay', '0', '--no-cache', '--no-archive']
+    argv += [option.format(concurrency=args.concurrency, parse_workers=args.parse_workers) for option in MODES[mode]]
+
+    options = {'argv': argv, 'pages': args.pages}
+    env = {**os.environ, 'SEJM_URL': base_url}
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench_scrape', '--child', json.dumps(options)],
+                               cwd=current_folder, env=env, capture_output=True, text=True, timeout=args.timeout)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=current_folder,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print the change of every compared metric, return the regressions.
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['fetcher'], r['parser'], r['mode']): r for r in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        key = (result['fetcher'], result['parser'], result['mode'])
+        old = baseline.get(key)
+        if old is None or 'error' in result or 'error' in old:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            if not old.get(metric) or result.get(metric) is None:
+                continue
+            change = result[metric] / old[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > tolerance else ''
+            print(f"{'/'.join(key):>28} {metric:>16}: {old[metric]:>9} -> {result[metric]:>9} {change:+7.1%} {flag}")
+            if flag:
+                regressions.append((key, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--fetchers', type=lambda value: value.split(','), default=['http'],
+                        help="comma separated fetcher backends, 'browser' needs chrome")
+    parser.add_argument('--parsers', type=lambda value: value.split(','), default=None,
+                        help="comma separated parser backends (default all installed)")
+    parser.add_argument('--modes', type=lambda value: value.split(','), default=['serial', 'concurrent'],
+                        help=f"comma separated modes: {', '.join(MODES)}")
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=1000.0,
+                        help="politeness budget of the scraper, requests per second")
+    parser.add_argument('--latency', type=float, default=0.02, help="mean latency of the mock server in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument('--rate-limit', type=float, default=None, help="requests per second before 429s")
+    parser.add_argument('--timeout', type=float, default=600, help="seconds a single combination may take")
+    parser.add_argument('--output', default=None, help="results file (default benchmarks/results/scrape_<time>.json)")
+    parser.add_argument('--compare', default=None, help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed relative change before a regression")
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_combination(json.loads(args.child))))
+        return
+
+    server = MockSejm(('127.0.0.1', 0), mps=max(args.pages, 1), latency=args.latency,
+                      error_rate=args.error_rate, rate_limit=args.rate_limit).start()
+
+    parsers = args.parsers or available_backends()
+    print(f"{args.pages} pages from {server.url}, latency {args.latency * 1000:.0f} ms, "
+          f"error rate {args.error_rate:.0%}, rate limit {args.rate_limit or '-'}")
+
+    results = []
+    try:
+        for fetcher in args.fetchers:
+            for parser_backend in parsers:
+                for mode in args.modes:
+                    result = {'fetcher': fetcher, 'parser': parser_backend, 'mode': mode}
+                    try:
+                        result.update(run_in_child(server.url, fetcher, parser_backend, mode, args))
+                    except Exception as e:
+                        result['error'] = str(e)
+                        print(f"{fetcher:>8} {parser_backend:>10} {mode:>10}: failed ({e})")
+                    else:
+                        print(f"{fetcher:>8} {parser_backend:>10} {mode:>10}: {result['pages_per_sec']:8.1f} pages/s  "
+                              f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+                              f"cpu {result['cpu_ms_per_page']:6.2f} ms/page  rss {result['peak_rss_mb']:6.1f} MB")
+                    results.append(result)
+    finally:
+        server.stop()
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'server': {'pages': args.pages, 'latency': args.latency, 'error_rate': args.error_rate,
+                   'rate_limit': args.rate_limit, 'requests': server.requests, 'errors': server.errors,
+                   'throttled': server.throttled},
+        'scraper': {'concurrency': args.concurrency, 'parse_workers': args.parse_workers, 'rate': args.rate},
+        'results': results,
+    }
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f"scrape_{datetime.datetime.now():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
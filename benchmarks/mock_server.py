@@ -0,0 +1,188 @@
+"""
+Local mock of sejm.gov.pl for benchmarks, serves the recorded fixture pages.
+
+Serves the MP listing (poslowie.xsp?type=A, an empty type=B) and a profile
+page (posel.xsp?id=) for every id, cycling through the fixture pages, with
+configurable latency, error rate and rate limiting.
+
+Run from the repository root:
+    python -m benchmarks.mock_server --port 8800 --latency 0.02
+then point the scraper at it with SEJM_URL=http://127.0.0.1:8800
+"""
+import argparse
+import glob
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from paths import fixtures_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+PATH_RE = re.compile(r'^/Sejm(\d+)\.nsf/(poslowie|posel)\.xsp$')
+
+
+def listing_html(ids):
+    items = '\n'.join(f'<li><a href="/Sejm9.nsf/posel.xsp?id={mp_id}&amp;type=A">{mp_id}</a></li>' for mp_id in ids)
+    return f'<html><body><div id="contentBody"><ul class="deputies">\n{items}\n</ul></div></body></html>'
+
+
+class MockSejm(ThreadingHTTPServer):
+    """
+    Threaded http server with the behaviour knobs of the benchmark.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, mps=460, latency=0.0, jitter=0.5, error_rate=0.0, rate_limit=None,
+                 fixtures=fixtures_folder):
+        """
+        Initialize the MockSejm instance.
+
+        Parameters:
+        - address (tuple): (host, port), port 0 picks a free one.
+        - mps (int): Number of MPs on the listing.
+        - latency (float): Mean seconds before a response is sent.
+        - jitter (float): Latency varies uniformly by this fraction around the mean.
+        - error_rate (float): Share of requests answered with a 503.
+        - rate_limit (float): Requests per second above which a 429 with Retry-After is sent.
+        - fixtures (str): Folder of the recorded posel_*.html pages.
+        """
+        super().__init__(address, MockHandler)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+
+        self.ids = [f'{i:03d}' for i in range(1, mps + 1)]
+        self.pages = []
+        for path in sorted(glob.glob(os.path.join(fixtures, 'posel_*.html'))):
+            with open(path, encoding='utf-8') as f:
+                self.pages.append(f.read().encode('utf-8'))
+        if not self.pages:
+            raise FileNotFoundError(f"No fixture pages in {fixtures}")
+
+        # token bucket of the rate limit
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+
+        # counters, for the report
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def admit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit is None:
+                return True
+            now = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def page(self, mp_id) -> bytes:
+        return self.pages[int(mp_id) % len(self.pages)]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='mock-sejm', daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    # headers and body are separate writes -> no delayed ack stall on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        if body:
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(1 - server.jitter, 1 + server.jitter))
+
+        if not server.admit():
+            return self.send_body(429, headers=[('Retry-After', '1')])
+
+        if server.error_rate and random.random() < server.error_rate:
+            server.errors += 1
+            return self.send_body(503)
+
+        parts = urlsplit(self.path)
+        match = PATH_RE.match(parts.path)
+        query = parse_qs(parts.query)
+        if match is None:
+            return self.send_body(404)
+
+        if match.group(2) == 'poslowie':
+            body = listing_html(server.ids if query.get('type') == ['A'] else []).encode('utf-8')
+        else:
+            mp_id = query.get('id', [''])[0]
+            if mp_id not in server.ids:
+                return self.send_body(404)
+            body = server.page(mp_id)
+
+        # validators -> the http cache path can be measured too
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.send_body(304, headers=[('ETag', etag)])
+        self.send_body(200, body, headers=[('ETag', etag)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--mps', type=int, default=460)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=None)
+    args = parser.parse_args()
+
+    server = MockSejm((args.host, args.port), args.mps, args.latency, error_rate=args.error_rate,
+                      rate_limit=args.rate_limit)
+    print(f"Serving {len(server.ids)} MPs on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Reproducible profile of parsing and persistence over the saved fixture pages.
+
+Replays benchmarks/fixtures through the parsing paths (the Scraper classes
+PoliticalInfo/PersonalInfo/ClubInfo and the single-pass page_parser
+backends) and the persistence paths (ResultStore, the df.py DataFrame and
+its csv), into a temporary store, under profiling.Profiler. The same
+fixtures give comparable profiles across versions.
+
+Run from the repository root:
+    python -m benchmarks.profile_pipeline --repeat 100 --profile cpu,memory
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+
+import df
+from benchmarks.bench_parser import available_backends, load_fixtures
+from mp import MP
+from page_parser import parse_mp_page
+from paths import current_folder
+from profiling import Profiler, parse_profilers
+from scraper import Scraper
+from store import ResultStore
+
+# ------------------------------------ < ------------------------------------ #
+
+RESULTS_FOLDER = os.path.join(current_folder, 'benchmarks', 'results')
+
+
+def replay(pages, repeat, parsers, folder):
+    """
+    Parse every fixture `repeat` times with every parser, persist the records.
+    """
+    store = ResultStore(os.path.join(folder, 'mps.sqlite'), csv_path=os.path.join(folder, 'none.csv'))
+    mps_df = df.load_df(os.path.join(folder, 'none.csv'))
+
+    try:
+        for i in range(repeat):
+            for j, (name, html) in enumerate(pages.items()):
+                mp_index = f'{(i * len(pages) + j) % 1000:03d}'
+
+                # legacy classes
+                scraper = Scraper(html)
+                scraper.get_political_info()
+                scraper.get_personal_info()
+                scraper.get_email_address()
+
+                for parser in parsers:
+                    mp = MP.from_page(mp_index, name, parse_mp_page(html, parser))
+
+                store.add(mp.to_row())
+                if i == 0:
+                    mps_df = df.insert_mp_to_df(mp, mps_df)
+
+        df.save_df_to_csv(mps_df, os.path.join(folder, 'mps.csv'))
+        store.export_csv(os.path.join(folder, 'store.csv'))
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help="passes over the fixture pages")
+    parser.add_argument('--parsers', type=lambda value: value.split(','), default=None,
+                        help="comma separated parser backends (default all installed)")
+    parser.add_argument('--profile', type=parse_profilers, default=['cpu', 'memory'], metavar='cpu,memory,sample')
+    parser.add_argument('--output', default=None, help="report folder (default benchmarks/results/profile_<commit>)")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    parsers = args.parsers or available_backends()
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=current_folder,
+                            capture_output=True, text=True).stdout.strip() or 'unknown'
+    output = args.output or os.path.join(RESULTS_FOLDER, f'profile_{commit}')
+
+    with tempfile.TemporaryDirectory(prefix='profile_pipeline_') as folder:
+        with Profiler(args.profile, output):
+            replay(pages, args.repeat, parsers, folder)
+
+    print(f"{len(pages)} pages x {args.repeat} passes, parsers: {', '.join(parsers)}; reports in {output}")
+
+
+if __name__ == '__main__':
+    main()
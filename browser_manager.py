@@ -7,15 +7,100 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from random_user_agent.user_agent import UserAgent
 from random_user_agent.params import SoftwareName, OperatingSystem, Popularity, HardwareType
-from selenium.webdriver.common.proxy import Proxy, ProxyType
-from browsermobproxy import Server
+
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from paths import cache_folder
+from proxies import proxy_name
+
+# ------------------------------------ < ------------------------------------ #
+
+# chromedriver path -> resolved once, then read from here (no network on startup)
+DRIVER_PATH_CACHE = f"{cache_folder}/chromedriver.json"
+
+# a browser is quit and replaced after this many pages, chrome grows with every page
+DEFAULT_RECYCLE_AFTER = 100
+
+# 'normal' waits for every subresource, 'eager' for the dom, 'none' for nothing
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+# requests blocked through the devtools protocol -> only documents and scripts are loaded
+BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico', '*.bmp',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp3', '*.mp4', '*.webm', '*.pdf',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+]
+
+# seconds to wait for the expected elements of a page
+DEFAULT_WAIT_TIMEOUT = 10
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path(refresh=False) -> str:
+    """
+    Get the path of the chromedriver executable.
+
+    `CHROMEDRIVER_PATH` from the environment wins; otherwise the path installed
+    by webdriver_manager is cached on disk, so later runs start without a
+    version check and work offline. Use refresh=True after a chrome update.
+    """
+    global _driver_path
+
+    with _driver_path_lock:
+        if os.environ.get('CHROMEDRIVER_PATH'):
+            return os.environ['CHROMEDRIVER_PATH']
+
+        if _driver_path is not None and not refresh:
+            return _driver_path
+
+        if not refresh:
+            try:
+                with open(DRIVER_PATH_CACHE, encoding='utf-8') as f:
+                    path = json.load(f)['path']
+                if os.path.isfile(path):
+                    _driver_path = path
+                    return path
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+        path = ChromeDriverManager().install()
+
+        os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+        with open(DRIVER_PATH_CACHE, 'w', encoding='utf-8') as f:
+            json.dump({'path': path}, f)
+
+        _driver_path = path
+        return path
 
 
 class Browser():
 
+    # user agent rotator -> loading its data is slow, shared by all browsers
+    _user_agent_rotator = None
+
     # -------------------------------- constructor ------------------------------- #
 
-    def __init__(self):
+    def __init__(self, user_agent=None, proxy=None, page_load_strategy='eager', block_resources=True):
+        """
+        Start a headless chrome.
+
+        Parameters:
+        - user_agent (str): User agent of the browser, a random one by default.
+        - proxy (str): Proxy url of the browser, e.g. 'http://host:3128'.
+        - page_load_strategy (str): When driver.get returns, see PAGE_LOAD_STRATEGIES.
+        - block_resources (bool): Do not load images, stylesheets, fonts, media and trackers.
+        """
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError(
+                f"Invalid page load strategy: {page_load_strategy}. It should be one of {PAGE_LOAD_STRATEGIES}.")
 
         # ---------------------------------- options --------------------------------- #
         # create options
@@ -24,54 +109,211 @@ class Browser():
         # add headless mode
         self.options.add_argument('--headless')
 
-        # -------------------------------- user agent -------------------------------- #
-        # create user agent rotator
-        self.user_agent_rotator = UserAgent()
+        # return from driver.get before subresources are loaded -> see get()
+        self.page_load_strategy = page_load_strategy
+        self.options.page_load_strategy = page_load_strategy
 
+        # images are also switched off in the profile, the devtools block list covers the rest
+        self.block_resources = block_resources
+        if block_resources:
+            self.options.add_experimental_option(
+                'prefs', {'profile.managed_default_content_settings.images': 2})
+            self.options.add_argument('--blink-settings=imagesEnabled=false')
+
+        # -------------------------------- user agent -------------------------------- #
         # set user agent parameters -> software_names, operating_systems, popularity, hardware_type
         self.software_names = [SoftwareName.CHROME.value]
         self.operating_systems = [OperatingSystem.WINDOWS.value]
         self.popularity = [Popularity.POPULAR.value]
         self.hardware_type = [HardwareType.COMPUTER.value]
 
-        # get random user agent
-        self.random_user_agent = self.get_random_user_agent()
+        # get random user agent -> every browser of a pool gets its own
+        self.random_user_agent = user_agent or self.get_random_user_agent()
 
         # add user agent to options
         self.options.add_argument(f'user-agent={self.random_user_agent}')
 
         # ----------------------------------- proxy ---------------------------------- #
-        # self.proxy_server = self.create_proxy_server()
-        # self.proxy = self.proxy_server.create_proxy()
-        # self.options.add_argument(f'--proxy-server={self.proxy.proxy}')
+        self.proxy = proxy
+        if proxy is not None:
+            # chrome takes no credentials on the command line -> ip whitelisted proxies only
+            if '@' in proxy:
+                logging.warning(f"Chrome ignores the credentials of proxy {proxy_name(proxy)}")
+            self.options.add_argument(f'--proxy-server={proxy_name(proxy)}')
 
         # ---------------------------------- driver ---------------------------------- #
-        # create browser -> autoinstalled chrome
+        # create browser -> cached chromedriver
         self.driver = self.create_driver()
 
+        if block_resources:
+            self.block_requests(BLOCKED_URLS)
+
+        # pages loaded by this browser
+        self.pages = 0
+
     # ---------------------------------- methods --------------------------------- #
 
     def get_random_user_agent(self) -> str:
-        user_agent_rotator = UserAgent(
-            software_names=self.software_names,
-            operating_systems=self.operating_systems,
-            popularity=self.popularity,
-            limit=100
-        )
-        return user_agent_rotator.get_random_user_agent()
+        if Browser._user_agent_rotator is None:
+            Browser._user_agent_rotator = UserAgent(
+                software_names=self.software_names,
+                operating_systems=self.operating_systems,
+                popularity=self.popularity,
+                limit=100
+            )
+        return Browser._user_agent_rotator.get_random_user_agent()
 
     def create_driver(self) -> webdriver.Chrome:
-        # , proxy=self.proxy)
-        return webdriver.Chrome(ChromeDriverManager().install(), options=self.options)
+        return webdriver.Chrome(get_driver_path(), options=self.options)
+
+    def block_requests(self, patterns):
+        # devtools protocol -> requests matching the patterns fail before they are sent
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        except Exception as e:
+            logging.warning(f"Could not block requests through devtools ({e})")
+
+    def get(self, url: str, wait_for=(), timeout=DEFAULT_WAIT_TIMEOUT) -> str:
+        """
+        Load the page, return its rendered html.
+
+        Parameters:
+        - url (str): The url of the page.
+        - wait_for (tuple): Css selectors of elements the page must contain, e.g. ('div.partia', 'div.cv').
+          With the 'eager' and 'none' strategies the page is returned as soon as they are present.
+        - timeout (float): Seconds to wait for them, a TimeoutException is raised after.
+        """
+        self.pages += 1
+        self.driver.get(url)
+
+        if wait_for:
+            WebDriverWait(self.driver, timeout).until(
+                lambda driver: all(driver.find_elements(By.CSS_SELECTOR, selector) for selector in wait_for))
+        elif self.page_load_strategy == 'none':
+            # nothing to wait for -> at least the dom
+            WebDriverWait(self.driver, timeout).until(
+                lambda driver: driver.execute_script('return document.readyState') != 'loading')
+
+        return self.driver.page_source
+
+    def is_alive(self) -> bool:
+        """
+        Check that chrome still responds.
+        """
+        try:
+            return self.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logging.warning(f"Could not quit browser ({e})")
+
+
+class BrowserPool():
+    """
+    Pool of reusable headless chromes.
+
+    Browsers are started lazily, up to `size` of them, and handed out one per
+    caller. A browser that no longer responds is replaced, and every browser
+    is recycled after `recycle_after` pages to cap chrome's memory growth.
+    New browsers get a random user agent and the healthiest proxy of the
+    proxy pool; a browser whose proxy was ejected is replaced.
+    """
+
+    def __init__(self, size=1, recycle_after=DEFAULT_RECYCLE_AFTER, proxy_pool=None, **browser_options):
+        """
+        Initialize the BrowserPool instance.
+
+        Parameters:
+        - size (int): Max number of browsers.
+        - recycle_after (int): Pages a browser loads before it is replaced.
+        - proxy_pool (ProxyPool): Proxies to start browsers with.
+        - browser_options: Passed to Browser, e.g. page_load_strategy, block_resources.
+        """
+        self.size = size
+        self.recycle_after = recycle_after
+        self._proxy_pool = proxy_pool
+        self._browser_options = browser_options
+
+        # lifo -> the most recently used, warm browser is reused first
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._browsers = set()
+
+        # counters, for the logs
+        self.started = 0
+        self.recycled = 0
+
+    def _start(self):
+        proxy = self._proxy_pool.best() if self._proxy_pool is not None else None
+
+        logging.info(f"Starting headless browser {self.started + 1}...")
+        browser = Browser(proxy=proxy, **self._browser_options)
+
+        with self._lock:
+            self._browsers.add(browser)
+            self.started += 1
+        return browser
+
+    def _discard(self, browser):
+        with self._lock:
+            self._browsers.discard(browser)
+        browser.quit()
+
+    def _checkout(self):
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start()
+
+            if browser.proxy is not None and not self._proxy_pool.is_admitted(browser.proxy):
+                logging.info(f"Proxy of browser {proxy_name(browser.proxy)} ejected, replacing it")
+            elif browser.is_alive():
+                return browser
+            else:
+                logging.warning("Browser stopped responding, replacing it")
+            self._discard(browser)
+
+    def _checkin(self, browser):
+        if browser.pages >= self.recycle_after:
+            self._discard(browser)
+            self.recycled += 1
+        else:
+            self._idle.put(browser)
+
+    @contextmanager
+    def browser(self):
+        """
+        Borrow a browser, blocks while all `size` browsers are in use.
+        """
+        self._slots.acquire()
+        browser = None
+        try:
+            browser = self._checkout()
+            yield browser
+        except Exception:
+            # a failed page is not a dead browser, unless it does not respond
+            if browser is not None and not browser.is_alive():
+                self._discard(browser)
+                browser = None
+            raise
+        finally:
+            if browser is not None:
+                self._checkin(browser)
+            self._slots.release()
 
-    # # ------------------------------ static methods ------------------------------ #
+    def close(self):
+        with self._lock:
+            browsers = list(self._browsers)
+            self._browsers.clear()
 
-    @staticmethod
-    def create_proxy_server() -> Server:
-        # anaconda path to /home/gr00stl/anaconda3/lib/python3.9/site-packages/browsermobproxy/browsermob-proxy-2.1.4/bin/browsermob-proxy
-        server = Server(
-            "/home/gr00stl/anaconda3/lib/python3.9/site-packages/browsermobproxy/browsermob-proxy-2.1.4/bin/browsermob-proxy"
-        )
+        for browser in browsers:
+            browser.quit()
 
-        server.start()
-        return server
+        logging.info(f"Closed browser pool, {self.started} browsers started, {self.recycled} recycled")
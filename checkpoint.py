@@ -0,0 +1,163 @@
+# sqlite -> persistent resume index
+import sqlite3
+import datetime
+from collections import namedtuple
+
+from store import STORE_PATH
+from http_cache import digest_of
+
+# ------------------------------------ < ------------------------------------ #
+
+# state of a single MP in the index
+Entry = namedtuple('Entry', ['status', 'scraped_at', 'content_hash', 'error'])
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+def content_hash(html: str) -> str:
+    """
+    Hash the page content, to tell whether a page changed between runs.
+
+    Same as the http cache digest, so cached and indexed pages compare equal.
+    """
+    return digest_of(html)
+
+
+class Checkpoint:
+    """
+    Index of scraped and failed MPs, keyed by (term, id).
+
+    The whole index is loaded once into a dict, so checking whether an MP is
+    done is a dict lookup; every update is committed right away, so a crawl
+    cut off by the site resumes where it stopped.
+    """
+
+    def __init__(self, path=STORE_PATH, table='checkpoint'):
+        """
+        Initialize the Checkpoint instance.
+
+        Parameters:
+        - path (str): Path of the sqlite database, shared with the results store.
+        - table (str): Table of the index, one per kind of crawl (profiles, votes, ...).
+        """
+        self._table = table
+
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                term INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                scraped_at TEXT NOT NULL,
+                content_hash TEXT,
+                error TEXT,
+                PRIMARY KEY (term, id)
+            )
+        ''')
+        self._conn.commit()
+
+        self._entries = {
+            (term, mp_id): Entry(status, scraped_at, hash_, error)
+            for term, mp_id, status, scraped_at, hash_, error
+            in self._conn.execute(f'SELECT term, id, status, scraped_at, content_hash, error FROM {table}')
+        }
+
+        # first run with the index -> records already in the store are done
+        if not self._entries and table == 'checkpoint':
+            self._import_store()
+
+    def _import_store(self):
+        rows = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'mps'").fetchone()
+        if rows is None:
+            return
+
+        with self._conn:
+            for term, mp_id, scraped_at in self._conn.execute('SELECT term, id, scraped_at FROM mps').fetchall():
+                self._put(term, mp_id, Entry(DONE, scraped_at, None, None))
+
+    def _put(self, term, mp_id, entry):
+        self._conn.execute(
+            f'INSERT OR REPLACE INTO {self._table} (term, id, status, scraped_at, content_hash, error) VALUES (?, ?, ?, ?, ?, ?)',
+            (term, mp_id, *entry)
+        )
+        self._entries[(term, mp_id)] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, mp_id, term: int = 9):
+        """
+        Get the index entry of the MP, None if it was never scraped.
+        """
+        return self._entries.get((term, mp_id))
+
+    def is_done(self, mp_id, term: int = 9) -> bool:
+        entry = self._entries.get((term, mp_id))
+        return entry is not None and entry.status == DONE
+
+    def unchanged(self, mp_id, html, term: int = 9) -> bool:
+        """
+        Check whether the MP was scraped from exactly this page content.
+        """
+        entry = self._entries.get((term, mp_id))
+        return entry is not None and entry.status == DONE and entry.content_hash == content_hash(html)
+
+    def mark_done(self, mp_id, html=None, term: int = 9):
+        """
+        Mark the MP as scraped, with the hash of the page it was scraped from.
+        """
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._conn:
+            self._put(term, mp_id, Entry(
+                DONE, now, content_hash(html) if html is not None else None, None))
+
+    def mark_failed(self, mp_id, error, term: int = 9):
+        """
+        Mark the MP as failed, keeping the hash of the last good page.
+        """
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        previous = self._entries.get((term, mp_id))
+        with self._conn:
+            self._put(term, mp_id, Entry(
+                FAILED, now, previous.content_hash if previous else None, str(error)))
+
+    def pending(self, mp_ids, term: int = 9, only_failed=False, stale_after=None):
+        """
+        Select the MPs that still have to be scraped.
+
+        Parameters:
+        - mp_ids (iterable): Candidate MP ids.
+        - term (int): Sejm term of the ids.
+        - only_failed (bool): Only MPs whose last attempt failed.
+        - stale_after (datetime.timedelta): Also MPs scraped longer ago than this.
+
+        Returns:
+        - list: MP ids to scrape, in the order given.
+        """
+        cutoff = None
+        if stale_after is not None:
+            cutoff = (datetime.datetime.now() -
+                      stale_after).isoformat(timespec='seconds')
+
+        pending = []
+        for mp_id in mp_ids:
+            entry = self._entries.get((term, mp_id))
+
+            if only_failed:
+                if entry is not None and entry.status == FAILED:
+                    pending.append(mp_id)
+                continue
+
+            if entry is None or entry.status != DONE:
+                pending.append(mp_id)
+            elif cutoff is not None and entry.scraped_at < cutoff:
+                pending.append(mp_id)
+
+        return pending
+
+    def close(self):
+        self._conn.close()
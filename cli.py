@@ -0,0 +1,110 @@
+# argparse -> options shared by the scrapers (main.py, voting.py, speeches.py)
+import argparse
+import logging
+import os
+from contextlib import contextmanager
+
+# local imports
+from crawler import AsyncCrawler
+from http_cache import HttpCache, DEFAULT_MAX_SIZE
+from fetcher import create_fetcher
+from proxies import ProxyPool, load_proxies
+from paths import logs_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# run log shared by the scrapers
+LOG_PATH = f"{logs_folder}/sejm.log"
+
+
+def setup_logging(path=LOG_PATH):
+    """
+    Log to the run log, call it when a scraper runs, not on import (tests, benchmarks).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    logging.basicConfig(
+        filename=path,
+        level=logging.INFO,
+        format="%(asctime)s:%(levelname)s:%(message)s"
+    )
+
+
+def add_common_args(parser, concurrency=8, concurrency_help="number of pages in flight"):
+    """
+    Add the options every scraper takes: terms, politeness budget, proxies, retries and cache.
+
+    Parameters:
+    - parser (ArgumentParser): Parser of the scraper.
+    - concurrency (int): Default of --concurrency.
+    - concurrency_help (str): Help of --concurrency.
+    """
+    parser.add_argument('--terms', type=lambda value: [int(term) for term in value.split(',')], default=[9],
+                        help="comma separated Sejm terms to scrape, e.g. 8,9")
+    parser.add_argument('--expired', action='store_true',
+                        help="also scrape MPs whose mandate expired")
+    parser.add_argument('--concurrency', type=int, default=concurrency,
+                        help=concurrency_help)
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help="max requests per second")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="max requests in flight to a single host")
+    parser.add_argument('--proxies', metavar='FILE', default=None,
+                        help="file of proxy urls, one per line; --rate and --per-host then apply to every proxy")
+    parser.add_argument('--only-failed', action='store_true',
+                        help="only retry MPs whose last attempt failed")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not use the on-disk http cache")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="max size of the http cache in MB")
+
+
+@contextmanager
+def open_fetcher(args, **options):
+    """
+    Open the http cache, the proxy pool and the fetcher of a run, close them at the end.
+
+    With --proxies every exit has its own --rate, so the overall budget
+    (--rate and --per-host of the crawler) grows with the size of the pool.
+
+    Parameters:
+    - args (Namespace): Parsed options, see add_common_args().
+    - options: Passed to fetcher.create_fetcher, e.g. markers=() for pages rendered server side.
+
+    Yields:
+    - tuple: (fetcher, args) -> args with the budget scaled to the proxy pool.
+    """
+    # http cache shared by all fetchers -> conditional requests for known pages
+    cache = None if args.no_cache else HttpCache(max_size=args.cache_size * 1024 * 1024)
+
+    proxy_pool = None
+    if args.proxies:
+        proxy_pool = ProxyPool(load_proxies(args.proxies), rate=args.rate)
+        args = argparse.Namespace(**{**vars(args), 'rate': args.rate * len(proxy_pool),
+                                     'per_host': args.per_host * len(proxy_pool)})
+
+    # connection pool sized to the concurrency
+    fetcher = None
+    try:
+        fetcher = create_fetcher(args.fetcher, cache=cache, proxy_pool=proxy_pool,
+                                 pool_size=max(args.concurrency, 10), **options)
+        yield fetcher, args
+    finally:
+        # quits browsers if they were started
+        if fetcher is not None:
+            fetcher.close()
+        if proxy_pool is not None:
+            logging.info(f"Proxy state: {proxy_pool.state}")
+        if cache is not None:
+            cache.close()
+
+
+def build_crawler(fetcher, args) -> AsyncCrawler:
+    """
+    Create the crawler of a run within its politeness budget (--concurrency, --rate, --per-host).
+    """
+    return AsyncCrawler(
+        fetcher,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        per_host=args.per_host
+    )
@@ -0,0 +1,194 @@
+# asyncio -> concurrent crawling
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import time
+import logging
+
+from metrics import metrics
+from throttle import AdaptiveThrottle, NoResponseError
+
+# ------------------------------------ < ------------------------------------ #
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all workers, limits the number of requests per second.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Initialize the TokenBucket instance.
+
+        Parameters:
+        - rate (float): Tokens added per second -> requests per second ceiling.
+        - burst (int): Max number of tokens stored -> requests allowed at once.
+        """
+        if rate <= 0:
+            raise ValueError("Invalid rate value. It should be a positive number.")
+
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens +
+                           (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        # lock -> waiting workers are served in order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncCrawler:
+    """
+    Keeps up to `concurrency` requests in flight, within a global politeness budget.
+
+    Fetchers are blocking, so every fetch runs in a worker thread; the token
+    bucket caps the request rate and a semaphore per host caps the number of
+    open requests to a single host. The bucket rate follows the adaptive
+    throttle, so the crawl slows down when the server pushes back.
+    """
+
+    def __init__(self, fetcher, concurrency=8, rate=2.0, per_host=4, burst=1, retries=5, throttle=None):
+        """
+        Initialize the AsyncCrawler instance.
+
+        Parameters:
+        - fetcher (Fetcher): Fetcher used to download pages.
+        - concurrency (int): Max number of jobs in flight.
+        - rate (float): Max requests per second, across all workers.
+        - per_host (int): Max requests in flight to a single host.
+        - burst (int): Max requests started at once.
+        - retries (int): Max attempts per url.
+        - throttle (AdaptiveThrottle): Rate controller, by default starts at `rate` and never exceeds it.
+        """
+        self._fetcher = fetcher
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._retries = retries
+
+        self.throttle = throttle or AdaptiveThrottle(rate=rate, max_rate=rate)
+        self._bucket = TokenBucket(self.throttle.rate, burst)
+        self._host_semaphores = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix='fetch')
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._host_semaphores[host]
+
+    async def fetch(self, url: str) -> str:
+        """
+        Fetch the page within the politeness budget, retrying on errors.
+
+        Parameters:
+        - url (str): The url of the page.
+
+        Returns:
+        - str: The html source of the page.
+        """
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(1, self._retries + 1):
+
+            # wait out the backoff, the host limit and the rate limit -> the wait stage
+            waited = time.perf_counter()
+
+            async with self._host_semaphore(url):
+                while True:
+                    await asyncio.sleep(self.throttle.blocked_for())
+                    self._bucket.rate = self.throttle.rate
+                    await self._bucket.acquire()
+                    # backoff started while waiting for the token -> no request until it is over
+                    if not self.throttle.blocked_for():
+                        break
+
+                waited = time.perf_counter() - waited
+                metrics.observe('stage_seconds', waited, stage='wait')
+                metrics.event('wait', seconds=round(waited, 6), url=url, attempt=attempt)
+
+                start = time.monotonic()
+                try:
+                    with metrics.time('fetch', url=url, attempt=attempt):
+                        html = await loop.run_in_executor(self._executor, self._fetcher.fetch, url)
+                except Exception as e:
+                    metrics.inc('requests_total', outcome='error')
+                    self.throttle.record_failure(e, start)
+                    metrics.set('throttle_rate', round(self.throttle.rate, 3))
+                    if not self.throttle.is_retryable(e):
+                        raise
+                    logging.info(
+                        f"No response from server for {url} ({e}). Retrying...")
+                    continue
+
+                metrics.inc('requests_total', outcome='ok')
+                metrics.inc('bytes_total', len(html))
+                self.throttle.record_success(time.monotonic() - start)
+                metrics.set('throttle_rate', round(self.throttle.rate, 3))
+                return html
+
+        raise NoResponseError(url)
+
+    async def crawl(self, items, job, buffer=0):
+        """
+        Run `job(item)` for every item, with at most `concurrency` jobs in flight.
+
+        Parameters:
+        - items (list): Items to process, e.g. MP ids.
+        - job (coroutine function): Called with a single item.
+        - buffer (int): Max results waiting for the consumer, jobs pause while it is full (default unbounded).
+
+        Yields:
+        - tuple: (item, result, error) in order of completion, error is None on success.
+        """
+        items = list(items)
+
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+
+        # bounded -> a slow consumer holds back the fetchers
+        results = asyncio.Queue(maxsize=buffer)
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await results.put((item, await job(item), None))
+                except Exception as e:
+                    await results.put((item, None, e))
+
+        workers = [asyncio.create_task(worker())
+                   for _ in range(min(self.concurrency, len(items)))]
+
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,12 +3,20 @@ import logging
 
 from paths import data_folder
 
+# columns of the mps dataset, in order
+COLUMNS = ['id', 'name', 'surname', 'link', 'party_list', 'constituency', 'elected_date', 'no_of_votes',
+           'oath_date', 'parliamentary_experience', 'club', 'birth_date', 'education', 'school', 'profession', 'email',
+           'expiration_date', 'expiration_reason', 'expiration_document']
 
-def load_df():
+# default location of the csv
+CSV_PATH = data_folder + '/mps.csv'
+
+
+def load_df(path=CSV_PATH):
 
     # check if mps.csv exists
     try:
-        mps_df = pd.read_csv(data_folder + '/mps.csv', sep=';', encoding='utf-8',
+        mps_df = pd.read_csv(path, sep=';', encoding='utf-8',
                              index_col=0, dtype={'id': str})
 
         # always zfill id to 3 digits
@@ -16,19 +24,18 @@ def load_df():
 
     except FileNotFoundError:
         # create dataframe
-        mps_df = pd.DataFrame(columns=['id', 'name', 'surname', 'link', 'party_list', 'constituency', 'elected_date', 'no_of_votes',
-                                       'oath_date', 'parliamentary_experience', 'club', 'birth_date', 'education', 'school', 'profession', 'email'])
+        mps_df = pd.DataFrame(columns=COLUMNS)
 
     return mps_df
 
 
 # def save df to csv
-def save_df_to_csv(df):
+def save_df_to_csv(df, path=CSV_PATH):
 
     logging.info("Saving df to csv...")
 
     # save df to csv -> data folder
-    df.to_csv(data_folder + '/mps.csv', sep=';', encoding='utf-8', index=True)
+    df.to_csv(path, sep=';', encoding='utf-8', index=True)
 
 
 # check if id already in df['id']
@@ -52,11 +59,11 @@ def insert_mp_to_df(mp, mps_df):
 
     logging.info("Inserting mp to df...")
 
-    # append mp data to mps_df
-    new_df = mps_df.append(mp.to_df, ignore_index=True)
+    # append mp data to mps_df -> DataFrame.append was removed in pandas 2
+    new_df = pd.concat([mps_df, pd.DataFrame([mp.to_row()], columns=COLUMNS)], ignore_index=True)
 
     # log inserting data
-    logging.info("Data inserted successfully for MP: ", mp._name, mp._surname)
+    logging.info(f"Data inserted successfully for MP: {mp.name} {mp.surname}")
 
     # return updated dataframe
     return new_df
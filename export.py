@@ -0,0 +1,175 @@
+# pyarrow -> columnar output, optional
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = feather = pq = None
+
+import json
+import logging
+import os
+import re
+
+import pandas as pd
+
+from mp import DATE_DTYPE, record_schema, records_to_arrow
+from paths import data_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# typed MPs dataset -> data/mps/term=9/mps.parquet
+DATASET_FOLDER = f"{data_folder}/mps"
+
+# bump on every incompatible change of mp.record_schema(), datasets written
+# with another version are refused on load and have to be exported again
+SCHEMA_VERSION = 2
+
+# file metadata key of the schema version
+VERSION_KEY = b'sejm.schema_version'
+
+# output formats -> file name in the term folder
+FORMATS = {'parquet': 'mps.parquet', 'feather': 'mps.arrow'}
+
+TERM_FOLDER_RE = re.compile(r'^term=(\d+)$')
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required to export and load the typed dataset.")
+
+
+def dataset_schema():
+    # term comes from the partition folder
+    schema = record_schema()
+    schema = schema.remove(schema.get_field_index('term'))
+    return schema.with_metadata({VERSION_KEY: str(SCHEMA_VERSION).encode()})
+
+
+def term_path(term, file_format='parquet', folder=DATASET_FOLDER):
+    return os.path.join(folder, f'term={term}', FORMATS[file_format])
+
+
+# ---------------------------------- export ---------------------------------- #
+
+
+def export_term(records, term, file_format='parquet', folder=DATASET_FOLDER, compression=None):
+    """
+    Write the MP records of a term to its partition of the dataset.
+
+    Parameters:
+    - records (iterable or DataFrame): mp.MP records of the term, or their typed
+      DataFrame (mp.records_to_df, normalize.normalize).
+    - term (int): Sejm term, the partition.
+    - file_format (str): 'parquet' (zstd by default) or 'feather' (uncompressed by
+      default, so it can be memory-mapped without a copy).
+    - folder (str): Root folder of the dataset.
+    - compression (str): Override the default compression of the format.
+
+    Returns:
+    - str: Path of the written file.
+    """
+    require_pyarrow()
+
+    if isinstance(records, pd.DataFrame):
+        table = pa.Table.from_pandas(records, preserve_index=False)
+    else:
+        table = records_to_arrow(records)
+    table = table.drop_columns(['term']).cast(dataset_schema())
+
+    path = term_path(term, file_format, folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # write then rename -> readers never see a partial file
+    tmp_path = path + '.tmp'
+    if file_format == 'parquet':
+        pq.write_table(table, tmp_path, compression=compression or 'zstd')
+    else:
+        feather.write_feather(table, tmp_path, compression=compression or 'uncompressed')
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def export_store(store, file_format='parquet', folder=DATASET_FOLDER, terms=None):
+    """
+    Export the results store to the typed dataset, one partition per term.
+    """
+    for term in terms or store.terms():
+        # normalized whole columns at a time, not record by record
+        path = export_term(store.to_typed_df(term), term, file_format, folder)
+        logging.info(f"Exported term {term} to {path}")
+
+    with open(os.path.join(folder, '_schema.json'), 'w', encoding='utf-8') as f:
+        json.dump({'schema_version': SCHEMA_VERSION,
+                   'fields': [str(field.type) + ' ' + field.name for field in dataset_schema()]}, f, indent=2)
+
+
+# ----------------------------------- load ----------------------------------- #
+
+
+def dataset_terms(folder=DATASET_FOLDER) -> list:
+    """
+    Get the terms exported to the dataset.
+    """
+    if not os.path.isdir(folder):
+        return []
+    terms = [TERM_FOLDER_RE.match(name) for name in os.listdir(folder)]
+    return sorted(int(match.group(1)) for match in terms if match)
+
+
+def read_term(term, file_format='parquet', folder=DATASET_FOLDER, columns=None):
+    """
+    Read the partition of a term, memory-mapped.
+
+    Returns:
+    - pyarrow.Table: Records of the term, with a term column.
+    """
+    require_pyarrow()
+
+    path = term_path(term, file_format, folder)
+    if file_format == 'parquet':
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        # uncompressed ipc files are read zero-copy from the mapping
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+
+    version = (table.schema.metadata or {}).get(VERSION_KEY)
+    if version != str(SCHEMA_VERSION).encode():
+        raise ValueError(
+            f"{path} has schema version {version and version.decode()}, expected {SCHEMA_VERSION}; export it again.")
+
+    return table.add_column(0, 'term', pa.array([term] * table.num_rows, pa.int16()))
+
+
+def load_table(terms=None, file_format='parquet', folder=DATASET_FOLDER, columns=None):
+    """
+    Load the typed dataset as a single pyarrow Table.
+
+    Parameters:
+    - terms (list): Only these terms (default all exported terms).
+    - columns (list): Only these columns, the term is always included.
+    """
+    require_pyarrow()
+
+    tables = [read_term(term, file_format, folder, columns) for term in terms or dataset_terms(folder)]
+    if not tables:
+        schema = dataset_schema()
+        if columns is not None:
+            schema = pa.schema([schema.field(column) for column in columns])
+        return schema.insert(0, pa.field('term', pa.int16())).empty_table()
+    return pa.concat_tables(tables)
+
+
+def load_dataset(terms=None, file_format='parquet', folder=DATASET_FOLDER, columns=None) -> pd.DataFrame:
+    """
+    Load the typed dataset as a DataFrame, with the dtypes of mp.records_to_df.
+    """
+    nullable = {pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.string(): pd.StringDtype()}
+    df = load_table(terms, file_format, folder, columns).to_pandas(types_mapper=nullable.get, date_as_object=False)
+
+    dates = [field.name for field in dataset_schema() if pa.types.is_date(field.type) and field.name in df]
+    return df.astype({column: DATE_DTYPE for column in dates})
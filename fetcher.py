@@ -0,0 +1,346 @@
+# requests -> pooled http sessions
+import requests
+from requests.adapters import HTTPAdapter
+
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from proxies import ProxyPool
+
+# ------------------------------------ < ------------------------------------ #
+
+# default user agent for plain http requests
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
+)
+
+# error http response -> keeps the status and Retry-After for the throttle
+class FetchError(Exception):
+
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    Parse the Retry-After header.
+
+    Parameters:
+    - value (str): Delay in seconds or an http date.
+
+    Returns:
+    - float or None: Seconds to wait, None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+# markers that have to be present in a rendered MP profile page
+PROFILE_MARKERS = ('class="partia"', 'class="cv"')
+
+# elements chrome waits for before a profile page is returned, same as the markers
+PROFILE_SELECTORS = ('div.partia', 'div.cv')
+
+
+class Fetcher:
+    """
+    Base class for page fetchers.
+
+    A fetcher takes an url and returns the html source of the page. Fetchers
+    given an HttpCache store every page they fetch in it.
+    """
+
+    name = 'base'
+    cache = None
+
+    def fetch(self, url: str) -> str:
+        """
+        Fetch the html source of the page.
+
+        Parameters:
+        - url (str): The url of the page.
+
+        Returns:
+        - str: The html source of the page.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release resources held by the fetcher.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HttpFetcher(Fetcher):
+    """
+    Plain http fetcher, keeps connections alive in a pooled requests.Session.
+
+    Given a ProxyPool, every request goes through the proxy the pool picks,
+    and its outcome is reported back to the pool.
+    """
+
+    name = 'http'
+
+    def __init__(self, pool_size=10, timeout=10, user_agent=DEFAULT_USER_AGENT, cache=None, proxy_pool=None):
+        """
+        Initialize the HttpFetcher instance.
+
+        Parameters:
+        - pool_size (int): Max number of kept-alive connections per host.
+        - timeout (float): Connect/read timeout in seconds.
+        - user_agent (str): User agent sent with every request.
+        - cache (HttpCache): Response cache, cached pages are revalidated with conditional requests.
+        - proxy_pool (ProxyPool): Proxies to rotate requests through.
+        """
+        self._timeout = timeout
+        self.cache = cache
+        self.proxy_pool = proxy_pool
+
+        # keep-alive connection pool shared by all requests of this fetcher
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._session.headers.update({
+            'User-Agent': user_agent,
+            'Accept-Language': 'pl,en;q=0.8',
+        })
+
+    def fetch(self, url: str) -> str:
+        cached = self.cache.get(url) if self.cache is not None else None
+
+        # conditional request -> 304 and no body when the page did not change
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = self._get(url, headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.touch(url)
+            return cached.html
+
+        if response.status_code >= 400:
+            raise FetchError(url, response.status_code,
+                             parse_retry_after(response.headers.get('Retry-After')))
+
+        # sejm.gov.pl serves utf-8, do not let requests guess latin-1
+        if response.encoding is None or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = 'utf-8'
+
+        if self.cache is not None:
+            self.cache.put(url, response.text, response.headers.get('ETag'),
+                           response.headers.get('Last-Modified'))
+
+        return response.text
+
+    def _get(self, url, headers):
+        if self.proxy_pool is None:
+            return self._session.get(url, headers=headers, timeout=self._timeout)
+
+        proxy = self.proxy_pool.acquire()
+        start = time.monotonic()
+        try:
+            response = self._session.get(url, headers=headers, timeout=self._timeout,
+                                         proxies={'http': proxy, 'https': proxy})
+        except requests.RequestException as e:
+            if ProxyPool.is_proxy_failure(error=e):
+                self.proxy_pool.record_failure(proxy, e)
+            raise
+
+        if ProxyPool.is_proxy_failure(status=response.status_code):
+            self.proxy_pool.record_failure(proxy, f"HTTP {response.status_code}")
+        else:
+            self.proxy_pool.record_success(proxy, time.monotonic() - start)
+
+        return response
+
+    def close(self):
+        self._session.close()
+
+
+class BrowserFetcher(Fetcher):
+    """
+    Headless chrome fetcher, for pages that need javascript to render.
+
+    Pages are loaded by a pool of reusable browsers (see
+    browser_manager.BrowserPool), started lazily on the first fetch, so
+    creating the fetcher as a fallback costs nothing until it is actually
+    needed. A driver is not thread safe, each fetch borrows its own browser.
+
+    By default chrome skips images, stylesheets, fonts and trackers and
+    returns as soon as the dom is ready, or as soon as the `wait_for`
+    elements are present.
+    """
+
+    name = 'browser'
+
+    def __init__(self, cache=None, size=1, recycle_after=None, wait_for=(),
+                 page_load_strategy='eager', block_resources=True, proxy_pool=None):
+        self._pool = None
+        self._lock = threading.Lock()
+        self._size = size
+        self._recycle_after = recycle_after
+        self._wait_for = wait_for
+        self._browser_options = {'page_load_strategy': page_load_strategy, 'block_resources': block_resources}
+        self.cache = cache
+        self.proxy_pool = proxy_pool
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # local import -> selenium is only needed when chrome is used
+                from browser_manager import BrowserPool, DEFAULT_RECYCLE_AFTER
+
+                self._pool = BrowserPool(self._size, self._recycle_after or DEFAULT_RECYCLE_AFTER,
+                                         proxy_pool=self.proxy_pool, **self._browser_options)
+            return self._pool
+
+    def fetch(self, url: str) -> str:
+        with self.pool.browser() as browser:
+            if browser.proxy is None:
+                html = browser.get(url, self._wait_for)
+            else:
+                html = self._get_through_proxy(browser, url)
+
+        # rendered pages have no validators, cached for the other fetchers only
+        if self.cache is not None:
+            self.cache.put(url, html)
+
+        return html
+
+    def _get_through_proxy(self, browser, url):
+        # a browser is bound to its proxy -> wait for that proxy's slot
+        self.proxy_pool.wait(browser.proxy)
+        start = time.monotonic()
+        try:
+            html = browser.get(url, self._wait_for)
+        except Exception as e:
+            self.proxy_pool.record_failure(browser.proxy, e)
+            raise
+        self.proxy_pool.record_success(browser.proxy, time.monotonic() - start)
+        return html
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+class FallbackFetcher(Fetcher):
+    """
+    Fetch with the primary fetcher, retry with the fallback fetcher when the
+    page does not contain the expected markers (e.g. it was rendered by js).
+    """
+
+    name = 'fallback'
+
+    def __init__(self, primary, fallback, markers=PROFILE_MARKERS):
+        self._primary = primary
+        self._fallback = fallback
+        self._markers = markers
+
+    def needs_fallback(self, html: str) -> bool:
+        return any(marker not in html for marker in self._markers)
+
+    def fetch(self, url: str) -> str:
+        html = self._primary.fetch(url)
+
+        if self.needs_fallback(html):
+            logging.info(
+                f"Page {url} incomplete with {self._primary.name} fetcher, falling back to {self._fallback.name}...")
+            html = self._fallback.fetch(url)
+
+        return html
+
+    def close(self):
+        self._primary.close()
+        self._fallback.close()
+
+
+class ArchivingFetcher(Fetcher):
+    """
+    Fetch with the wrapped fetcher and append every page to a PageArchive,
+    so the dataset can be re-derived later without the network.
+    """
+
+    def __init__(self, fetcher, archive):
+        self._fetcher = fetcher
+        self.archive = archive
+        self.name = fetcher.name
+        self.cache = fetcher.cache
+
+    def fetch(self, url: str) -> str:
+        html = self._fetcher.fetch(url)
+        self.archive.add(url, html)
+        return html
+
+    def close(self):
+        self._fetcher.close()
+
+
+# ------------------------------------ < ------------------------------------ #
+
+
+FETCHERS = ('http', 'browser')
+
+
+def create_fetcher(backend: str = 'http', cache=None, markers=PROFILE_MARKERS, browsers=1,
+                   wait_for=PROFILE_SELECTORS, page_load_strategy='eager', proxy_pool=None, **kwargs) -> Fetcher:
+    """
+    Create a fetcher for MP profile pages.
+
+    Parameters:
+    - backend (str): 'http' (plain http, chrome fallback) or 'browser' (chrome only).
+    - cache (HttpCache): Response cache shared by the created fetchers.
+    - markers (tuple): Strings a complete page contains, pages missing one are refetched with chrome.
+    - browsers (int): Size of the headless chrome pool.
+    - wait_for (tuple): Css selectors chrome waits for before it returns a page.
+    - page_load_strategy (str): Chrome page load strategy, 'normal', 'eager' or 'none'.
+    - proxy_pool (ProxyPool): Proxies shared by the http requests and the browsers.
+    - kwargs: Passed to HttpFetcher, ignored by the browser backend.
+
+    Returns:
+    - Fetcher: The fetcher instance.
+    """
+    browser_options = {'size': browsers, 'wait_for': wait_for,
+                       'page_load_strategy': page_load_strategy, 'proxy_pool': proxy_pool}
+
+    if backend == 'http':
+        return FallbackFetcher(HttpFetcher(cache=cache, proxy_pool=proxy_pool, **kwargs),
+                               BrowserFetcher(cache=cache, **browser_options), markers)
+
+    if backend == 'browser':
+        return BrowserFetcher(cache=cache, **browser_options)
+
+    raise ValueError(
+        f"Invalid fetcher backend: {backend}. It should be one of {FETCHERS}.")
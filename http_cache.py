@@ -0,0 +1,177 @@
+# sqlite -> index of cached responses
+import sqlite3
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from paths import cache_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# default size bound of the cached bodies, compressed, in bytes
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# cached response of a single url
+CacheEntry = namedtuple('CacheEntry', ['html', 'digest', 'etag', 'last_modified', 'fetched_at'])
+
+
+def digest_of(html: str) -> str:
+    """
+    Content address of the page, sha256 of its utf-8 encoding.
+    """
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    """
+    On-disk http response cache, shared by all fetchers.
+
+    Bodies are stored once per content (content-addressed by sha256) and
+    zlib-compressed; the index maps every url to its body with the ETag and
+    Last-Modified needed for conditional requests. When the bodies exceed
+    `max_size`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, folder=f"{cache_folder}/http", max_size=DEFAULT_MAX_SIZE):
+        """
+        Initialize the HttpCache instance.
+
+        Parameters:
+        - folder (str): Folder of the index and the bodies.
+        - max_size (int): Max total size of the compressed bodies, in bytes.
+        """
+        self._folder = folder
+        self.max_size = max_size
+
+        os.makedirs(folder, exist_ok=True)
+
+        # fetchers run in worker threads -> one connection behind a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(folder, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+            CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at);
+        ''')
+        self._conn.commit()
+
+        self.size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self._folder, digest[:2], digest + '.z')
+
+    def get(self, url: str):
+        """
+        Get the cached response of the url.
+
+        Returns:
+        - CacheEntry or None: None if the url is not cached or its body was evicted.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest, etag, last_modified, fetched_at FROM entries WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+
+            digest, etag, last_modified, fetched_at = row
+            try:
+                with open(self._blob_path(digest), 'rb') as f:
+                    html = zlib.decompress(f.read()).decode('utf-8')
+            except (FileNotFoundError, zlib.error):
+                return None
+
+            with self._conn:
+                self._conn.execute('UPDATE blobs SET accessed_at = ? WHERE digest = ?', (time.time(), digest))
+
+        return CacheEntry(html, digest, etag, last_modified, fetched_at)
+
+    def put(self, url: str, html: str, etag=None, last_modified=None) -> str:
+        """
+        Cache the response of the url.
+
+        Returns:
+        - str: Digest of the body.
+        """
+        digest = digest_of(html)
+        now = time.time()
+
+        with self._lock:
+            known = self._conn.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+
+            with self._conn:
+                if known is None:
+                    data = zlib.compress(html.encode('utf-8'), 6)
+                    path = self._blob_path(digest)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                    # write then rename -> readers never see a partial body
+                    with open(path + '.tmp', 'wb') as f:
+                        f.write(data)
+                    os.replace(path + '.tmp', path)
+
+                    self._conn.execute('INSERT INTO blobs (digest, size, accessed_at) VALUES (?, ?, ?)',
+                                       (digest, len(data), now))
+                    self.size += len(data)
+                else:
+                    self._conn.execute('UPDATE blobs SET accessed_at = ? WHERE digest = ?', (now, digest))
+
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO entries (url, digest, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                    (url, digest, etag, last_modified, now))
+
+            if self.size > self.max_size:
+                self._evict()
+
+        return digest
+
+    def touch(self, url: str):
+        """
+        Mark the cached response as revalidated, after a 304 Not Modified.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE entries SET fetched_at = ? WHERE url = ?', (time.time(), url))
+
+    def _evict(self):
+        # least recently used bodies first, down to 90% of the bound
+        target = self.max_size * 0.9
+        evicted = 0
+
+        # other processes may share the cache -> size from the index
+        self.size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+        rows = self._conn.execute('SELECT digest, size FROM blobs ORDER BY accessed_at').fetchall()
+        with self._conn:
+            for digest, size in rows:
+                if self.size <= target:
+                    break
+                self._conn.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+                self._conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self.size -= size
+                evicted += 1
+
+        logging.info(f"Evicted {evicted} cached pages, cache size {self.size} bytes")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
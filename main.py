@@ -1,113 +1,517 @@
 # ---------------------------------- imports --------------------------------- #
 import os
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+import re
+import argparse
+import asyncio
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import logging
 
 # local imports
-from df import *
-from browser_manager import Browser
-from scraper import Scraper, ids
+from fetcher import ArchivingFetcher, FETCHERS
+from cli import add_common_args, build_crawler, open_fetcher, setup_logging
+from store import ResultStore
+from checkpoint import Checkpoint
+from archive import PageArchive
+from export import export_store, FORMATS
+from registry import get_mp_ids, get_term_mp_ids
+from page_parser import parse_mp_page, PARSERS
+from parse_pool import ParsePool
 from mp import MP, MP_Site
-from throttle import Throttle
-from paths import current_folder, data_folder, logs_folder
+from throttle import Throttle, AdaptiveThrottle
+from metrics import metrics, events_path
+from profiling import Profiler, parse_profilers
+from paths import data_folder, logs_folder
 
 # ------------------------------------- < ------------------------------------ #
 
 
-# create log file
-logging.basicConfig(
-    filename=f"{logs_folder}/sejm.log",
-    level=logging.INFO,
-    format="%(asctime)s:%(levelname)s:%(message)s"
-)
-
-
-# scrape mp data function
-def scrape_mp_data(mp_index, browser, throttle):
+# scrape mp data function -> MP object (None if the page did not change) and html
+def scrape_mp_data(mp_index, fetcher, throttle, parser=None, checkpoint=None, term=9, expired=False):
 
     # create MP_Site object, to get mp_info_site url
-    url = MP_Site(mp_index).mp_info_site
+    url = MP_Site(mp_index, term, expired).mp_info_site
 
     # use throttle module to wait before making a request
-    throttle.wait()
-
-    # check if server responds
-    throttle.try_get_response(url, browser.driver)
-
-    # get html from browser
-    html = browser.driver.page_source
-
-    # pass html to Scraper
-    scraper = Scraper(html)
-
-    # get political info data
-    elected_date, party_list, constituency, no_of_votes, oath_date, club_name, parliamentary_experience = scraper.get_political_info()
-
-    # get personal info data
-    name, surname, birth_date, birth_place, education, school, profession = scraper.get_personal_info()
-
-    # get email address
-    email = scraper.get_email_address()
-
-    # create MP object
-    mp = MP(
-        mp_index,
-        name,
-        surname,
-        url,
-        constituency,
-        elected_date,
-        party_list,
-        no_of_votes,
-        oath_date,
-        parliamentary_experience,
-        club_name,
-        birth_date,
-        education,
-        school,
-        profession,
-        email
-    )
-
-    # return MP object
-    return mp
+    with metrics.time('wait', term=term, id=mp_index):
+        throttle.wait()
 
+    # check if server responds, get html from fetcher
+    html = throttle.try_get_response(url, fetcher)
 
-def main():
+    # incremental mode -> same page as last time, nothing to parse
+    if checkpoint is not None and checkpoint.unchanged(mp_index, html, term):
+        return None, html
+
+    with metrics.time('parse', term=term, id=mp_index):
+        return parse_mp_data(mp_index, url, html, parser, term), html
+
+
+# parse mp data function -> html to typed MP record
+def parse_mp_data(mp_index, url, html, parser=None, term=9):
+
+    # parse the page once, all fields at a time
+    page = parse_mp_page(html, parser)
+
+    # create MP record -> typed fields, no pandas
+    return MP.from_page(mp_index, url, page, term)
+
+
+# save mp data to the store -> committed right away, then mark it done
+def save_mp_data(term, mp_index, mp, html, store, checkpoint):
+
+    with metrics.time('persist', term=term, id=mp_index):
+        if mp is None:
+            logging.info(f"MP index {mp_index} of term {term} unchanged, skipping...")
+            metrics.inc('pages_total', result='unchanged')
+        else:
+            metrics.inc('records_total', op=store.add(mp.to_row(), term) or 'unchanged')
+            metrics.inc('pages_total', result='parsed')
+
+        checkpoint.mark_done(mp_index, html, term)
+
+
+# scrape many mps concurrently, within the politeness budget
+async def crawl_mp_data(tasks, fetcher, store, checkpoint, args):
+
+    crawler = build_crawler(fetcher, args)
+
+    async def job(task):
+        term, mp_index = task
+        url = MP_Site(mp_index, term, args.expired).mp_info_site
+        html = await crawler.fetch(url)
+
+        # incremental mode -> same page as last time, nothing to parse
+        if args.incremental and checkpoint.unchanged(mp_index, html, term):
+            return None, html
+
+        with metrics.time('parse', term=term, id=mp_index):
+            return parse_mp_data(mp_index, url, html, args.parser, term), html
+
+    try:
+        if args.parse_workers:
+            results = parse_in_pool(crawler, tasks, checkpoint, args)
+        else:
+            results = crawler.crawl(tasks, job)
+
+        async for (term, mp_index), result, error in results:
+
+            if error is not None:
+                logging.error(f"Failed to scrape MP index: {mp_index} of term {term} ({error})")
+                checkpoint.mark_failed(mp_index, error, term)
+                metrics.inc('pages_total', result='failed')
+                continue
+
+            logging.info(f"Scraped MP index: {mp_index} of term {term}")
+
+            save_mp_data(term, mp_index, *result, store, checkpoint)
+    finally:
+        logging.info(f"Throttle state: {crawler.throttle.state}")
+        crawler.close()
+
+
+# fetch in the crawler, parse in worker processes -> (task, (mp, html), error)
+async def parse_in_pool(crawler, tasks, checkpoint, args):
+
+    pool = ParsePool(args.parse_workers, args.parse_queue, ordered=args.ordered)
+
+    # html of the pages being parsed, kept here instead of sent back by the workers
+    pages = {}
 
-    # create browser object
-    browser = Browser()
+    async def fetch(task):
+        term, mp_index = task
+        return await crawler.fetch(MP_Site(mp_index, term, args.expired).mp_info_site)
+
+    async def fetched():
+        # bounded crawl buffer -> the fetchers pause while the parse queue is full
+        async for task, html, error in crawler.crawl(tasks, fetch, buffer=pool.max_pending):
+            if error is not None:
+                yield task, None, error
+                continue
+
+            term, mp_index = task
+            pages[task] = html
+
+            # incremental mode -> same page as last time, nothing to parse
+            if args.incremental and checkpoint.unchanged(mp_index, html, term):
+                yield task, None, None
+            else:
+                yield task, (mp_index, MP_Site(mp_index, term, args.expired).mp_info_site, html, args.parser, term), None
+
+    try:
+        async for task, mp, error in pool.map(parse_mp_data, fetched(), tasks):
+            html = pages.pop(task, None)
+            yield task, None if error is not None else (mp, html), error
+    finally:
+        pool.close()
+
+
+# default mean delay between requests per fetcher backend, in seconds
+DEFAULT_DELAY = {'http': 0.5, 'browser': 2}
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Scrape data of Polish MPs from sejm.gov.pl")
+
+    parser.add_argument('--fetcher', choices=FETCHERS, default='http',
+                        help="page fetcher backend, 'http' falls back to chrome only for pages that need js")
+    parser.add_argument('--browsers', type=int, default=1,
+                        help="size of the headless chrome pool, for pages that need js")
+    parser.add_argument('--page-load', choices=('normal', 'eager', 'none'), default='eager',
+                        help="chrome page load strategy, 'eager' and 'none' return once the profile elements are present")
+    parser.add_argument('--parser', choices=tuple(PARSERS), default=None,
+                        help="html parser backend (default the fastest installed: lxml, selectolax, bs4)")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="parse pages in this many processes while the crawler keeps fetching (concurrent mode)")
+    parser.add_argument('--parse-queue', type=int, default=None,
+                        help="max pages waiting to be parsed before fetching pauses (default 4 per parse worker)")
+    parser.add_argument('--ordered', action='store_true',
+                        help="with --parse-workers, save MPs in the order of the listing instead of as they are parsed")
+    parser.add_argument('--delay', type=float, default=None,
+                        help="mean delay between requests in seconds")
+    parser.add_argument('--throttle', choices=('adaptive', 'fixed'), default='adaptive',
+                        help="'adaptive' tunes the request rate to the server's responses, 'fixed' waits --delay on average")
+    add_common_args(parser, concurrency=1,
+                    concurrency_help="number of requests in flight, above 1 runs the asyncio crawler")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes, the work and the --rate budget are split between them")
+    parser.add_argument('--stale-days', type=float, default=None,
+                        help="also rescrape MPs scraped more than this many days ago")
+    parser.add_argument('--incremental', action='store_true',
+                        help="revisit every MP, only reparse pages whose content changed since the last run")
+    parser.add_argument('--no-archive', action='store_true',
+                        help="do not append fetched pages to the raw page archive (data/archive/)")
+    parser.add_argument('--replay', action='store_true',
+                        help="rebuild the store from the last archived page of every MP of --terms, "
+                             "parsed in --parse-workers processes (default one per cpu), without the network")
+    parser.add_argument('--metrics-file', default=f"{logs_folder}/sejm.prom",
+                        help="prometheus text file of the run's counters and stage latency histograms, "
+                             "rewritten every --metrics-interval seconds ('' to disable)")
+    parser.add_argument('--metrics-interval', type=float, default=15.0)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="also serve the metrics on http://127.0.0.1:<port>/metrics (port + i for worker i)")
+    parser.add_argument('--no-events', action='store_true',
+                        help="do not write the per-stage json lines events to logs/events_<time>_<pid>.jsonl")
+    parser.add_argument('--profile', type=parse_profilers, nargs='?', const=['cpu', 'memory'], default=None,
+                        metavar='cpu,memory,sample',
+                        help="profile the run in a single process (cpu: cProfile, memory: tracemalloc, "
+                             "sample: py-spy flame graph) and write the reports to logs/profiles/<time>/; "
+                             "with --replay the profile is reproducible offline")
+    parser.add_argument('--profile-dir', default=None,
+                        help="folder of the profile reports")
+    parser.add_argument('--export', action='store_true',
+                        help="only write the outputs from the results store, do not scrape")
+    parser.add_argument('--formats', type=lambda value: value.split(','), default=['csv'],
+                        help=f"comma separated outputs written at the end of the run: csv and/or {', '.join(FORMATS)} "
+                             f"(typed dataset in data/mps/term=<term>/)")
+
+    return parser.parse_args(argv)
+
+
+# scrape MPs one at a time
+def scrape_serially(tasks, fetcher, store, checkpoint, args):
 
     # create throttle object
-    throttle = Throttle(2)
+    delay = args.delay if args.delay is not None else DEFAULT_DELAY[args.fetcher]
+
+    if args.throttle == 'adaptive':
+        rate = min(1 / delay, args.rate) if delay > 0 else args.rate
+        throttle = AdaptiveThrottle(rate=rate, max_rate=args.rate)
+    else:
+        throttle = Throttle(delay)
+
+    try:
+        # iterate over MPs still to scrape
+        for term, i in tasks:
+
+            # log
+            logging.info(f"Scraping MP index: {i} of term {term}")
+
+            # scrape mp data, on failure move on to the next MP
+            try:
+                mp, html = scrape_mp_data(i, fetcher, throttle, args.parser,
+                                          checkpoint if args.incremental else None, term, args.expired)
+            except Exception as e:
+                logging.error(f"Failed to scrape MP index: {i} of term {term} ({e})")
+                checkpoint.mark_failed(i, e, term)
+                metrics.inc('pages_total', result='failed')
+                continue
+
+            save_mp_data(term, i, mp, html, store, checkpoint)
+
+    finally:
+        if isinstance(throttle, AdaptiveThrottle):
+            metrics.set('throttle_rate', round(throttle.rate, 3))
+            logging.info(f"Throttle state: {throttle.state}")
+
+
+# instrumentation of a run -> prometheus text file / endpoint, json lines events, summary at the end
+@contextmanager
+def collect_metrics(args):
+
+    metrics.reset()
+    if args.metrics_file:
+        metrics.write_every(args.metrics_file, args.metrics_interval)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if not args.no_events:
+        metrics.open_events(events_path(logs_folder))
+
+    try:
+        yield metrics
+    finally:
+        summary = metrics.summary()
+        logging.info(summary)
+        print(summary)
+        metrics.close()
+
+
+# scrape a list of (term, id) tasks -> runs in the main process or in a worker
+def scrape_tasks(tasks, args):
+
+    store = ResultStore()
+    checkpoint = Checkpoint(store.path)
+
+    # raw page archive -> every fetched page can be parsed again offline with --replay
+    archive = None if args.no_archive else PageArchive()
 
-    # iterate over all MPs
-    for i in ids:
+    try:
+        # fetcher with the http cache and the proxy pool -> budget scaled to the pool
+        with collect_metrics(args), \
+                open_fetcher(args, browsers=args.browsers, page_load_strategy=args.page_load) as (fetcher, args):
+            if archive is not None:
+                fetcher = ArchivingFetcher(fetcher, archive)
 
-        # load mps_df
-        mps_df = load_df()
+            # concurrent mode -> also with a parse pool, the crawler is its producer
+            if args.concurrency > 1 or args.parse_workers:
+                asyncio.run(crawl_mp_data(tasks, fetcher, store, checkpoint, args))
+            else:
+                scrape_serially(tasks, fetcher, store, checkpoint, args)
 
-        # log
-        logging.info(f"Scraping MP index: {i}")
+    finally:
+        if archive is not None:
+            archive.close()
+        checkpoint.close()
+        store.close()
 
-        # check if MP index is already in the id column of the dataframe
-        if check_if_id_exists(i, mps_df) == True:
-            continue
 
-        # scrape mp data
-        mp = scrape_mp_data(i, browser, throttle)
+# (term, id) of an archived profile page url
+PROFILE_URL_RE = re.compile(r'/Sejm(\d+)\.nsf/posel\.xsp\?id=(\d+)$')
 
-        # append mp data to mps_df
-        new_df = insert_mp_to_df(mp, mps_df)
 
-        # save updated dataframe to csv
-        save_df_to_csv(new_df)
+# re-derive the store from the archived profile pages, no network
+def replay_archive(store, args):
 
-    # quit browser
-    browser.driver.quit()
+    archive = PageArchive()
+    checkpoint = Checkpoint(store.path)
+    counts = {'replayed': 0, 'changed': 0}
+
+    # html of the pages being parsed -> hashed into the checkpoint once saved
+    htmls = {}
+
+    def pages():
+        for page in archive.latest('%/posel.xsp?id=%'):
+            match = PROFILE_URL_RE.search(page.url)
+            if match is None or int(match.group(1)) not in args.terms:
+                continue
+            term, mp_index = int(match.group(1)), match.group(2)
+            html = htmls[term, mp_index] = archive.read(page)
+            yield (term, mp_index), (mp_index, page.url, html, args.parser, term)
+
+    def save(term, mp_index, mp, error):
+        html = htmls.pop((term, mp_index), None)
+        if error is not None:
+            logging.error(f"Failed to parse archived MP index: {mp_index} of term {term} ({error})")
+            metrics.inc('pages_total', result='failed')
+            return
+        counts['replayed'] += 1
+        with metrics.time('persist', term=term, id=mp_index):
+            op = store.add(mp.to_row(), term)
+            counts['changed'] += op is not None
+            metrics.inc('records_total', op=op or 'unchanged')
+            metrics.inc('pages_total', result='replayed')
+
+            # replayed -> a later run does not scrape it again, MPs already done keep the time of their scrape
+            if not checkpoint.is_done(mp_index, term):
+                checkpoint.mark_done(mp_index, html, term)
+
+    async def replay(pool):
+        async def source():
+            for task, parse_args in pages():
+                yield task, parse_args, None
+
+        async for (term, mp_index), mp, error in pool.map(parse_mp_data, source()):
+            save(term, mp_index, mp, error)
+
+    try:
+        if args.profile:
+            # profiling -> parsed in this process, where the profilers see it
+            for (term, mp_index), parse_args in pages():
+                try:
+                    with metrics.time('parse', term=term, id=mp_index):
+                        mp, error = parse_mp_data(*parse_args), None
+                except Exception as e:
+                    mp, error = None, e
+                save(term, mp_index, mp, error)
+        else:
+            pool = ParsePool(args.parse_workers or None, args.parse_queue)
+            try:
+                asyncio.run(replay(pool))
+            finally:
+                pool.close()
+    finally:
+        checkpoint.close()
+        archive.close()
+
+    logging.info(f"Replayed {counts['replayed']} archived MP pages, {counts['changed']} records changed")
+
+
+# split the tasks between worker processes, each with its share of the rate
+def scrape_in_workers(tasks, args):
+
+    workers = min(args.workers, len(tasks))
+    worker_args = argparse.Namespace(**{**vars(args), 'rate': args.rate / workers})
+
+    # round robin -> every worker gets a mix of terms
+    shards = [tasks[i::workers] for i in range(workers)]
+
+    # every worker has its own metrics -> its own file and port
+    def shard_args(i):
+        metrics_file = f"{os.path.splitext(args.metrics_file)[0]}.worker{i}.prom" if args.metrics_file else None
+        metrics_port = args.metrics_port + i if args.metrics_port else None
+        return argparse.Namespace(**{**vars(worker_args), 'metrics_file': metrics_file, 'metrics_port': metrics_port})
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scrape_tasks, shard, shard_args(i)) for i, shard in enumerate(shards)]
+        for future in futures:
+            future.result()
+
+
+def main():
+
+    args = parse_args()
+
+    if not args.profile:
+        return run(args)
+
+    # cProfile and tracemalloc see this process only -> no worker processes, no parse pool;
+    # cProfile sees the main thread only -> no fetch threads either, the serial path
+    if args.workers > 1 or args.parse_workers or args.concurrency > 1:
+        logging.warning("Profiling runs with a single process and thread, "
+                        "--workers, --parse-workers and --concurrency are ignored")
+    args.workers, args.parse_workers, args.concurrency = 1, 0, 1
+
+    with Profiler(args.profile, args.profile_dir) as profiler:
+        run(args)
+    print(f"Profile written to {profiler.folder}")
+
+
+# (term, MP id) tasks to scrape -> not scraped yet, failed or stale, expired mandates left out;
+# also the active listing of every term, who is not on it expired
+def select_tasks(store, args):
+
+    # resume index -> select MPs not scraped yet, failed or stale
+    checkpoint = Checkpoint(store.path)
+
+    stale_after = datetime.timedelta(days=args.stale_days) if args.stale_days is not None else None
+
+    tasks = []
+    active = {}
+    for term in args.terms:
+
+        # MP ids -> cached listing, revalidated when stale; the active ones also tell who expired
+        active[term] = get_mp_ids(term, 'A')
+        ids = get_term_mp_ids(term, args.expired)
+
+        # expired mandates already stored with their expiration -> historic pages, never refetched
+        expired = store.expired_ids(term)
+
+        candidates = [mp_index for mp_index in ids if mp_index not in expired]
+
+        if args.incremental:
+            pending = candidates
+        else:
+            pending = checkpoint.pending(candidates, term, only_failed=args.only_failed, stale_after=stale_after)
+
+        logging.info(f"{len(pending)} of {len(ids)} MPs of term {term} to scrape, {len(expired)} expired skipped")
+        tasks.extend((term, mp_index) for mp_index in pending)
+
+    checkpoint.close()
+
+    return tasks, active
+
+
+# scrape (or replay) and write the outputs
+def run(args):
+
+    # results store -> csv is written from it at the end of the run
+    store = ResultStore()
+
+    # changes logged by this run are the ones after this
+    since = store.last_change()
+
+    try:
+        if args.export:
+            return
+
+        # offline -> the outputs are written from the replayed store, MPs are not expired
+        if args.replay:
+            with collect_metrics(args):
+                replay_archive(store, args)
+            return
+
+        tasks, active = select_tasks(store, args)
+
+        if args.workers > 1 and len(tasks) > 1:
+            scrape_in_workers(tasks, args)
+        else:
+            scrape_tasks(tasks, args)
+
+        # MPs no longer on the active listing resolved above -> expirations in the change log
+        for term, ids in active.items():
+            expired = store.expire_missing(term, ids)
+            if expired:
+                logging.info(f"Mandates of {len(expired)} MPs of term {term} expired: {expired}")
+
+    finally:
+        # materialise outputs from the store, also after an interrupted run
+        export_terms(store, args.formats)
+        export_changes(store, since)
+        store.close()
+
+
+# write the changes of this run to data/changes/changes_<time>.jsonl
+def export_changes(store, since):
+
+    if store.last_change() == since:
+        logging.info("No MP changed")
+        return
+
+    os.makedirs(f"{data_folder}/changes", exist_ok=True)
+    path = f"{data_folder}/changes/changes_{datetime.datetime.now():%Y%m%dT%H%M%S}.jsonl"
+    count = store.export_changes(path, since)
+    logging.info(f"Logged {count} changes to {path}")
+
+
+# write data/mps.csv for term 9, data/mps_<term>.csv for the other terms, and the typed dataset
+def export_terms(store, formats=('csv',)):
+
+    if 'csv' in formats:
+        for term in store.terms():
+            if term == 9:
+                store.export_csv(term=term)
+            else:
+                store.export_csv(f"{data_folder}/mps_{term}.csv", term=term)
+
+    for file_format in FORMATS:
+        if file_format in formats:
+            export_store(store, file_format)
 
 
 if __name__ == "__main__":
+
+    setup_logging()
+
     main()
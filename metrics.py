@@ -0,0 +1,315 @@
+# structured instrumentation of the scrape loop -> prometheus text and json lines
+import bisect
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ------------------------------------ < ------------------------------------ #
+
+# stages of a page, every one timed separately
+STAGES = ('wait', 'fetch', 'parse', 'persist')
+
+# upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# prefix of every exported metric
+PREFIX = 'sejm_'
+
+HELP = {
+    'stage_seconds': "Seconds spent per page in each stage of the scrape loop.",
+    'requests_total': "Page requests by outcome, retries included.",
+    'pages_total': "MP pages by result.",
+    'records_total': "Store writes by operation.",
+    'bytes_total': "Bytes of html fetched.",
+    'throttle_rate': "Requests per second allowed by the throttle.",
+}
+
+
+def label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets, as prometheus expects.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation within its bucket.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Counters, gauges and latency histograms of the scrape loop.
+
+    Every timed stage is also written as a json line event, when an events
+    file is set. The whole state is rendered in the prometheus text format,
+    written to a file (e.g. for the node_exporter textfile collector) and/or
+    served over http. Thread safe; every process has its own instance.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._events = None
+        self._server = None
+        self._file = None
+        self._stop = None
+        self.started_at = time.time()
+
+    # --------------------------------- record ---------------------------------- #
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value, **labels):
+        with self._lock:
+            self._gauges[(name, label_key(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, **fields):
+        """
+        Time a stage of a page, e.g. `with metrics.time('parse', term=9, id='001'):`.
+
+        The duration goes to the stage_seconds histogram, the fields only to the event.
+        """
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('stage_seconds', seconds, stage=stage)
+            self.event(stage, seconds=round(seconds, 6), ok=ok, **fields)
+
+    def event(self, event: str, **fields):
+        """
+        Append a json line event, if an events file is open.
+        """
+        if self._events is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 6), 'event': event, **fields}, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._events is not None:
+                self._events.write(line + '\n')
+
+    # --------------------------------- outputs --------------------------------- #
+
+    def open_events(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # line buffered -> a tail -f sees every event
+        self._events = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the prometheus text exposition format.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {PREFIX}{name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        for (name, key), value in sorted(counters.items()):
+            describe(name, 'counter')
+            lines.append(f'{PREFIX}{name}{format_labels(key)} {value}')
+
+        for (name, key), value in sorted(gauges.items()):
+            describe(name, 'gauge')
+            lines.append(f'{PREFIX}{name}{format_labels(key)} {value}')
+
+        for (name, key), (counts, total, count) in sorted(histograms.items()):
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(list(self._buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{PREFIX}{name}_bucket{format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{format_labels(key)} {total:.6f}')
+            lines.append(f'{PREFIX}{name}_count{format_labels(key)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """
+        Write the prometheus text to a file, atomically.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def write_every(self, path: str, interval=15.0):
+        """
+        Rewrite the prometheus file every `interval` seconds until close(), and once more on close.
+        """
+        self._file = path
+        stop = self._stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write(path)
+
+        threading.Thread(target=loop, name='metrics-file', daemon=True).start()
+
+    def serve(self, port: int, host='127.0.0.1'):
+        """
+        Serve the prometheus text on http://host:port/metrics, in a daemon thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def reset(self):
+        """
+        Forget everything recorded so far, e.g. at the start of a run.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    # --------------------------------- summary --------------------------------- #
+
+    def stage_totals(self) -> dict:
+        """
+        Get the seconds spent in and the number of timings of every stage.
+        """
+        with self._lock:
+            return {dict(key).get('stage'): {'seconds': round(h.sum, 6), 'count': h.count}
+                    for (name, key), h in self._histograms.items() if name == 'stage_seconds'}
+
+    def summary(self) -> str:
+        """
+        End of run summary: pages, requests and the time spent in every stage.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {dict(key).get('stage'): h for (name, key), h in self._histograms.items()
+                      if name == 'stage_seconds'}
+
+        def total(name):
+            # (label values, count) of a counter, sorted
+            return sorted(('/'.join(str(value) for _, value in key), count)
+                          for (counter, key), count in counters.items() if counter == name)
+
+        elapsed = time.time() - self.started_at
+        done = sum(count for result, count in total('pages_total') if result != 'failed')
+
+        lines = [f"Run summary: {done} pages in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.2f} pages/s)"]
+        for name in ('pages_total', 'requests_total', 'records_total'):
+            values = ', '.join(f"{labels}={count}" for labels, count in total(name))
+            if values:
+                lines.append(f"  {name[:-6]}: {values}")
+
+        busy = sum(h.sum for h in stages.values()) or 1.0
+        for stage in [stage for stage in STAGES if stage in stages] + sorted(set(stages) - set(STAGES)):
+            h = stages[stage]
+            lines.append(
+                f"  {stage:>8}: {h.sum:8.2f}s {h.sum / busy:6.1%}  n={h.count:<6} "
+                f"mean={h.sum / h.count * 1000:8.1f}ms  p50~{h.quantile(0.5) * 1000:8.1f}ms  "
+                f"p99~{h.quantile(0.99) * 1000:8.1f}ms")
+        return '\n'.join(lines)
+
+    def close(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self._file is not None:
+            self.write(self._file)
+            self._file = None
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# metrics shared by the whole process
+metrics = Metrics()
+
+
+def events_path(folder: str) -> str:
+    return os.path.join(folder, f"events_{datetime.datetime.now():%Y%m%dT%H%M%S}_{os.getpid()}.jsonl")
@@ -1,50 +1,80 @@
-from scraper import ids
 import pandas as pd
 
+import datetime
+import re
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Optional
+
+# pyarrow -> columnar batches, optional
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from df import COLUMNS
+from registry import get_mp_ids, MP_TYPES, SEJM_URL
+
 # class for Member of Parliament site
 
 
 class MP_Site:
 
-    # index list of all MPs, scraped from website
-    MP_INDEX_LIST = ids
-
-    def __init__(self, mp_index):
+    def __init__(self, mp_index, term=9, expired=False):
+        self._term = term
+        # expired MPs asked for -> their listing is valid too, otherwise it is never fetched
+        self._mp_types = list(MP_TYPES) if expired else ['A']
         self.mp_index = mp_index  # Use the setter to format the value
 
+    # index list of the MPs of the term (active, and expired if asked for), from the cached registry
+    @property
+    def MP_INDEX_LIST(self):
+        ids = []
+        for mp_type in self._mp_types:
+            ids.extend(get_mp_ids(self._term, mp_type))
+        return ids
+
+    # check the active MPs first, the expired listing only when expired MPs were asked for
+    def is_valid_index(self, mp_index):
+        return any(mp_index in get_mp_ids(self._term, mp_type) for mp_type in self._mp_types)
+
     # properties -> getters
     @property
     def mp_index(self):
         return self._mp_index
 
+    @property
+    def term(self):
+        return self._term
+
     @property
     def mp_info_site(self):
-        return f'https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id={self._mp_index}'
+        return f'{SEJM_URL}/Sejm{self._term}.nsf/posel.xsp?id={self._mp_index}'
 
     @property
     # speech number is the number of the speech in the MP's speech list
     def mp_speech_site(self):
-        return f'https://sejm.gov.pl/Sejm9.nsf/wypowiedzi.xsp?id={self._mp_index}&type=P&symbol=WYPOWIEDZI_POSLA'
+        return f'{SEJM_URL}/Sejm{self._term}.nsf/wypowiedzi.xsp?id={self._mp_index}&type=P&symbol=WYPOWIEDZI_POSLA'
 
     @property
     def mp_voting_site(self):
-        return f'https://sejm.gov.pl/Sejm9.nsf/agent.xsp?symbol=POSELGL&NrKadencji=9&Nrl={self._mp_index}'
+        return f'{SEJM_URL}/Sejm{self._term}.nsf/agent.xsp?symbol=POSELGL&NrKadencji={self._term}&Nrl={self._mp_index}'
 
     # setter for mp_index -> from 001 to 460, has to be a string
     @mp_index.setter
     def mp_index(self, mp_index):
         if isinstance(mp_index, int):
             # fill mp_index with zeros to make it a three-digit number
-            self._mp_index = str(mp_index).zfill(3)
+            mp_index = str(mp_index).zfill(3)
 
-            if mp_index in self.MP_INDEX_LIST:
+            if self.is_valid_index(mp_index):
                 self._mp_index = mp_index
             else:
                 raise ValueError(
                     "Invalid mp_index value. It should be an integer in id range.")
 
-        if isinstance(mp_index, str):
-            if len(mp_index) == 3 and mp_index in self.MP_INDEX_LIST:
+        elif isinstance(mp_index, str):
+            if len(mp_index) == 3 and self.is_valid_index(mp_index):
                 self._mp_index = mp_index
             else:
                 raise ValueError(
@@ -54,147 +84,352 @@ class MP_Site:
                 "Invalid mp_index value. It should be a string of length 3 or an integer.")
 
 
-# class for each Member of Parliament
-
-
+# class for each Member of Parliament -> typed, slotted record, no per-record pandas
+
+
+# '13  Kraków' -> constituency number and city
+CONSTITUENCY_RE = re.compile(r'^\s*(\d+)\s+(.*?)\s*$')
+
+# separator of the number and the city, as on the page
+CONSTITUENCY_SEP = '\xa0\xa0'
+
+# date format of the date columns in the store and mps.csv -> all iso
+DATE_FORMATS = {'elected_date': '%Y-%m-%d', 'oath_date': '%Y-%m-%d', 'birth_date': '%Y-%m-%d',
+                'expiration_date': '%Y-%m-%d'}
+
+# yyyy-mm-dd and dd-mm-yyyy -> no strptime per field
+ISO_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+DMY_DATE_RE = re.compile(r'^(\d{2})-(\d{2})-(\d{4})$')
+
+
+def to_date(value) -> Optional[datetime.date]:
+    """
+    Parse a dd-mm-yyyy or yyyy-mm-dd date, None if it is missing or invalid.
+    """
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    match = ISO_DATE_RE.match(value)
+    if match is not None:
+        year, month, day = match.groups()
+    else:
+        match = DMY_DATE_RE.match(value)
+        if match is None:
+            return None
+        day, month, year = match.groups()
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+# club/party list name variants -> canonical name, matched after the whitespace and quotes are cleaned
+CLUB_ALIASES = {}
+PARTY_ALIASES = {}
+
+# unicode spaces and typographic quotes of the pages -> plain ones
+NAME_TRANSLATION = str.maketrans({'\xa0': ' ', '\u2009': ' ', '\u202f': ' ',
+                                  '\u201e': '"', '\u201d': '"', '\u201c': '"'})
+
+
+def canonical_name(name, aliases=None) -> Optional[str]:
+    """
+    Clean the whitespace and quotes of a club or party list name and map its alias, None if it is empty.
+    """
+    if name is None:
+        return None
+    name = ' '.join(name.translate(NAME_TRANSLATION).split())
+    if not name:
+        return None
+    return aliases.get(name, name) if aliases else name
+
+
+def legacy_date(value: str) -> str:
+    """
+    Convert a dd-mm-yyyy date of older records to yyyy-mm-dd, other values are returned as they are.
+    """
+    match = DMY_DATE_RE.match(value.strip())
+    if match is None:
+        return value
+    day, month, year = match.groups()
+    return f'{year}-{month}-{day}'
+
+
+def to_int(value) -> Optional[int]:
+    """
+    Parse an integer, ignoring spaces ('29 686'), None if it is missing or invalid.
+    """
+    if isinstance(value, int):
+        return value
+    if not isinstance(value, str):
+        return None
+    digits = re.sub(r'\s', '', value)
+    return int(digits) if digits.isdigit() else None
+
+
+def split_constituency(value):
+    """
+    Split '13  Kraków' into (13, 'Kraków'), (None, value) if there is no number.
+    """
+    if not isinstance(value, str) or not value:
+        return None, None
+    match = CONSTITUENCY_RE.match(value)
+    if match is None:
+        return None, value
+    return int(match.group(1)), match.group(2)
+
+
+def empty_to_none(value):
+    # missing csv cells are read as nan
+    return value if isinstance(value, str) and value else None
+
+
+@dataclass(slots=True)
 class MP:
-
-    # constructor -> what is needed to create an object of this class
-    def __init__(self, index, name, surname, link, constituency, elected_date, party_list, no_of_votes, oath_date, parliamentary_experience, club, birth_date, education, school, profession, email):
-
-        # example infos
-
-        # Imię:Andrzej
-        # Nazwisko:Adamczyk
-        # Link:https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id=001
-        # Wybrany dnia:13-10-2019
-        # Lista:Prawo i Sprawiedliwość
-        # Okręg wyborczy:13  Kraków
-        # Liczba głosów:29686
-        # Ślubowanie:12-11-2019
-        # Staż parlamentarny:poseł V kadencji, poseł VI kadencji, poseł VII kadencji, poseł VIII kadencji
-        # Klub/koło:Klub Parlamentarny Prawo i Sprawiedliwość
-        # Data i miejsce urodzenia:04-01-1959, Krzeszowice
-        # Wykształcenie:wyższe
-        # Ukończona szkoła:Społeczna Akademia Nauk w Łodzi, Wydział Zarządzania, Rachunkowośc i finanse w zarządzaniu - licencjat (2014)
-        # Zawód:parlamentarzysta
-        # E-mail:
-
-        self._index = index
-        self._name = name
-        self._surname = surname
-        self._link = link
-
-        self._elected_date = elected_date
-        self._party_list = party_list
-        self._constituency = constituency
-        self._no_of_votes = no_of_votes
-        self._oath_date = oath_date
-        self._parliamentary_experience = parliamentary_experience
-        self._club = club
-
-        self._birth_date = birth_date
-        self._education = education
-        self._school = school
-        self._profession = profession
-
-        self._email = email
-
-    # properties -> getters
+    """
+    Record of a single Member of Parliament.
+
+    Fields are typed: votes and the constituency number are ints, dates are
+    datetime.date, the constituency is split into its number and city.
+    to_row() renders the record back to the string columns of the store and
+    mps.csv (COLUMNS); records_to_df() and records_to_arrow() build typed
+    batches from many records at once.
+    """
+
+    # example infos
+
+    # Imię:Andrzej
+    # Nazwisko:Adamczyk
+    # Link:https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id=001
+    # Wybrany dnia:13-10-2019
+    # Lista:Prawo i Sprawiedliwość
+    # Okręg wyborczy:13  Kraków
+    # Liczba głosów:29686
+    # Ślubowanie:12-11-2019
+    # Staż parlamentarny:poseł V kadencji, poseł VI kadencji, poseł VII kadencji, poseł VIII kadencji
+    # Klub/koło:Klub Parlamentarny Prawo i Sprawiedliwość
+    # Data i miejsce urodzenia:04-01-1959, Krzeszowice
+    # Wykształcenie:wyższe
+    # Ukończona szkoła:Społeczna Akademia Nauk w Łodzi, Wydział Zarządzania, Rachunkowośc i finanse w zarządzaniu - licencjat (2014)
+    # Zawód:parlamentarzysta
+    # E-mail:
+
+    id: str
+    name: Optional[str] = None
+    surname: Optional[str] = None
+    link: Optional[str] = None
+    party_list: Optional[str] = None
+    constituency_no: Optional[int] = None
+    constituency_city: Optional[str] = None
+    elected_date: Optional[datetime.date] = None
+    no_of_votes: Optional[int] = None
+    oath_date: Optional[datetime.date] = None
+    parliamentary_experience: Optional[str] = None
+    club: Optional[str] = None
+    birth_date: Optional[datetime.date] = None
+    education: Optional[str] = None
+    school: Optional[str] = None
+    profession: Optional[str] = None
+    email: Optional[str] = None
+    # mandate expiration, None while the mandate lasts
+    expiration_date: Optional[datetime.date] = None
+    expiration_reason: Optional[str] = None
+    expiration_document: Optional[str] = None
+    term: int = 9
+
+    # constructors
+
+    @classmethod
+    def from_page(cls, mp_index, link, page, term=9):
+        """
+        Build the record from a parsed profile page (page_parser.MPPage).
+        """
+        constituency_no, constituency_city = split_constituency(page.constituency)
+        return cls(
+            id=mp_index,
+            name=page.name,
+            surname=page.surname,
+            link=link,
+            party_list=canonical_name(page.party_list, PARTY_ALIASES),
+            constituency_no=constituency_no,
+            constituency_city=constituency_city,
+            elected_date=to_date(page.elected_date),
+            no_of_votes=to_int(page.no_of_votes),
+            oath_date=to_date(page.oath_date),
+            parliamentary_experience=page.parliamentary_experience,
+            club=canonical_name(page.club_name, CLUB_ALIASES),
+            birth_date=to_date(page.birth_date),
+            education=page.education,
+            school=page.school,
+            profession=page.profession,
+            email=page.email,
+            expiration_date=to_date(page.expiration_date),
+            expiration_reason=page.expiration_reason,
+            expiration_document=page.expiration_document,
+            term=term,
+        )
+
+    @classmethod
+    def from_row(cls, row: dict, term=9):
+        """
+        Build the record from the string columns of the store or mps.csv.
+        """
+        constituency_no, constituency_city = split_constituency(row.get('constituency'))
+        return cls(
+            id=str(row['id']).zfill(3),
+            name=empty_to_none(row.get('name')),
+            surname=empty_to_none(row.get('surname')),
+            link=empty_to_none(row.get('link')),
+            party_list=empty_to_none(row.get('party_list')),
+            constituency_no=constituency_no,
+            constituency_city=constituency_city,
+            elected_date=to_date(row.get('elected_date')),
+            no_of_votes=to_int(row.get('no_of_votes')),
+            oath_date=to_date(row.get('oath_date')),
+            parliamentary_experience=empty_to_none(row.get('parliamentary_experience')),
+            club=empty_to_none(row.get('club')),
+            birth_date=to_date(row.get('birth_date')),
+            education=empty_to_none(row.get('education')),
+            school=empty_to_none(row.get('school')),
+            profession=empty_to_none(row.get('profession')),
+            email=empty_to_none(row.get('email')),
+            expiration_date=to_date(row.get('expiration_date')),
+            expiration_reason=empty_to_none(row.get('expiration_reason')),
+            expiration_document=empty_to_none(row.get('expiration_document')),
+            term=term,
+        )
+
+    # conversions
 
     @property
-    def index(self):
-        return self._index
+    def constituency(self):
+        if self.constituency_no is None:
+            return self.constituency_city
+        return f'{self.constituency_no}{CONSTITUENCY_SEP}{self.constituency_city}'
+
+    def to_row(self) -> dict:
+        """
+        Render the record to the string columns of the store and mps.csv.
+        """
+        row = {}
+        for column in COLUMNS:
+            value = self.constituency if column == 'constituency' else getattr(self, column)
+            if isinstance(value, datetime.date):
+                value = value.strftime(DATE_FORMATS[column])
+            elif isinstance(value, int):
+                value = str(value)
+            row[column] = value
+        return row
 
-    @property
-    def elected_date(self):
-        return self._elected_date
+    # methods
+    def __str__(self):
+        return f'''
+        Id: {self.id}
+        Member of Parliament: {self.name} {self.surname}
+        Link: {self.link}
+        Party list: {self.party_list}
+        Constituency: {self.constituency}
+        Elected date: {self.elected_date}
+        No of votes: {self.no_of_votes}
+        Oath date: {self.oath_date}
+        Parliamentary experience: {self.parliamentary_experience}
+        Club: {self.club}
+        Birth date: {self.birth_date}
+        Education: {self.education}
+        School: {self.school}
+        Profession: {self.profession}
+        Email: {self.email}
+        Expiration date: {self.expiration_date}
+        Expiration reason: {self.expiration_reason}
+        Expiration document: {self.expiration_document}
+        '''
 
-    @property
-    def party_list(self):
-        return self._party_list
 
-    @property
-    def constituency(self):
-        return self._constituency
+# ------------------------------- batch building ------------------------------ #
 
-    @property
-    def no_of_votes(self):
-        return self._no_of_votes
 
-    @property
-    def oath_date(self):
-        return self._oath_date
+# typed columns of a records batch, in order
+RECORD_COLUMNS = ['term'] + [field.name for field in fields(MP) if field.name != 'term']
 
-    @property
-    def parliamentary_experience(self):
-        return self._parliamentary_experience
+# pandas dtypes of the non-string columns
+RECORD_DTYPES = {'term': 'Int16', 'constituency_no': 'Int16', 'no_of_votes': 'Int32'}
+DATE_COLUMNS = ['elected_date', 'oath_date', 'birth_date', 'expiration_date']
 
-    @property
-    def club(self):
-        return self._club
+# pandas dtype of the date columns, the same whatever the default unit of the pandas version
+DATE_DTYPE = 'datetime64[s]'
 
-    @property
-    def birth_date(self):
-        return self._birth_date
+# name columns -> their aliases, canonicalized in every batch like normalize.normalize does
+NAME_ALIASES = {'club': CLUB_ALIASES, 'party_list': PARTY_ALIASES}
 
-    @property
-    def education(self):
-        return self._education
 
-    @property
-    def school(self):
-        return self._school
+def record_columns(records) -> dict:
+    """
+    Transpose records into a dict of column lists, in RECORD_COLUMNS order.
 
-    @property
-    def profession(self):
-        return self._profession
+    Club and party list names are canonicalized, once per distinct name.
+    """
+    getter = attrgetter(*RECORD_COLUMNS)
+    rows = [getter(record) for record in records]
+    if not rows:
+        return {column: [] for column in RECORD_COLUMNS}
+    columns = dict(zip(RECORD_COLUMNS, map(list, zip(*rows))))
 
-    @property
-    def email(self):
-        return self._email
+    for column, aliases in NAME_ALIASES.items():
+        names = {name: canonical_name(name, aliases) for name in set(columns[column])}
+        columns[column] = [names[name] for name in columns[column]]
+    return columns
 
-    @property
-    def get_data(self):
-        return (
-            self._index,
-            self._name,
-            self._surname,
-            self._link,
-            self._party_list,
-            self._constituency,
-            self._elected_date,
-            self._no_of_votes,
-            self._oath_date,
-            self._parliamentary_experience,
-            self._club,
-            self._birth_date,
-            self._education,
-            self._school,
-            self._profession,
-            self._email)
-
-    # return as dataframe
-    @property
-    def to_df(self):
-        return pd.DataFrame([self.get_data], columns=['id', 'name', 'surname', 'link', 'party_list', 'constituency', 'elected_date', 'no_of_votes', 'oath_date', 'parliamentary_experience', 'club', 'birth_date', 'education', 'school', 'profession', 'email'])
 
-    # methods
-    def __str__(self):
-        return f'''
-        Id: {self._index}
-        Member of Parliament: {self._name} {self._surname}
-        Link: {self._link}
-        Party list: {self._party_list}
-        Constituency: {self._constituency}
-        Elected date: {self._elected_date}
-        No of votes: {self._no_of_votes}
-        Oath date: {self._oath_date}
-        Parliamentary experience: {self._parliamentary_experience}
-        Club: {self._club}
-        Birth date: {self._birth_date}
-        Education: {self._education}
-        School: {self._school}
-        Profession: {self._profession}
-        Email: {self._email}
-        '''
+def records_to_df(records) -> pd.DataFrame:
+    """
+    Build a typed DataFrame from MP records in one go.
+
+    Ints are nullable (Int16/Int32), dates are DATE_DTYPE.
+    """
+    columns = record_columns(records)
+    data = {}
+    for column, values in columns.items():
+        if column in RECORD_DTYPES:
+            data[column] = pd.array(values, dtype=RECORD_DTYPES[column])
+        elif column in DATE_COLUMNS:
+            data[column] = pd.to_datetime(pd.Series(values, dtype=object)).astype(DATE_DTYPE)
+        else:
+            data[column] = pd.array(values, dtype='string')
+    return pd.DataFrame(data, columns=RECORD_COLUMNS)
+
+
+def record_schema():
+    return pa.schema([
+        ('term', pa.int16()),
+        ('id', pa.string()),
+        ('name', pa.string()),
+        ('surname', pa.string()),
+        ('link', pa.string()),
+        ('party_list', pa.string()),
+        ('constituency_no', pa.int16()),
+        ('constituency_city', pa.string()),
+        ('elected_date', pa.date32()),
+        ('no_of_votes', pa.int32()),
+        ('oath_date', pa.date32()),
+        ('parliamentary_experience', pa.string()),
+        ('club', pa.string()),
+        ('birth_date', pa.date32()),
+        ('education', pa.string()),
+        ('school', pa.string()),
+        ('profession', pa.string()),
+        ('email', pa.string()),
+        ('expiration_date', pa.date32()),
+        ('expiration_reason', pa.string()),
+        ('expiration_document', pa.string()),
+    ])
+
+
+def records_to_arrow(records):
+    """
+    Build a typed pyarrow Table from MP records in one go.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to build arrow tables.")
+    return pa.Table.from_pydict(record_columns(records), schema=record_schema())
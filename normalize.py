@@ -0,0 +1,110 @@
+# batch normalization of scraped MP tables -> typed columns, whole columns at a time
+import pandas as pd
+
+from mp import (CLUB_ALIASES, DATE_COLUMNS, DATE_DTYPE, PARTY_ALIASES, RECORD_COLUMNS, RECORD_DTYPES,
+                canonical_name, split_constituency)
+
+# ------------------------------------ < ------------------------------------ #
+
+# dd-mm-yyyy -> yyyy-mm-dd, the other date format of the pages
+DMY_RE = r'^(\d{2})-(\d{2})-(\d{4})$'
+DMY_TO_ISO = r'\3-\2-\1'
+
+# encoded email -> decoded, applied in order, same as page_parser.decode_email
+EMAIL_CODES = ((' D O T ', '.'), (' A T ', '@'), ('#', ''), (' ', ''))
+
+
+def text(values) -> pd.Series:
+    """
+    Strings of a raw column, stripped, empty and missing values as NA.
+    """
+    return pd.Series(values, dtype='string').str.strip().replace('', pd.NA)
+
+
+def per_distinct(values, func, dtype) -> pd.Series:
+    """
+    Apply func to every distinct value of a text() column once, instead of to every row.
+
+    For columns of few values: clubs, party lists, constituencies.
+    """
+    codes, distinct = pd.factorize(values, use_na_sentinel=True)
+    # missing values have the code -1 -> the trailing NA
+    results = pd.array([func(value) for value in distinct] + [None], dtype=dtype)
+    return pd.Series(results[codes], index=values.index)
+
+
+def to_dates(values) -> pd.Series:
+    """
+    Parse a text() column of yyyy-mm-dd and dd-mm-yyyy dates, NaT if missing or invalid.
+    """
+    iso = values.str.replace(DMY_RE, DMY_TO_ISO, regex=True)
+    return pd.to_datetime(iso, format='%Y-%m-%d', errors='coerce').astype(DATE_DTYPE)
+
+
+def to_ints(values, dtype='Int32') -> pd.Series:
+    """
+    Parse a text() column of integers, ignoring spaces ('29 686'), NA if missing or invalid.
+    """
+    digits = values.str.replace(r'\s', '', regex=True)
+    return digits.where(digits.str.isdigit()).astype(dtype)
+
+
+def split_constituencies(values) -> tuple:
+    """
+    Split a text() column of '13  Kraków' into the number and city columns.
+    """
+    number = per_distinct(values, lambda value: split_constituency(value)[0], RECORD_DTYPES['constituency_no'])
+    city = per_distinct(values, lambda value: split_constituency(value)[1], 'string')
+    return number, city
+
+
+def decode_emails(values) -> pd.Series:
+    """
+    Decode a text() column of emails as encoded in the page source, decoded ones are left as they are.
+    """
+    for code, replacement in EMAIL_CODES:
+        values = values.str.replace(code, replacement, regex=False)
+    return values
+
+
+def canonical_names(values, aliases=None) -> pd.Series:
+    """
+    Canonical names of a text() column of clubs or party lists, see mp.canonical_name.
+    """
+    return per_distinct(values, lambda name: canonical_name(name, aliases), 'string')
+
+
+def normalize(raw: pd.DataFrame, term=9) -> pd.DataFrame:
+    """
+    Normalize a table of scraped MP rows into typed columns, in one go.
+
+    Parameters:
+    - raw (DataFrame): String columns of the store or mps.csv (df.COLUMNS),
+      e.g. ResultStore.to_df() or df.load_df().
+    - term (int): Term of the rows, unless the table has a term column.
+
+    Returns:
+    - DataFrame: Columns and dtypes of mp.records_to_df, ints nullable and dates mp.DATE_DTYPE.
+    """
+    raw = raw.reset_index(drop=True)
+
+    def column(name):
+        if name in raw:
+            return raw[name]
+        return pd.Series(pd.NA, index=raw.index, dtype='string')
+
+    # every raw column is cleaned once, the parsers below work on the clean strings
+    data = {name: text(column(name)) for name in RECORD_COLUMNS
+            if name not in ('term', 'constituency_no', 'constituency_city')}
+
+    data['term'] = (raw['term'] if 'term' in raw else pd.Series(term, index=raw.index)).astype(RECORD_DTYPES['term'])
+    data['id'] = data['id'].str.zfill(3)
+    data['constituency_no'], data['constituency_city'] = split_constituencies(text(column('constituency')))
+    data['no_of_votes'] = to_ints(data['no_of_votes'], RECORD_DTYPES['no_of_votes'])
+    data['email'] = decode_emails(data['email'])
+    data['club'] = canonical_names(data['club'], CLUB_ALIASES)
+    data['party_list'] = canonical_names(data['party_list'], PARTY_ALIASES)
+    for name in DATE_COLUMNS:
+        data[name] = to_dates(data[name])
+
+    return pd.DataFrame(data, columns=RECORD_COLUMNS)
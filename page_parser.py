@@ -0,0 +1,418 @@
+# regex -> dates
+import re
+from collections import namedtuple
+
+# lxml -> fast html parsing, optional
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+# selectolax -> fast html parsing, optional
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# ------------------------------------ < ------------------------------------ #
+
+# label id -> field, e.g. <p id="lblLista">Lista:</p><p>Prawo i Sprawiedliwość</p>
+LABEL_IDS = {
+    'lblLista': 'party_list',
+    'lblGlosy': 'no_of_votes',
+    'lblStaz': 'parliamentary_experience',
+    'lblWyksztalcenie': 'education',
+    'lblSzkola': 'school',
+    'lblZawod': 'profession',
+}
+
+# value id -> field, e.g. <p>Okręg wyborczy:</p><p id="okreg">13  Kraków</p>
+VALUE_IDS = {
+    'okreg': 'constituency',
+    'urodzony': 'birth_date_place',
+}
+
+# label text -> field, for labels without an id
+LABEL_TEXTS = {
+    'Wybrany dnia:': 'elected_date',
+    'Ślubowanie:': 'oath_date',
+    'Klub/koło:': 'club_name',
+}
+
+# label text -> field, only on pages of MPs whose mandate expired
+EXPIRATION_LABELS = {
+    'Wygaśnięcie mandatu:': 'expiration',
+    'Przyczyna wygaśnięcia mandatu:': 'expiration_reason',
+    'Przyczyna wygaśnięcia:': 'expiration_reason',
+    'Podstawa wygaśnięcia mandatu:': 'expiration_document',
+    'Dokument:': 'expiration_document',
+}
+LABEL_TEXTS.update(EXPIRATION_LABELS)
+
+# id of the <a> holding the encoded email address
+EMAIL_LINK_ID = 'view:_id1:_id2:facetMain:_id190:_id280'
+
+# dd-mm-yyyy
+DATE_RE = re.compile(r'(\d{2})-(\d{2})-(\d{4})')
+
+# table cells of the voting and speech lists -> a number, a date in either format
+INT_RE = re.compile(r'\d+')
+CELL_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4}')
+
+FIELDS = ['name', 'surname', 'elected_date', 'party_list', 'constituency', 'no_of_votes', 'oath_date',
+          'club_name', 'club_link', 'parliamentary_experience', 'birth_date', 'birth_place', 'education',
+          'school', 'profession', 'email', 'expiration_date', 'expiration_reason', 'expiration_document']
+
+
+class MPPage(namedtuple('MPPage', FIELDS, defaults=(None,) * len(FIELDS))):
+    """
+    All fields of an MP profile page, extracted in a single pass.
+    """
+
+    __slots__ = ()
+
+    def get_political_info(self) -> tuple:
+        """
+        Get the political information, in the order of PoliticalInfo.get_all_data.
+        """
+        return (
+            self.elected_date,
+            self.party_list,
+            self.constituency,
+            self.no_of_votes,
+            self.oath_date,
+            self.club_name,
+            self.parliamentary_experience
+        )
+
+    def get_personal_info(self) -> tuple:
+        """
+        Get the personal information, in the order of PersonalInfo.get_all_data.
+        """
+        return (
+            self.name,
+            self.surname,
+            self.birth_date,
+            self.birth_place,
+            self.education,
+            self.school,
+            self.profession
+        )
+
+    def get_expiration_info(self) -> tuple:
+        """
+        Get the mandate expiration information, all None while the mandate lasts.
+        """
+        return (
+            self.expiration_date,
+            self.expiration_reason,
+            self.expiration_document
+        )
+
+
+# ---------------------------------- helpers --------------------------------- #
+
+
+def iso_date(date):
+    """
+    Convert a dd-mm-yyyy date to yyyy-mm-dd, None if it does not match.
+    """
+    match = DATE_RE.search(date or '')
+    if match is None:
+        return None
+    day, month, year = match.groups()
+    return f'{year}-{month}-{day}'
+
+
+def first_int(text):
+    """
+    First number in a table cell, None if there is none.
+    """
+    match = INT_RE.search(text or '')
+    return int(match.group()) if match else None
+
+
+def to_iso_date(text):
+    """
+    First yyyy-mm-dd or dd-mm-yyyy date in a table cell as yyyy-mm-dd, None if there is none.
+    """
+    match = CELL_DATE_RE.search(text or '')
+    if match is None:
+        return None
+    date = match.group()
+    return date if date[4] == '-' else iso_date(date)
+
+
+def split_expiration(value):
+    """
+    Split the 'Wygaśnięcie mandatu' value, e.g. '24-05-2020, wybór do Parlamentu Europejskiego'.
+
+    Returns:
+    - tuple: (yyyy-mm-dd date, the reason following it or None).
+    """
+    if not value:
+        return None, None
+    date = iso_date(value)
+    reason = DATE_RE.sub('', value, count=1).strip(' \t\n,;:-()')
+    return date, reason or None
+
+
+def decode_email(encoded_email):
+    """
+    Decode the email address from html source code, same as Scraper.decode_email.
+    """
+    if not encoded_email:
+        return None
+    decoded_email = encoded_email.replace(
+        ' D O T ', '.').replace(' A T ', '@').replace('#', '')
+    return decoded_email.replace(' ', '')
+
+
+def field_for(label_id, label_text, value_id):
+    """
+    Get the field a label/value pair holds, None if it is not scraped.
+    """
+    return LABEL_IDS.get(label_id) or VALUE_IDS.get(value_id) or LABEL_TEXTS.get(label_text.strip())
+
+
+def build_page(title, values, club_name, club_link, first_value, email_href) -> MPPage:
+    """
+    Build the result object from the raw strings found in the page.
+    """
+    name, surname = title.rsplit(' ', 1) if title else (None, None)
+
+    birth_date = birth_place = None
+    if values.get('birth_date_place'):
+        parts = values['birth_date_place'].split(',')
+        birth_date = iso_date(parts[0])
+        birth_place = parts[1].strip() if len(parts) > 1 else None
+
+    expiration_date, expiration_reason = split_expiration(values.get('expiration'))
+
+    return MPPage(
+        name=name,
+        surname=surname,
+        # first value of the political section is the election date
+        elected_date=values.get('elected_date', first_value),
+        party_list=values.get('party_list'),
+        constituency=values.get('constituency'),
+        no_of_votes=values.get('no_of_votes'),
+        oath_date=iso_date(values.get('oath_date')),
+        club_name=club_name,
+        club_link=club_link,
+        parliamentary_experience=values.get('parliamentary_experience'),
+        birth_date=birth_date,
+        birth_place=birth_place,
+        education=values.get('education'),
+        school=values.get('school'),
+        profession=values.get('profession'),
+        email=decode_email(email_href),
+        expiration_date=expiration_date,
+        expiration_reason=values.get('expiration_reason') or expiration_reason,
+        expiration_document=values.get('expiration_document')
+    )
+
+
+# ----------------------------------- lxml ----------------------------------- #
+
+if etree is not None:
+    # compiled once, reused for every page
+    XP_TITLE = etree.XPath('(//h1)[1]')
+    XP_SECTIONS = etree.XPath(
+        "//div[contains(concat(' ', normalize-space(@class), ' '), ' partia ') or "
+        "contains(concat(' ', normalize-space(@class), ' '), ' cv ')]")
+    XP_EMAIL = etree.XPath(
+        "//a[@id=$link_id]/@href | (//a[contains(@href, ' A T ')])[1]/@href")
+
+
+def parse_lxml(html: str) -> MPPage:
+    """
+    Parse an MP profile page with lxml.
+    """
+    if lxml_html is None:
+        raise ImportError("lxml is required for the 'lxml' parser backend.")
+
+    doc = lxml_html.fromstring(html)
+
+    title = XP_TITLE(doc)
+    values = {}
+    club_name = club_link = first_value = None
+
+    # single walk over the <p> label/value pairs of both sections
+    for section in XP_SECTIONS(doc):
+        political = 'partia' in section.get('class', '').split()
+
+        if political and club_name is None:
+            link = section.find('.//a')
+            if link is not None:
+                club_name, club_link = link.text_content(), link.get('href')
+
+        consumed = None
+        for label in section.iter('p'):
+            if label is consumed:
+                continue
+            value = label.getnext()
+            if value is None or value.tag != 'p':
+                continue
+            consumed = value
+
+            if political and first_value is None:
+                first_value = value.text_content()
+
+            field = field_for(label.get('id'), label.text_content(), value.get('id'))
+            if field is not None and field not in values:
+                values[field] = value.text_content()
+
+    email_href = XP_EMAIL(doc, link_id=EMAIL_LINK_ID)
+
+    return build_page(
+        title[0].text_content() if title else None,
+        values,
+        club_name,
+        club_link,
+        first_value,
+        email_href[0] if email_href else None
+    )
+
+
+# -------------------------------- selectolax -------------------------------- #
+
+
+def next_element(node):
+    node = node.next
+    while node is not None and node.tag in ('-text', '-comment', '_comment'):
+        node = node.next
+    return node
+
+
+def parse_selectolax(html: str) -> MPPage:
+    """
+    Parse an MP profile page with selectolax.
+    """
+    if HTMLParser is None:
+        raise ImportError("selectolax is required for the 'selectolax' parser backend.")
+
+    tree = HTMLParser(html)
+
+    title = tree.css_first('h1')
+    values = {}
+    club_name = club_link = first_value = None
+
+    # single walk over the <p> label/value pairs of both sections
+    for section in tree.css('div.partia, div.cv'):
+        political = 'partia' in (section.attributes.get('class') or '').split()
+
+        if political and club_name is None:
+            link = section.css_first('a')
+            if link is not None:
+                club_name, club_link = link.text(), link.attributes.get('href')
+
+        consumed = None
+        for label in section.css('p'):
+            if consumed is not None and label.mem_id == consumed.mem_id:
+                continue
+            value = next_element(label)
+            if value is None or value.tag != 'p':
+                continue
+            consumed = value
+
+            if political and first_value is None:
+                first_value = value.text()
+
+            field = field_for(label.attributes.get('id'), label.text(), value.attributes.get('id'))
+            if field is not None and field not in values:
+                values[field] = value.text()
+
+    email = tree.css_first(f'a[id="{EMAIL_LINK_ID}"]') or tree.css_first('a[href*=" A T "]')
+
+    return build_page(
+        title.text() if title is not None else None,
+        values,
+        club_name,
+        club_link,
+        first_value,
+        email.attributes.get('href') if email is not None else None
+    )
+
+
+# ----------------------------------- bs4 ------------------------------------ #
+
+
+def parse_bs4(html: str) -> MPPage:
+    """
+    Parse an MP profile page with the BeautifulSoup based Scraper.
+    """
+    # local import -> the legacy scraper is only needed for this backend
+    from scraper import Scraper
+
+    scraper = Scraper(html)
+    political_info = scraper.get_political_info()
+    personal_info = scraper.get_personal_info()
+
+    elected_date, party_list, constituency, no_of_votes, oath_date, club_name, parliamentary_experience = political_info
+    name, surname, birth_date, birth_place, education, school, profession = personal_info
+    expiration_date, expiration_reason, expiration_document = scraper.get_expiration_info()
+
+    return MPPage(
+        name=name,
+        surname=surname,
+        elected_date=elected_date,
+        party_list=party_list,
+        constituency=constituency,
+        no_of_votes=no_of_votes,
+        oath_date=oath_date,
+        club_name=club_name,
+        club_link=scraper.club_link,
+        parliamentary_experience=parliamentary_experience,
+        birth_date=birth_date,
+        birth_place=birth_place,
+        education=education,
+        school=school,
+        profession=profession,
+        email=scraper.get_email_address(),
+        expiration_date=expiration_date,
+        expiration_reason=expiration_reason,
+        expiration_document=expiration_document
+    )
+
+
+# ------------------------------------ < ------------------------------------ #
+
+
+PARSERS = {
+    'lxml': parse_lxml,
+    'selectolax': parse_selectolax,
+    'bs4': parse_bs4,
+}
+
+
+def default_backend() -> str:
+    """
+    Get the fastest parser backend that is installed.
+    """
+    if lxml_html is not None:
+        return 'lxml'
+    if HTMLParser is not None:
+        return 'selectolax'
+    return 'bs4'
+
+
+def parse_mp_page(html: str, backend: str = None) -> MPPage:
+    """
+    Parse an MP profile page in a single pass.
+
+    Parameters:
+    - html (str): The html source of the page.
+    - backend (str): 'lxml', 'selectolax' or 'bs4' (default the fastest installed).
+
+    Returns:
+    - MPPage: All fields of the page.
+    """
+    backend = backend or default_backend()
+
+    if backend not in PARSERS:
+        raise ValueError(
+            f"Invalid parser backend: {backend}. It should be one of {tuple(PARSERS)}.")
+
+    return PARSERS[backend](html)
@@ -0,0 +1,156 @@
+# process pool -> cpu bound parsing off the fetching thread
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import logging
+
+from metrics import metrics
+
+# ------------------------------------ < ------------------------------------ #
+
+# pages waiting for or being parsed, per worker process, before fetching pauses
+DEFAULT_QUEUE_PER_WORKER = 4
+
+
+def timed_call(func, *args):
+    # runs in a worker -> its metrics would stay there, the duration goes back with the result
+    start = time.perf_counter()
+    return func(*args), time.perf_counter() - start
+
+
+class ParsePool:
+    """
+    Parses fetched pages in worker processes, decoupled from the fetchers.
+
+    The fetch stage (e.g. AsyncCrawler.crawl) is consumed as a producer: every
+    fetched page is handed to a process pool and the stage moves on to the
+    next one, so parsing runs on all cores while the fetchers keep going. At
+    most `max_pending` pages are queued or being parsed; beyond that the
+    producer is not read, which in turn stops the fetchers once their own
+    bounded buffer is full (backpressure).
+
+    Results come out as soon as they are parsed (unordered), or in the order
+    of the items given to map() (ordered); the reorder buffer counts towards
+    `max_pending`, except that the item next in order is always admitted.
+    """
+
+    def __init__(self, workers=None, max_pending=None, ordered=False):
+        """
+        Initialize the ParsePool instance.
+
+        Parameters:
+        - workers (int): Number of parser processes (default the number of cpus).
+        - max_pending (int): Max pages queued or being parsed (default 4 per worker).
+        - ordered (bool): Yield results in the order of the items, not of completion.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or DEFAULT_QUEUE_PER_WORKER * self.workers
+        self.ordered = ordered
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        # counters, for the logs
+        self.parsed = 0
+        self.peak_pending = 0
+
+    async def map(self, func, source, items=None):
+        """
+        Run `func(*args)` in the pool for every page of the producer.
+
+        Parameters:
+        - func (function): Module level (picklable) parse function.
+        - source (async iterable): Yields (item, args, error) tuples; args None skips
+          parsing (result None), an error is passed through.
+        - items (list): All items of the source, in order; required in ordered mode.
+
+        Yields:
+        - tuple: (item, result, error), error is None on success.
+        """
+        if self.ordered and items is None:
+            raise ValueError("Ordered mode needs the items in order.")
+
+        loop = asyncio.get_running_loop()
+        source = source.__aiter__()
+        order = deque(items) if self.ordered else None
+
+        # item -> future of its result, in admission order
+        pending = {}
+        pull = None
+        exhausted = False
+
+        def can_admit():
+            if len(pending) < self.max_pending:
+                return True
+            # the reorder buffer is full but the head has not arrived -> never block on it
+            return self.ordered and bool(order) and order[0] not in pending
+
+        def admit(item, args, error):
+            if error is not None:
+                future = loop.create_future()
+                future.set_exception(error)
+            elif args is None:
+                future = loop.create_future()
+                future.set_result(None)
+            else:
+                future = loop.run_in_executor(self._executor, timed_call, func, *args)
+            pending[item] = future
+            self.peak_pending = max(self.peak_pending, len(pending))
+
+        def ready():
+            if self.ordered:
+                if order and order[0] in pending and pending[order[0]].done():
+                    return [order.popleft()]
+                return []
+            return [item for item, future in pending.items() if future.done()]
+
+        try:
+            while True:
+                if pull is None and not exhausted and can_admit():
+                    pull = asyncio.ensure_future(source.__anext__())
+
+                for item in ready():
+                    future = pending.pop(item)
+                    error = future.exception()
+                    result = None
+                    if error is None and future.result() is not None:
+                        result, seconds = future.result()
+                        self.parsed += 1
+                        metrics.observe('stage_seconds', seconds, stage='parse')
+                        metrics.event('parse', seconds=round(seconds, 6), item=item, ok=True)
+                    yield item, result, error
+
+                # a full pool drained in one go leaves nothing pending -> only done once the source is
+                if exhausted and not pending:
+                    return
+
+                waiting = [future for future in pending.values() if not future.done()]
+                if pull is not None:
+                    waiting.append(pull)
+                if waiting:
+                    await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if pull is not None and pull.done():
+                    try:
+                        admit(*pull.result())
+                    except StopAsyncIteration:
+                        exhausted = True
+                    pull = None
+
+                    if exhausted and self.ordered and order and order[0] not in pending:
+                        raise RuntimeError(f"Item {order[0]} was never produced.")
+        finally:
+            if pull is not None:
+                pull.cancel()
+                await asyncio.gather(pull, return_exceptions=True)
+            for future in pending.values():
+                future.cancel()
+            if hasattr(source, 'aclose'):
+                await source.aclose()
+
+    def close(self):
+        logging.info(f"Closed parse pool, {self.parsed} pages parsed by {self.workers} workers, "
+                     f"at most {self.peak_pending} pending")
+        self._executor.shutdown(wait=True, cancel_futures=True)
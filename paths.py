@@ -6,5 +6,11 @@ current_folder = os.path.dirname(os.path.realpath(__file__))
 # data folder
 data_folder = f"{current_folder}/data"
 
+# cache folder -> id listings, http responses
+cache_folder = f"{data_folder}/cache"
+
 # logs folder
 logs_folder = f"{current_folder}/logs"
+
+# saved pages for benchmarks and offline runs
+fixtures_folder = f"{current_folder}/benchmarks/fixtures"
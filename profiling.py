@@ -0,0 +1,179 @@
+# cProfile/tracemalloc -> hot spots of a run, optional py-spy sampling
+import cProfile
+import datetime
+import io
+import linecache
+import logging
+import os
+import pstats
+import shutil
+import signal
+import subprocess
+import tracemalloc
+
+from paths import logs_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# per-run reports -> logs/profiles/<time>/
+PROFILES_FOLDER = f"{logs_folder}/profiles"
+
+# what can be profiled: deterministic cpu, allocations, sampled cpu (needs py-spy)
+PROFILERS = ('cpu', 'memory', 'sample')
+
+# functions and allocation sites listed in the text reports
+DEFAULT_TOP = 40
+
+# frames kept per allocation, more frames cost more memory and time
+DEFAULT_FRAMES = 10
+
+
+def parse_profilers(value: str) -> list:
+    profilers = [name.strip() for name in value.split(',') if name.strip()]
+    for name in profilers:
+        if name not in PROFILERS:
+            raise ValueError(f"Invalid profiler: {name}. It should be one of {PROFILERS}.")
+    return profilers
+
+
+class Profiler:
+    """
+    Profiles a block of code and writes its reports to a folder.
+
+    - cpu: cProfile of the calling thread -> cpu.pstats (for snakeviz,
+      gprof2dot or pstats) and cpu.txt, the top functions by cumulative and
+      own time.
+    - memory: tracemalloc -> memory.txt, the top allocation sites by line and
+      by traceback, plus the peak of traced memory.
+    - sample: py-spy, if installed, samples every thread of the process at a
+      low overhead -> sample.svg flame graph.
+
+    Use it as a context manager: `with Profiler(['cpu', 'memory']): ...`.
+    """
+
+    def __init__(self, profilers=('cpu', 'memory'), folder=None, top=DEFAULT_TOP, frames=DEFAULT_FRAMES):
+        """
+        Initialize the Profiler instance.
+
+        Parameters:
+        - profilers (list): Names from PROFILERS.
+        - folder (str): Folder of the reports (default logs/profiles/<time>).
+        - top (int): Number of functions and allocation sites in the text reports.
+        - frames (int): Frames kept per traced allocation.
+        """
+        self.profilers = list(profilers)
+        self.folder = folder or os.path.join(PROFILES_FOLDER, f"{datetime.datetime.now():%Y%m%dT%H%M%S}")
+        self.top = top
+        self.frames = frames
+
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+
+        if 'sample' in self.profilers:
+            self._sampler = self._start_sampler()
+
+        if 'memory' in self.profilers:
+            tracemalloc.start(self.frames)
+
+        # last -> the profilers' own startup is not in the profile
+        if 'cpu' in self.profilers:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+
+        # snapshot before the cpu report -> its allocations are not traced
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._write_memory(snapshot, peak)
+
+        if self._profile is not None:
+            self._write_cpu(self._profile)
+            self._profile = None
+
+        if self._sampler is not None:
+            self._stop_sampler(self._sampler)
+            self._sampler = None
+
+        logging.info(f"Profile written to {self.folder}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------------------------- reports --------------------------------- #
+
+    def _write_cpu(self, profile):
+        profile.dump_stats(os.path.join(self.folder, 'cpu.pstats'))
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream).strip_dirs()
+        stream.write(f"Top {self.top} functions by cumulative time\n")
+        stats.sort_stats('cumulative').print_stats(self.top)
+        stream.write(f"\nTop {self.top} functions by own time\n")
+        stats.sort_stats('tottime').print_stats(self.top)
+
+        with open(os.path.join(self.folder, 'cpu.txt'), 'w', encoding='utf-8') as f:
+            f.write(stream.getvalue())
+
+    def _write_memory(self, snapshot, peak):
+        # the profiler's own and the import machinery's allocations are noise
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ])
+
+        lines = [f"Peak traced memory: {peak / 1024 / 1024:.1f} MB", '',
+                 f"Top {self.top} allocation sites by line (still allocated at the end)"]
+        for i, stat in enumerate(snapshot.statistics('lineno')[:self.top], 1):
+            frame = stat.traceback[0]
+            code = linecache.getline(frame.filename, frame.lineno).strip()
+            lines.append(f"#{i:<3} {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            if code:
+                lines.append(f"       {code}")
+
+        lines += ['', f"Top {min(self.top, 10)} allocation tracebacks"]
+        for i, stat in enumerate(snapshot.statistics('traceback')[:min(self.top, 10)], 1):
+            lines.append(f"#{i} {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+
+        with open(os.path.join(self.folder, 'memory.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    # ---------------------------------- sampler --------------------------------- #
+
+    def _start_sampler(self):
+        # py-spy -> optional, an external sampling profiler attached to this process
+        py_spy = shutil.which('py-spy')
+        if py_spy is None:
+            logging.warning("py-spy is not installed, skipping the sampling profiler")
+            return None
+
+        return subprocess.Popen(
+            [py_spy, 'record', '--pid', str(os.getpid()), '--threads', '--subprocesses',
+             '--output', os.path.join(self.folder, 'sample.svg')],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def _stop_sampler(self, sampler):
+        # py-spy writes its output on SIGINT
+        sampler.send_signal(signal.SIGINT)
+        try:
+            _, stderr = sampler.communicate(timeout=30)
+        except subprocess.TimeoutExpired:
+            sampler.kill()
+            return
+        if sampler.returncode not in (0, -signal.SIGINT):
+            logging.warning(f"py-spy failed: {stderr.decode(errors='replace').strip()}")
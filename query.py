@@ -0,0 +1,346 @@
+# in-process queries over the MPs dataset -> typed columns, indexes, cached aggregates
+import datetime
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import export
+from df import CSV_PATH, load_df
+from normalize import normalize
+
+# ------------------------------------ < ------------------------------------ #
+
+# low cardinality string columns -> pandas categoricals
+CATEGORY_COLUMNS = ['party_list', 'club', 'constituency_city', 'education', 'profession', 'expiration_reason']
+
+# columns with a precomputed index, value -> row positions
+INDEX_COLUMNS = ['term', 'club', 'party_list', 'constituency_no']
+
+# the source is checked for changes at most this often, in seconds
+DEFAULT_CHECK_INTERVAL = 1.0
+
+# age_distribution() buckets, left closed
+AGE_BINS = (18, 30, 40, 50, 60, 70, 120)
+
+
+def freeze(value):
+    # filter values -> hashable cache keys
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(value, key=str))
+    return value
+
+
+def cached(method):
+    """
+    Cache the result of a query method by its arguments, until the source changes.
+
+    Results are shared between callers, copy them before modifying.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.check()
+        key = (method.__name__, tuple(freeze(arg) for arg in args),
+               tuple(sorted((name, freeze(value)) for name, value in kwargs.items())))
+        try:
+            return self._cache[key]
+        except KeyError:
+            result = self._cache[key] = method(self, *args, **kwargs)
+            return result
+    return wrapper
+
+
+# ---------------------------------- sources --------------------------------- #
+
+
+class DatasetSource:
+    """
+    Typed parquet/feather dataset written by export.py.
+    """
+
+    def __init__(self, folder=export.DATASET_FOLDER, file_format='parquet', terms=None):
+        self.folder = folder
+        self.file_format = file_format
+        self.terms = terms
+
+    def fingerprint(self):
+        # a new partition changes the folder, a new export replaces the file
+        stats = []
+        for term in self.terms or export.dataset_terms(self.folder):
+            stat = os.stat(export.term_path(term, self.file_format, self.folder))
+            stats.append((term, stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def load(self) -> pd.DataFrame:
+        return export.load_dataset(self.terms, self.file_format, self.folder)
+
+
+class StoreSource:
+    """
+    Results store, read in place; its change log tells when it changed.
+    """
+
+    def __init__(self, store, terms=None):
+        self.store = store
+        self.terms = terms
+
+    def fingerprint(self):
+        return self.store.last_change(), len(self.store)
+
+    def load(self) -> pd.DataFrame:
+        if not self.terms:
+            return self.store.to_typed_df()
+        return pd.concat([self.store.to_typed_df(term) for term in self.terms], ignore_index=True)
+
+
+class CsvSource:
+    """
+    Legacy mps.csv of a single term.
+    """
+
+    def __init__(self, path=CSV_PATH, term=9):
+        self.path = path
+        self.term = term
+
+    def fingerprint(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> pd.DataFrame:
+        return normalize(load_df(self.path), self.term)
+
+
+def default_source():
+    """
+    The typed dataset if it was exported, the legacy csv otherwise.
+    """
+    if export.pa is not None and export.dataset_terms():
+        return DatasetSource()
+    return CsvSource()
+
+
+# ----------------------------------- query ---------------------------------- #
+
+
+class MPQuery:
+    """
+    MP dataset loaded once into typed columns, with indexes and cached aggregates.
+
+    String columns of few values are categoricals, dates are datetime64 and
+    ints nullable; female (first name ending in 'a'), age and active are
+    derived on load. Rows of a club, party list, constituency or term are
+    looked up in an index instead of scanning the columns, and every
+    aggregate is computed once per set of arguments and then served from a
+    cache. The source is checked for changes at most every check_interval
+    seconds; a change reloads the data and empties the cache.
+
+    Filters are keyword arguments on columns, a list matches any of its
+    values: `q.count(by='party_list', term=9, club=['KP PiS', 'KP KO'])`.
+    """
+
+    def __init__(self, source=None, check_interval=DEFAULT_CHECK_INTERVAL, today=None):
+        """
+        Initialize the MPQuery instance.
+
+        Parameters:
+        - source: DatasetSource, StoreSource, CsvSource or a typed DataFrame
+          as built by mp.records_to_df or normalize.normalize (default: see default_source).
+        - check_interval (float): Seconds between checks of the source for changes, 0 checks on every call.
+        - today (datetime.date): Reference date of the ages (default the day of loading).
+        """
+        if isinstance(source, pd.DataFrame):
+            frame, source = source, None
+        else:
+            frame, source = None, source or default_source()
+
+        self.source = source
+        self.check_interval = check_interval
+        self.today = today
+
+        self.version = 0
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._cache = {}
+
+        if frame is not None:
+            self._build(frame)
+        else:
+            self.reload()
+
+    # ---------------------------------- loading --------------------------------- #
+
+    def reload(self):
+        """
+        Load the source again, rebuild the indexes and empty the cache.
+        """
+        start = time.perf_counter()
+        self._fingerprint = self.source.fingerprint()
+        self._checked_at = time.monotonic()
+        self._build(self.source.load())
+        logging.info(f"Loaded {len(self.frame)} MPs from {type(self.source).__name__} "
+                     f"in {time.perf_counter() - start:.3f}s")
+
+    def check(self):
+        """
+        Reload if the source changed, at most every check_interval seconds.
+        """
+        if self.source is None or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        if self.source.fingerprint() != self._fingerprint:
+            self.reload()
+
+    def _build(self, frame):
+        frame = frame.reset_index(drop=True)
+        for column in CATEGORY_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].astype('category')
+
+        today = pd.Timestamp(self.today or datetime.date.today())
+        birth = frame['birth_date']
+        # full years, one less before the birthday of this year
+        before_birthday = (birth.dt.month > today.month) | ((birth.dt.month == today.month) & (birth.dt.day > today.day))
+        frame['age'] = (today.year - birth.dt.year - before_birthday.astype(int)).astype('Int16')
+        frame['female'] = frame['name'].str.strip().str.endswith('a').fillna(False).astype(bool)
+        frame['active'] = frame['expiration_date'].isna()
+
+        self.frame = frame
+        # groupby indices -> sorted int positions per value, missing values left out
+        self._indexes = {column: frame.groupby(column, observed=True, sort=False).indices
+                         for column in INDEX_COLUMNS if column in frame}
+        self._cache = {}
+        self.version += 1
+
+    # --------------------------------- selection -------------------------------- #
+
+    def positions(self, **filters) -> np.ndarray:
+        """
+        Get the sorted row positions matching the filters.
+        """
+        positions = None
+        for column, value in filters.items():
+            if column not in self.frame:
+                raise KeyError(f"Unknown column: {column}")
+            values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+            if column in self._indexes:
+                index = self._indexes[column]
+                empty = np.empty(0, dtype=np.intp)
+                matched = np.unique(np.concatenate([index.get(v, empty) for v in values] or [empty]))
+            else:
+                matched = np.flatnonzero(self.frame[column].isin(values).to_numpy(dtype=bool, na_value=False))
+
+            positions = matched if positions is None else np.intersect1d(positions, matched, assume_unique=True)
+            if not len(positions):
+                break
+
+        return np.arange(len(self.frame)) if positions is None else positions
+
+    def select(self, columns=None, **filters) -> pd.DataFrame:
+        """
+        Get the rows matching the filters, e.g. `q.select(club='KP PiS', active=True)`.
+        """
+        rows = self.frame.iloc[self.positions(**filters)]
+        return rows if columns is None else rows[columns]
+
+    def _rows(self, filters):
+        if not filters:
+            return self.frame
+        return self.frame.iloc[self.positions(**filters)]
+
+    def _group(self, rows, by, column):
+        return rows.groupby(by, observed=True)[column]
+
+    # -------------------------------- aggregates -------------------------------- #
+
+    @cached
+    def count(self, by=None, **filters):
+        """
+        Number of MPs, per value of `by` if given.
+
+        Returns:
+        - int or pandas.Series: Counts, largest first.
+        """
+        if by is None:
+            return len(self.positions(**filters)) if filters else len(self.frame)
+        if by in self._indexes and not filters:
+            counts = pd.Series({value: len(rows) for value, rows in self._indexes[by].items()}, dtype='int64')
+        else:
+            counts = self._rows(filters).groupby(by, observed=True).size()
+        return counts.rename_axis(by).sort_values(ascending=False)
+
+    @cached
+    def women(self, by=None, **filters):
+        """
+        Number and share (percent) of women, per value of `by` if given.
+
+        Returns:
+        - dict or pandas.DataFrame: count and percent.
+        """
+        rows = self._rows(filters)
+        if by is None:
+            count = int(rows['female'].sum())
+            return {'count': count, 'percent': count / len(rows) * 100 if len(rows) else None}
+        female = self._group(rows, by, 'female')
+        result = pd.DataFrame({'count': female.sum(), 'percent': female.mean() * 100})
+        return result.sort_values('percent', ascending=False)
+
+    @cached
+    def share(self, column, value, by=None, **filters):
+        """
+        Percent of MPs whose `column` equals `value`, e.g. share('education', 'wyższe', by='party_list').
+        """
+        rows = self._rows(filters)
+        matches = rows[column].eq(value).fillna(False).astype(bool)
+        if by is None:
+            return matches.mean() * 100 if len(rows) else None
+        return (matches.groupby(rows[by], observed=True).mean() * 100).sort_values(ascending=False)
+
+    @cached
+    def age_stats(self, by=None, **filters):
+        """
+        Mean, median, youngest and oldest age, per value of `by` if given.
+
+        Returns:
+        - pandas.Series or pandas.DataFrame: count, mean, median, min and max.
+        """
+        rows = self._rows(filters)
+        stats = ['count', 'mean', 'median', 'min', 'max']
+        if by is None:
+            return rows['age'].astype('float64').agg(stats)
+        return self._group(rows, by, 'age').agg(stats).sort_values('mean', ascending=False)
+
+    @cached
+    def age_distribution(self, by=None, bins=AGE_BINS, **filters):
+        """
+        Number of MPs per age bucket, e.g. [30, 40), per value of `by` if given.
+        """
+        rows = self._rows(filters)
+        buckets = pd.cut(rows['age'].astype('float64'), list(bins), right=False)
+        if by is None:
+            return buckets.value_counts(sort=False)
+        return pd.crosstab(rows[by], buckets)
+
+    @cached
+    def votes(self, by=None, **filters):
+        """
+        Total votes, per value of `by` if given.
+        """
+        rows = self._rows(filters)
+        if by is None:
+            return int(rows['no_of_votes'].sum())
+        return self._group(rows, by, 'no_of_votes').sum().astype('int64').sort_values(ascending=False)
+
+    @cached
+    def value_counts(self, column, min_count=1, **filters):
+        """
+        Number of MPs per value of a column, e.g. value_counts('profession', min_count=2).
+        """
+        counts = self._rows(filters)[column].value_counts()
+        return counts[counts >= min_count]
@@ -0,0 +1,160 @@
+# requests -> conditional get of the MP listing
+import requests
+
+import json
+import logging
+import os
+import time
+
+from paths import cache_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# root of the site, SEJM_URL points the scraper elsewhere, e.g. at the benchmark mock server
+SEJM_URL = os.environ.get('SEJM_URL', 'https://sejm.gov.pl').rstrip('/')
+
+# listing pages are refetched (conditionally) after this many seconds
+DEFAULT_TTL = 24 * 60 * 60
+
+
+# listing types -> 'A' active MPs, 'B' MPs whose mandate expired
+MP_TYPES = {'A': 'active', 'B': 'expired'}
+
+
+def listing_url(term: int = 9, mp_type: str = 'A') -> str:
+    """
+    Get the url of the MP listing of the term, see MP_TYPES.
+    """
+    return f'{SEJM_URL}/Sejm{term}.nsf/poslowie.xsp?type={mp_type}'
+
+
+class MPRegistry:
+    """
+    Lazy, on-disk cached registry of MP ids.
+
+    Ids are discovered on first use, not at import. The listing is cached on
+    disk with its ETag/Last-Modified; within the TTL the cache is used as is,
+    after it the listing is revalidated with a conditional GET, and a stale
+    cache is still used when the site cannot be reached.
+    """
+
+    def __init__(self, folder=cache_folder, ttl=DEFAULT_TTL, timeout=10):
+        """
+        Initialize the MPRegistry instance.
+
+        Parameters:
+        - folder (str): Folder of the cache files.
+        - ttl (float): Seconds a cached listing is used without revalidation.
+        - timeout (float): Timeout of the listing request in seconds.
+        """
+        self._folder = folder
+        self._ttl = ttl
+        self._timeout = timeout
+
+        # ids already loaded in this process
+        self._ids = {}
+
+    def _cache_path(self, term, mp_type):
+        return os.path.join(self._folder, f'mp_ids_{term}_{mp_type}.json')
+
+    def _load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, path, entry):
+        os.makedirs(self._folder, exist_ok=True)
+
+        # write then rename -> a crash never leaves a half written cache
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _revalidate(self, url, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = requests.get(url, headers=headers, timeout=self._timeout)
+
+        if response.status_code == 304 and entry is not None:
+            logging.info(f"MP listing {url} not modified")
+            entry['fetched_at'] = time.time()
+            return entry
+
+        response.raise_for_status()
+
+        # local import -> bs4 is only needed when the listing changed
+        from scraper import parse_mp_ids
+
+        return {
+            'url': url,
+            'ids': parse_mp_ids(response.text),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+
+    def ids(self, term: int = 9, mp_type: str = 'A', refresh=False) -> list:
+        """
+        Get the MP ids of the listing.
+
+        Parameters:
+        - term (int): Sejm term.
+        - mp_type (str): Listing type, see MP_TYPES.
+        - refresh (bool): Revalidate even if the cache is fresh.
+
+        Returns:
+        - list: MP ids, e.g. ['001', '002', ...].
+        """
+        key = (term, mp_type)
+        if key in self._ids and not refresh:
+            return self._ids[key]
+
+        path = self._cache_path(term, mp_type)
+        entry = self._load(path)
+
+        fresh = entry is not None and time.time() - entry['fetched_at'] < self._ttl
+        if not fresh or refresh:
+            url = listing_url(term, mp_type)
+            try:
+                entry = self._revalidate(url, entry)
+                self._save(path, entry)
+            except requests.RequestException as e:
+                if entry is None:
+                    raise
+                logging.warning(
+                    f"Could not revalidate MP listing {url} ({e}), using cached ids")
+
+        self._ids[key] = entry['ids']
+        return entry['ids']
+
+
+# registry shared by the whole process
+registry = MPRegistry()
+
+
+def get_mp_ids(term: int = 9, mp_type: str = 'A') -> list:
+    """
+    Get the MP ids of the listing from the shared registry.
+    """
+    return registry.ids(term, mp_type)
+
+
+def get_term_mp_ids(term: int = 9, expired=False) -> list:
+    """
+    Get the ids of the active MPs of the term, and of the expired ones if asked.
+
+    Returns:
+    - list: Sorted MP ids, each id once.
+    """
+    ids = set(get_mp_ids(term, 'A'))
+    if expired:
+        ids.update(get_mp_ids(term, 'B'))
+    return sorted(ids)
@@ -5,31 +5,30 @@ from bs4 import BeautifulSoup
 # regex
 import re
 
-# datetime -> convert dates
-import datetime
-
 # requests -> get html
 import requests
 
 # import mp as mp
 
+# dd-mm-yyyy -> yyyy-mm-dd, a regex instead of strptime per page
+from page_parser import decode_email, iso_date
+
+# compiled once, reused for every page
+OATH_LABEL_RE = re.compile('Ślubowanie:')
+
 # -------------------------- get all active MPs ids -------------------------- #
 
 
-def get_all_active_mp_ids(
-        term: int = 9,
-):
+def parse_mp_ids(html):
     """
-    Get all active MPs ids from the main page.
+    Parse MPs ids from the html of the MPs listing.
 
     Returns:
-    - list: A list containing all active MPs ids.
+    - list: A list containing the MPs ids.
     """
 
-    url = f'https://sejm.gov.pl/Sejm{term}.nsf/poslowie.xsp?type=A'
-
     # create soup object
-    soup = BeautifulSoup(requests.get(url).text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
     # main site, div id="contentBody"
     main_site = soup.find('div', {'id': 'contentBody'})
@@ -58,10 +57,26 @@ def get_all_active_mp_ids(
 
     return ids
 
-# ------------------------------------- < ------------------------------------ #
 
+def get_all_active_mp_ids(
+        term: int = 9,
+):
+    """
+    Get all active MPs ids from the main page.
 
-ids = get_all_active_mp_ids()
+    Always hits the network, use registry.get_mp_ids for the cached ids.
+
+    Returns:
+    - list: A list containing all active MPs ids.
+    """
+
+    # local import -> registry imports this module lazily
+    from registry import listing_url
+    url = listing_url(term, 'A')
+
+    return parse_mp_ids(requests.get(url).text)
+
+# ------------------------------------- < ------------------------------------ #
 
 
 class Scraper:
@@ -78,12 +93,16 @@ class Scraper:
         self._retries = retries
 
         self._soup = BeautifulSoup(html, 'html.parser')
-        self._party_info = self.get_political_info()
-        self._personal_info = self.get_personal_info()
 
+        # info objects are built on first use and reused afterwards
+        self._political_info = None
+        self._personal_info = None
+
+        # filled by get_expiration_info, None while the mandate lasts
         self.expiration_date = None
         self.expiration_reason = None
         self.expiration_document = None
+        self._expiration_parsed = False
 
     # ---------------------------- party info section ---------------------------- #
 
@@ -94,12 +113,43 @@ class Scraper:
         Returns:
         - tuple: A tuple containing the party information.
         """
-        political_info_data = self._soup.find(
-            'div', {'class': 'partia'}).find('ul', {'class': 'data'})
+        if self._political_info is None:
+            political_info_data = self._soup.find(
+                'div', {'class': 'partia'}).find('ul', {'class': 'data'})
+
+            self._political_info = PoliticalInfo(political_info_data)
+
+        return self._political_info.get_all_data()
+
+    @property
+    def club_link(self):
+        self.get_political_info()
+        return self._political_info.club_link
+
+    def get_expiration_info(self) -> tuple:
+        """
+        Get the mandate expiration information of the political section.
+
+        Returns:
+        - tuple: expiration date (yyyy-mm-dd), reason and document, all None while the mandate lasts.
+        """
+        if not self._expiration_parsed:
+            # local import -> page_parser holds the label tables
+            from page_parser import EXPIRATION_LABELS, split_expiration
+
+            values = {}
+            for label in self._soup.find('div', {'class': 'partia'}).find_all('p'):
+                field = EXPIRATION_LABELS.get(label.text.strip())
+                value = label.find_next_sibling('p')
+                if field is not None and value is not None and field not in values:
+                    values[field] = value.text
 
-        political_info = PoliticalInfo(political_info_data)
+            self.expiration_date, reason = split_expiration(values.get('expiration'))
+            self.expiration_reason = values.get('expiration_reason') or reason
+            self.expiration_document = values.get('expiration_document')
+            self._expiration_parsed = True
 
-        return political_info.get_all_data()
+        return self.expiration_date, self.expiration_reason, self.expiration_document
 
     # ------------------------------- personal info ------------------------------ #
 
@@ -111,9 +161,10 @@ class Scraper:
         - tuple: A tuple containing the personal information.
         """
 
-        personal_info = PersonalInfo(self._soup)
+        if self._personal_info is None:
+            self._personal_info = PersonalInfo(self._soup)
 
-        return personal_info.get_all_data()
+        return self._personal_info.get_all_data()
 
     # getter -> get email
 
@@ -127,10 +178,8 @@ class Scraper:
         Returns:
             decoded_email (str): example: 'Krzysztof.Bosak@sejm.pl'
         """
-        decoded_email = encoded_email.replace(
-            ' D O T ', '.').replace(' A T ', '@').replace('#', '')
-        decoded_email = decoded_email.replace(' ', '')
-        return decoded_email
+        # one implementation for every parser backend, normalize.decode_emails for whole columns
+        return decode_email(encoded_email)
 
     # get email
     def get_email_address(self):
@@ -247,10 +296,8 @@ class PoliticalInfo(Info):
             'p', {'id': 'lblGlosy'}).find_next_sibling('p').text
 
     def set_oath_date(self):
-        oath_date = self._data.find('p', string=re.compile(
-            'Ślubowanie:')).find_next_sibling('p').text
-        self._oath_date = datetime.datetime.strptime(
-            oath_date, '%d-%m-%Y').strftime('%Y-%m-%d')
+        oath_date = self._data.find('p', string=OATH_LABEL_RE).find_next_sibling('p').text
+        self._oath_date = iso_date(oath_date)
 
     def set_club(self):
         self._club = ClubInfo(self._data)
@@ -339,12 +386,14 @@ class PersonalInfo(Info):
         self._name, self._surname = name.rsplit(' ', 1)
 
     def set_birth_date_and_place(self):
+        # pages without the birth line -> both stay unset
+        self._birth_date = None
+        self._birth_place = None
         birth_date_place = self.find_data('p', {'id': 'urodzony'})
         if birth_date_place:
             birth_date_place = birth_date_place.text
             parts = birth_date_place.split(',')
-            self._birth_date = datetime.datetime.strptime(
-                parts[0].strip(), '%d-%m-%Y').strftime('%Y-%m-%d')
+            self._birth_date = iso_date(parts[0])
             self._birth_place = parts[1].strip() if len(parts) > 1 else None
 
     def set_education(self):
@@ -0,0 +1,405 @@
+# ---------------------------------- imports --------------------------------- #
+import argparse
+import asyncio
+import datetime
+import logging
+import sqlite3
+import zlib
+from collections import namedtuple
+from urllib.parse import urljoin
+
+# lxml -> fast html parsing, optional
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# local imports
+from checkpoint import Checkpoint
+from cli import add_common_args, build_crawler, open_fetcher, setup_logging
+from fetcher import FETCHERS
+from http_cache import digest_of
+from mp import MP_Site
+from page_parser import CELL_DATE_RE, first_int, to_iso_date
+from paths import data_folder
+from registry import get_term_mp_ids
+from store import STORE_PATH
+
+# ------------------------------------- < ------------------------------------ #
+
+# speeches and their full-text index, kept apart from the MP records
+SPEECHES_PATH = f"{data_folder}/speeches.sqlite"
+
+# list pages of an MP link to each other with this symbol, speeches do not
+LIST_SYMBOL = 'WYPOWIEDZI_POSLA'
+
+# containers of the transcript on a speech page, most specific first
+TEXT_XPATHS = (
+    '//div[contains(@class, "stenogram")]',
+    '//div[@id="view:_id1:_id2:facetMain"]',
+    '//body',
+)
+
+# a single speech, as returned by SpeechStore queries
+Speech = namedtuple('Speech', ['term', 'mp_id', 'url', 'sitting', 'date', 'topic', 'text'])
+
+
+def require_dependencies():
+    if lxml_html is None:
+        raise ImportError("lxml is required to scrape speeches.")
+
+
+# ---------------------------------- parsing --------------------------------- #
+
+
+def parse_speech_list(html, base_url):
+    """
+    Parse a page of the MP's speech list.
+
+    Parameters:
+    - html (str): The html of a list page (MP_Site.mp_speech_site).
+    - base_url (str): Url of the page, to resolve relative links.
+
+    Returns:
+    - tuple: (speeches, pages) -> a dict per speech (url, sitting, date, topic),
+      and the urls of the other list pages linked from this one.
+    """
+    doc = lxml_html.fromstring(html)
+
+    speeches = []
+    pages = []
+    seen = {base_url}
+    for link in doc.iterfind('.//a[@href]'):
+        url = urljoin(base_url, link.get('href'))
+        if url in seen:
+            continue
+        seen.add(url)
+
+        if LIST_SYMBOL in url:
+            pages.append(url)
+            continue
+
+        row = next(link.iterancestors('tr'), None)
+        if row is None:
+            continue
+
+        cells = [cell.text_content().strip() for cell in row.iter('td')]
+        speeches.append({
+            'url': url,
+            'sitting': next((first_int(cell) for cell in cells if cell.isdigit()), None),
+            'date': next((to_iso_date(cell) for cell in cells if CELL_DATE_RE.search(cell)), None),
+            'topic': max(cells, key=len) if cells else link.text_content().strip(),
+        })
+
+    return speeches, pages
+
+
+def parse_speech_text(html):
+    """
+    Extract the plain text of the transcript from a speech page.
+    """
+    doc = lxml_html.fromstring(html)
+
+    for xpath in TEXT_XPATHS:
+        nodes = doc.xpath(xpath)
+        if nodes:
+            break
+    else:
+        return ''
+
+    for node in nodes[0].iter('script', 'style'):
+        node.drop_tree()
+
+    lines = (line.strip() for line in nodes[0].text_content().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+# ----------------------------------- store ---------------------------------- #
+
+
+class SpeechStore:
+    """
+    Speech transcripts with a full-text index.
+
+    Texts are zlib-compressed and stored once per content (keyed by sha256),
+    speeches point at them. The FTS5 index is contentless, it only holds the
+    inverted index and maps matches back to the rowid of the speech, so the
+    text is not stored twice.
+
+    Speeches of an MP are added in a single transaction, committed with
+    commit() once the whole speech list was walked; an interrupted crawl
+    leaves the MP as it was before.
+    """
+
+    def __init__(self, path=SPEECHES_PATH):
+        """
+        Initialize the SpeechStore instance.
+
+        Parameters:
+        - path (str): Path of the sqlite database.
+        """
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS texts (
+                digest TEXT PRIMARY KEY,
+                body BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS speeches (
+                id INTEGER PRIMARY KEY,
+                term INTEGER NOT NULL,
+                mp_id TEXT NOT NULL,
+                url TEXT NOT NULL UNIQUE,
+                sitting INTEGER,
+                date TEXT,
+                topic TEXT,
+                digest TEXT NOT NULL,
+                scraped_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS speeches_mp ON speeches (term, mp_id, date);
+            CREATE VIRTUAL TABLE IF NOT EXISTS speeches_fts USING fts5 (
+                topic, text, content='', tokenize='unicode61 remove_diacritics 2'
+            );
+        ''')
+        self._conn.commit()
+
+    def urls(self, mp_id, term: int = 9) -> set:
+        """
+        Get the urls of the speeches of the MP already in the store.
+        """
+        rows = self._conn.execute('SELECT url FROM speeches WHERE term = ? AND mp_id = ?', (term, mp_id))
+        return {url for url, in rows}
+
+    def latest(self, mp_id, term: int = 9):
+        """
+        Get the date of the newest speech of the MP, None if there is none.
+        """
+        return self._conn.execute(
+            'SELECT MAX(date) FROM speeches WHERE term = ? AND mp_id = ?', (term, mp_id)).fetchone()[0]
+
+    def add(self, speech: dict, text: str, mp_id, term: int = 9):
+        """
+        Add a speech to the current transaction, see commit().
+
+        Parameters:
+        - speech (dict): Speech of the list page, see parse_speech_list().
+        - text (str): Plain text of the transcript.
+        """
+        digest = digest_of(text)
+        self._conn.execute('INSERT OR IGNORE INTO texts (digest, body) VALUES (?, ?)',
+                           (digest, zlib.compress(text.encode('utf-8'), 9)))
+
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        cursor = self._conn.execute(
+            'INSERT OR IGNORE INTO speeches (term, mp_id, url, sitting, date, topic, digest, scraped_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (term, mp_id, speech['url'], speech['sitting'], speech['date'], speech['topic'], digest, now))
+
+        # already stored under this url -> already indexed
+        if cursor.rowcount:
+            self._conn.execute('INSERT INTO speeches_fts (rowid, topic, text) VALUES (?, ?, ?)',
+                               (cursor.lastrowid, speech['topic'], text))
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def text(self, digest) -> str:
+        row = self._conn.execute('SELECT body FROM texts WHERE digest = ?', (digest,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def search(self, query: str, term=None, mp_id=None, limit=20) -> list:
+        """
+        Search the transcripts, best matches first.
+
+        Parameters:
+        - query (str): FTS5 query, e.g. 'budżet', '"ustawa o podatku"', 'szpital NOT covid'.
+          Diacritics are ignored, 'budzet' matches 'budżet'.
+        - term (int): Only speeches of this Sejm term.
+        - mp_id (str): Only speeches of this MP.
+        - limit (int): Max number of speeches returned.
+
+        Returns:
+        - list: Speech tuples, with their text.
+        """
+        sql = '''
+            SELECT s.term, s.mp_id, s.url, s.sitting, s.date, s.topic, s.digest
+            FROM speeches_fts JOIN speeches s ON s.id = speeches_fts.rowid
+            WHERE speeches_fts MATCH ?
+        '''
+        params = [query]
+        if term is not None:
+            sql += ' AND s.term = ?'
+            params.append(term)
+        if mp_id is not None:
+            sql += ' AND s.mp_id = ?'
+            params.append(mp_id)
+        sql += ' ORDER BY speeches_fts.rank LIMIT ?'
+        params.append(limit)
+
+        return [Speech(*row[:-1], self.text(row[-1])) for row in self._conn.execute(sql, params).fetchall()]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ---------------------------------- crawl ----------------------------------- #
+
+
+async def crawl_mp_speeches(crawler, store, term, mp_id, since=None, expired=False):
+    """
+    Crawl the speeches of an MP that are not in the store yet.
+
+    The list is walked newest first: when the first page already reaches back
+    to `since`, the other list pages are not fetched. Otherwise the list pages
+    are crawled as a frontier: every page may link to pages not seen yet (the
+    site shows a window of page links), those are fetched concurrently in the
+    next round, until no new page turns up. Speech pages are fetched
+    concurrently as well.
+
+    Parameters:
+    - since (str): Date of the newest speech of a complete previous crawl, or None.
+    - expired (bool): Expired MPs were asked for, see mp.MP_Site.
+
+    Returns:
+    - int: Number of speeches added.
+    """
+    list_url = MP_Site(mp_id, term, expired).mp_speech_site
+    speeches, pages = parse_speech_list(await crawler.fetch(list_url), list_url)
+
+    reaches_back = since is not None and any(
+        speech['date'] is not None and speech['date'] < since for speech in speeches)
+
+    if not reaches_back:
+        async def list_job(url):
+            return parse_speech_list(await crawler.fetch(url), url)
+
+        seen = {list_url, *pages}
+        frontier = list(dict.fromkeys(pages))
+        while frontier:
+            found = []
+            async for url, result, error in crawler.crawl(frontier, list_job):
+                if error is not None:
+                    raise error
+                page_speeches, page_links = result
+                speeches.extend(page_speeches)
+                found.extend(link for link in page_links if link not in seen)
+                seen.update(page_links)
+            frontier = found
+
+    known = store.urls(mp_id, term)
+    new = {}
+    for speech in speeches:
+        if speech['url'] in known:
+            continue
+        if since is not None and speech['date'] is not None and speech['date'] < since:
+            continue
+        new[speech['url']] = speech
+
+    async def speech_job(speech):
+        return parse_speech_text(await crawler.fetch(speech['url']))
+
+    async for speech, text, error in crawler.crawl(list(new.values()), speech_job):
+        if error is not None:
+            raise error
+        store.add(speech, text, mp_id, term)
+
+    return len(new)
+
+
+async def crawl_speeches(tasks, fetcher, store, checkpoint, args):
+    """
+    Crawl the new speeches of every (term, id) task, one MP at a time.
+    """
+    crawler = build_crawler(fetcher, args)
+
+    try:
+        for term, mp_id in tasks:
+            # the newest date is only a safe cutoff if the last crawl got everything
+            since = store.latest(mp_id, term) if checkpoint.is_done(mp_id, term) else None
+            try:
+                added = await crawl_mp_speeches(crawler, store, term, mp_id, since, args.expired)
+            except Exception as e:
+                store.rollback()
+                logging.error(f"Failed to scrape speeches of MP index: {mp_id} of term {term} ({e})")
+                checkpoint.mark_failed(mp_id, e, term)
+                continue
+
+            store.commit()
+            checkpoint.mark_done(mp_id, term=term)
+            logging.info(f"Scraped {added} new speeches of MP index: {mp_id} of term {term}")
+    finally:
+        logging.info(f"Throttle state: {crawler.throttle.state}")
+        crawler.close()
+
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description="Scrape speeches of Polish MPs from sejm.gov.pl")
+
+    add_common_args(parser)
+    parser.add_argument('--fetcher', choices=FETCHERS, default='http')
+    parser.add_argument('--search', metavar='QUERY',
+                        help="search the stored speeches instead of scraping")
+    parser.add_argument('--mp', help="with --search, only speeches of this MP id")
+    parser.add_argument('--limit', type=int, default=20,
+                        help="with --search, max number of speeches shown")
+
+    return parser.parse_args()
+
+
+def search(store, args):
+    term = args.terms[0] if len(args.terms) == 1 else None
+    for speech in store.search(args.search, term=term, mp_id=args.mp, limit=args.limit):
+        print(f"[{speech.term}/{speech.mp_id}] {speech.date} {speech.topic}\n  {speech.url}")
+
+
+def main():
+
+    args = parse_args()
+
+    store = SpeechStore()
+
+    if args.search:
+        try:
+            search(store, args)
+        finally:
+            store.close()
+        return
+
+    require_dependencies()
+
+    # resume index of MPs whose speech list was walked completely
+    checkpoint = Checkpoint(STORE_PATH, table='speeches_checkpoint')
+
+    tasks = []
+    for term in args.terms:
+        ids = get_term_mp_ids(term, args.expired)
+        # every MP is revisited, only speeches newer than the last crawl are fetched
+        pending = checkpoint.pending(ids, term, only_failed=True) if args.only_failed else ids
+        logging.info(f"Speeches of {len(pending)} MPs of term {term} to scrape")
+        tasks.extend((term, mp_id) for mp_id in pending)
+
+    try:
+        # speech pages are rendered server side -> no markers, chrome is never needed
+        with open_fetcher(args, markers=(), wait_for=()) as (fetcher, args):
+            asyncio.run(crawl_speeches(tasks, fetcher, store, checkpoint, args))
+    finally:
+        checkpoint.close()
+        store.close()
+
+
+if __name__ == "__main__":
+
+    setup_logging()
+
+    main()
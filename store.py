@@ -0,0 +1,361 @@
+# sqlite -> append-only results store
+import sqlite3
+import hashlib
+import json
+import datetime
+import logging
+import os
+
+import pandas as pd
+
+from df import COLUMNS, CSV_PATH, load_df, save_df_to_csv
+from mp import MP, legacy_date
+from normalize import normalize
+from paths import data_folder
+
+# ------------------------------------ < ------------------------------------ #
+
+# default location of the results store
+STORE_PATH = f"{data_folder}/mps.sqlite"
+
+# operations of the change log
+INSERT = 'insert'
+UPDATE = 'update'
+EXPIRE = 'expire'
+
+
+def dump_record(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def normalize_record(record: dict) -> dict:
+    # csv imports hold ints where scraped records hold strings -> compare as text
+    record = {field: value if value is None or isinstance(value, str) else str(value)
+              for field, value in record.items()}
+    # elected_date used to be stored as dd-mm-yyyy -> same content as the iso date
+    if record.get('elected_date'):
+        record['elected_date'] = legacy_date(record['elected_date'])
+    return record
+
+
+def record_hash(record: dict) -> str:
+    """
+    Hash of the record content, independent of the order of its fields.
+    """
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def diff_records(old: dict, new: dict) -> dict:
+    """
+    Field level diff of two records.
+
+    Returns:
+    - dict: field -> [old value, new value], only the fields that differ.
+    """
+    return {
+        field: [old.get(field), new.get(field)]
+        for field in dict.fromkeys([*old, *new])
+        if old.get(field) != new.get(field)
+    }
+
+
+class ResultStore:
+    """
+    Persistent store of scraped MP records, keyed by (term, id).
+
+    Every record is committed on its own in a WAL-mode sqlite database, so an
+    interrupted run keeps everything scraped so far and a record costs one
+    small write instead of a full rewrite of the csv. The csv is materialised
+    from the store on demand.
+
+    Every record is stored with the hash of its content; a rescraped record
+    with the same hash is not rewritten, a new or changed one is written
+    together with an entry of the change log (inserts with the full record,
+    updates with the changed fields only, expirations of MPs that left the
+    listing), so consumers can ingest deltas with changes(since).
+    """
+
+    def __init__(self, path=STORE_PATH, csv_path=None):
+        """
+        Initialize the ResultStore instance.
+
+        Parameters:
+        - path (str): Path of the sqlite database.
+        - csv_path (str): Legacy csv imported into a new, empty store (default data/mps.csv).
+        """
+        self.path = path
+
+        # timeout -> worker processes wait for each other's commits
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS mps (
+                term INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                scraped_at TEXT NOT NULL,
+                PRIMARY KEY (term, id)
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY,
+                term INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                op TEXT NOT NULL,
+                data TEXT NOT NULL,
+                changed_at TEXT NOT NULL
+            );
+        ''')
+
+        # stores created before the change log -> hashes are filled in lazily
+        columns = {name for _, name, *_ in self._conn.execute('PRAGMA table_info(mps)')}
+        if 'hash' not in columns:
+            self._conn.execute('ALTER TABLE mps ADD COLUMN hash TEXT')
+        if 'expired_at' not in columns:
+            self._conn.execute('ALTER TABLE mps ADD COLUMN expired_at TEXT')
+        self._conn.commit()
+
+        # first run after the csv era -> keep what was already scraped
+        if len(self) == 0:
+            self.import_csv(csv_path or CSV_PATH)
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM mps').fetchone()[0]
+
+    def terms(self) -> list:
+        """
+        Get the terms with stored MPs, in order.
+        """
+        return [term for (term,) in self._conn.execute('SELECT DISTINCT term FROM mps ORDER BY term')]
+
+    def ids(self, term: int = 9) -> set:
+        """
+        Get the ids of all stored MPs of the term.
+        """
+        return {mp_id for (mp_id,) in self._conn.execute('SELECT id FROM mps WHERE term = ?', (term,))}
+
+    def expired_ids(self, term: int = 9) -> set:
+        """
+        Get the ids of stored MPs of the term whose mandate expired, their pages no longer change.
+        """
+        return {mp_id for (mp_id,) in self._conn.execute(
+            "SELECT id FROM mps WHERE term = ? AND json_extract(data, '$.expiration_date') IS NOT NULL", (term,))}
+
+    def _log(self, term, mp_id, op, data, now):
+        self._conn.execute(
+            'INSERT INTO changes (term, id, op, data, changed_at) VALUES (?, ?, ?, ?, ?)',
+            (term, mp_id, op, dump_record(data), now))
+
+    def add(self, record: dict, term: int = 9):
+        """
+        Insert or update a single record and commit it, an update keeps the record's position.
+
+        Parameters:
+        - record (dict): MP data keyed by column name, has to contain 'id'.
+        - term (int): Sejm term the record belongs to.
+
+        An expired MP stays expired: a record with an expiration date comes
+        from the expired listing (--expired), not back from the active one.
+
+        Returns:
+        - str or None: The logged operation (INSERT or UPDATE), None if the record did not change.
+        """
+        record = normalize_record(record)
+        digest = record_hash(record)
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        expired_at = None
+
+        with self._conn:
+            # immediate -> other workers cannot change the record between the read and the write
+            self._conn.execute('BEGIN IMMEDIATE')
+            row = self._conn.execute(
+                'SELECT data, hash, expired_at FROM mps WHERE term = ? AND id = ?', (term, record['id'])).fetchone()
+
+            if row is None:
+                op, change = INSERT, record
+            else:
+                data, old_digest, expired_at = row
+                old = normalize_record(json.loads(data))
+                # mandate expired -> the MP is not back on the active listing, it keeps its expiration
+                if expired_at is not None and record.get('expiration_date'):
+                    back_on_listing = False
+                else:
+                    back_on_listing = expired_at is not None
+                    expired_at = None
+                if (old_digest or record_hash(old)) == digest and not back_on_listing:
+                    self._conn.execute('UPDATE mps SET scraped_at = ?, hash = ? WHERE term = ? AND id = ?',
+                                       (now, digest, term, record['id']))
+                    return None
+                op, change = UPDATE, diff_records(old, record)
+                if back_on_listing:
+                    change['expired_at'] = [row[2], None]
+                elif not change:
+                    # only new, empty columns -> same content, rehashed without a change
+                    self._conn.execute('UPDATE mps SET data = ?, scraped_at = ?, hash = ? WHERE term = ? AND id = ?',
+                                       (dump_record(record), now, digest, term, record['id']))
+                    return None
+
+            self._conn.execute(
+                'INSERT INTO mps (term, id, data, scraped_at, hash, expired_at) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (term, id) DO UPDATE SET data = excluded.data, scraped_at = excluded.scraped_at, '
+                'hash = excluded.hash, expired_at = excluded.expired_at',
+                (term, record['id'], dump_record(record), now, digest, expired_at)
+            )
+            self._log(term, record['id'], op, change, now)
+
+        return op
+
+    def expire_missing(self, term: int, listed_ids) -> list:
+        """
+        Log the expiration of stored MPs of the term that are no longer listed.
+
+        Parameters:
+        - term (int): Sejm term.
+        - listed_ids (iterable): Ids of the current listing of active MPs.
+
+        Returns:
+        - list: Ids expired by this call.
+        """
+        listed_ids = set(listed_ids)
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+
+        with self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            expired = [mp_id for (mp_id,) in self._conn.execute(
+                'SELECT id FROM mps WHERE term = ? AND expired_at IS NULL ORDER BY rowid', (term,))
+                if mp_id not in listed_ids]
+
+            for mp_id in expired:
+                self._conn.execute('UPDATE mps SET expired_at = ? WHERE term = ? AND id = ?', (now, term, mp_id))
+                self._log(term, mp_id, EXPIRE, {}, now)
+
+        return expired
+
+    def last_change(self) -> int:
+        """
+        Get the sequence number of the newest change, 0 if there is none.
+        """
+        return self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    def changes(self, since: int = 0, term=None):
+        """
+        Iterate over the change log, oldest first.
+
+        Parameters:
+        - since (int): Only changes after this sequence number, e.g. the last one a consumer ingested.
+        - term (int): Only changes of this term.
+
+        Yields:
+        - dict: seq, term, id, op, changed_at and data (the record for inserts,
+          field -> [old, new] for updates, empty for expirations).
+        """
+        query = 'SELECT seq, term, id, op, data, changed_at FROM changes WHERE seq > ?'
+        params = (since,)
+        if term is not None:
+            query += ' AND term = ?'
+            params += (term,)
+        query += ' ORDER BY seq'
+
+        for seq, change_term, mp_id, op, data, changed_at in self._conn.execute(query, params):
+            yield {'seq': seq, 'term': change_term, 'id': mp_id, 'op': op,
+                   'changed_at': changed_at, 'data': json.loads(data)}
+
+    def export_changes(self, path, since: int = 0) -> int:
+        """
+        Write the changes after `since` to a jsonl file, one change per line.
+
+        Returns:
+        - int: Number of changes written.
+        """
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for change in self.changes(since):
+                f.write(dump_record(change) + '\n')
+                count += 1
+        return count
+
+    def records(self, term=None):
+        """
+        Iterate over stored records, by term in the order they were first scraped.
+
+        Parameters:
+        - term (int): Only records of this term (default all terms).
+
+        Yields:
+        - dict: MP data keyed by column name.
+        """
+        query = 'SELECT data FROM mps'
+        params = ()
+        if term is not None:
+            query += ' WHERE term = ?'
+            params = (term,)
+        query += ' ORDER BY term, rowid'
+
+        for (data,) in self._conn.execute(query, params):
+            yield json.loads(data)
+
+    def mps(self, term=None):
+        """
+        Iterate over stored records as typed MP records, in the order of records().
+        """
+        query = 'SELECT term, data FROM mps'
+        params = ()
+        if term is not None:
+            query += ' WHERE term = ?'
+            params = (term,)
+        query += ' ORDER BY term, rowid'
+
+        for record_term, data in self._conn.execute(query, params):
+            yield MP.from_row(json.loads(data), record_term)
+
+    def to_df(self, term=None) -> pd.DataFrame:
+        """
+        Build a DataFrame of the string columns of stored records, in one go.
+        """
+        return pd.DataFrame(list(self.records(term)), columns=COLUMNS)
+
+    def to_typed_df(self, term=None) -> pd.DataFrame:
+        """
+        Build a typed DataFrame (ints, dates, split constituency) of stored records, in one go.
+
+        The string columns are normalized whole columns at a time, see normalize.normalize.
+        """
+        terms = [term] if term is not None else self.terms()
+        frames = [normalize(self.to_df(record_term), record_term) for record_term in terms]
+        if not frames:
+            return normalize(pd.DataFrame(columns=COLUMNS))
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def export_csv(self, path=CSV_PATH, term=None):
+        """
+        Materialise the store as a csv, data/mps.csv by default.
+        """
+        save_df_to_csv(self.to_df(term), path)
+
+    def import_csv(self, csv_path, term: int = 9):
+        """
+        Import records from a csv written by save_df_to_csv.
+        """
+        if not os.path.exists(csv_path):
+            return
+
+        mps_df = load_df(csv_path)
+        records = mps_df.astype(object).where(mps_df.notna(), None).to_dict('records')
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO mps (term, id, data, scraped_at) VALUES (?, ?, ?, ?)',
+                [(term, r['id'], dump_record(normalize_record(r)), now) for r in records]
+            )
+
+        logging.info(f"Imported {len(records)} MPs from {csv_path}")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
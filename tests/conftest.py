@@ -0,0 +1,5 @@
+# modules live in the repository root -> importable from the tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
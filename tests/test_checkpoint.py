@@ -0,0 +1,88 @@
+import datetime
+import types
+
+import pytest
+
+import checkpoint as checkpoint_module
+from checkpoint import DONE, FAILED, Checkpoint, content_hash
+
+PAGE = '<html>posel 001</html>'
+IDS = ['001', '002', '003', '004']
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'mps.sqlite'))
+    yield checkpoint
+    checkpoint.close()
+
+
+def days_ago(monkeypatch, days):
+    # clock of the checkpoint module only -> `days` before now
+    class Past(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.datetime.now(tz) - datetime.timedelta(days=days)
+
+    monkeypatch.setattr(checkpoint_module, 'datetime', types.SimpleNamespace(datetime=Past))
+
+
+def test_done_and_failed_are_kept_across_runs(tmp_path):
+    path = str(tmp_path / 'mps.sqlite')
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done('001', PAGE)
+    checkpoint.mark_failed('002', 'HTTP 503')
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path)
+    try:
+        assert checkpoint.is_done('001') and not checkpoint.is_done('002')
+        assert checkpoint.get('001').status == DONE
+        assert (checkpoint.get('002').status, checkpoint.get('002').error) == (FAILED, 'HTTP 503')
+        assert checkpoint.unchanged('001', PAGE)
+        assert not checkpoint.unchanged('001', PAGE + ' ')
+        # terms are indexed apart
+        assert not checkpoint.is_done('001', term=8)
+    finally:
+        checkpoint.close()
+
+
+def test_failure_keeps_the_hash_of_the_last_good_page(checkpoint):
+    checkpoint.mark_done('001', PAGE)
+    checkpoint.mark_failed('001', 'timeout')
+
+    assert checkpoint.get('001').content_hash == content_hash(PAGE)
+    # failed -> not unchanged, the page is parsed again once it comes back
+    assert not checkpoint.unchanged('001', PAGE)
+
+    checkpoint.mark_done('001', PAGE)
+    assert checkpoint.get('001').error is None
+
+
+def test_pending_skips_the_done_mps(checkpoint):
+    checkpoint.mark_done('001', PAGE)
+    checkpoint.mark_failed('002', 'HTTP 503')
+
+    assert checkpoint.pending(IDS) == ['002', '003', '004']
+    assert checkpoint.pending(IDS, term=8) == IDS
+
+
+def test_only_failed_selects_the_failed_mps(checkpoint):
+    checkpoint.mark_done('001', PAGE)
+    checkpoint.mark_failed('002', 'HTTP 503')
+    checkpoint.mark_failed('004', 'timeout')
+
+    # never attempted (003) -> not a failure
+    assert checkpoint.pending(IDS, only_failed=True) == ['002', '004']
+
+
+def test_stale_after_selects_the_old_scrapes(checkpoint, monkeypatch):
+    days_ago(monkeypatch, 10)
+    checkpoint.mark_done('001', PAGE)
+    monkeypatch.undo()
+    checkpoint.mark_done('002', PAGE)
+    checkpoint.mark_done('003', PAGE)
+
+    assert checkpoint.pending(IDS) == ['004']
+    assert checkpoint.pending(IDS, stale_after=datetime.timedelta(days=7)) == ['001', '004']
+    assert checkpoint.pending(IDS, stale_after=datetime.timedelta(days=30)) == ['004']
@@ -0,0 +1,58 @@
+import pytest
+
+import main
+from checkpoint import Checkpoint
+from store import ResultStore
+
+# a v1 record -> stored before the expiration columns existed
+V1_RECORD = {'id': '001', 'name': 'Poseł 001', 'club': 'KP Lewica'}
+EXPIRATION = {'expiration_date': None, 'expiration_reason': None, 'expiration_document': None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    yield store
+    store.close()
+
+
+def test_pre_v2_record_with_the_same_content_is_not_a_change(store):
+    store.add(V1_RECORD)
+    since = store.last_change()
+
+    assert store.add({**V1_RECORD, **EXPIRATION}) is None
+    assert list(store.changes(since)) == []
+    # rehashed with the new columns -> the next scrape is unchanged as well
+    assert store.add({**V1_RECORD, **EXPIRATION}) is None
+
+
+@pytest.fixture
+def listed(store, monkeypatch):
+    # 001 active, 002 expired and stored with its expiration, 003 expired and not stored yet
+    store.add({**V1_RECORD, **EXPIRATION})
+    store.add({**V1_RECORD, **EXPIRATION, 'id': '002', 'expiration_date': '2023-11-12'})
+    monkeypatch.setattr(main, 'get_mp_ids', lambda term, mp_type='A': ['001'])
+    monkeypatch.setattr(main, 'get_term_mp_ids', lambda term, expired=False: ['001', '002', '003'])
+    return store
+
+
+@pytest.mark.parametrize('options', [['--incremental'], [], ['--stale-days', '0']])
+def test_stored_expired_mps_are_never_pending(listed, options):
+    args = main.parse_args(['--expired', *options])
+
+    tasks, active = main.select_tasks(listed, args)
+
+    assert (9, '002') not in tasks
+    assert (9, '003') in tasks
+    assert active == {9: ['001']}
+
+
+def test_failed_expired_mp_is_not_retried(listed):
+    # a failure logged before the expiration was stored does not bring the page back
+    checkpoint = Checkpoint(listed.path)
+    checkpoint.mark_failed('002', 'HTTP 503', term=9)
+    checkpoint.close()
+
+    tasks, _ = main.select_tasks(listed, main.parse_args(['--expired', '--only-failed']))
+
+    assert (9, '002') not in tasks
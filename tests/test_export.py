@@ -0,0 +1,72 @@
+import functools
+import os
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import export
+import main
+from export import VERSION_KEY, load_dataset, term_path
+from paths import fixtures_folder
+from store import ResultStore
+
+# term -> MPs of the fixture pages stored under it
+TERMS = {9: ['001', '002', '003'], 8: ['469']}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    for term, mp_ids in TERMS.items():
+        for mp_id in mp_ids:
+            with open(os.path.join(fixtures_folder, f'posel_{mp_id}.html'), encoding='utf-8') as f:
+                url = f'https://sejm.gov.pl/Sejm{term}.nsf/posel.xsp?id={mp_id}'
+                store.add(main.parse_mp_data(mp_id, url, f.read(), None, term).to_row(), term)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    # dataset in tmp_path, in place of data/mps/
+    folder = str(tmp_path / 'mps')
+    monkeypatch.setattr(main, 'export_store', functools.partial(export.export_store, folder=folder))
+    return folder
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather'])
+def test_exported_terms_load_back_the_same(store, dataset, file_format):
+    main.export_terms(store, formats=(file_format,))
+
+    assert export.dataset_terms(dataset) == sorted(TERMS)
+    for term in TERMS:
+        loaded = load_dataset([term], file_format, dataset)
+        expected = store.to_typed_df(term)
+
+        assert list(loaded.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(loaded.sort_values('id', ignore_index=True),
+                                      expected.sort_values('id', ignore_index=True))
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather'])
+def test_other_schema_version_is_refused(store, dataset, file_format):
+    main.export_terms(store, formats=(file_format,))
+
+    # rewrite term 9 as if an older version exported it
+    path = term_path(9, file_format, dataset)
+    table = load_dataset([9], file_format, dataset)
+    table = pa.Table.from_pandas(table.drop(columns=['term']), preserve_index=False)
+    table = table.replace_schema_metadata({VERSION_KEY: b'1'})
+    if file_format == 'parquet':
+        pq.write_table(table, path)
+    else:
+        feather.write_feather(table, path, compression='uncompressed')
+
+    with pytest.raises(ValueError, match='schema version 1'):
+        load_dataset([9], file_format, dataset)
+    # the other terms still load
+    assert len(load_dataset([8], file_format, dataset)) == len(TERMS[8])
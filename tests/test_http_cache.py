@@ -0,0 +1,159 @@
+import glob
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fetcher import HttpFetcher
+from http_cache import HttpCache, digest_of
+
+PAGE = '<html><body><h1>Poseł na Sejm RP – Zażółć gęślą jaźń</h1>' + '<p>Klub Parlamentarny</p>' * 200 + '</body></html>'
+ETAG = '"v1"'
+LAST_MODIFIED = 'Wed, 11 Oct 2023 08:00:00 GMT'
+
+
+class StandInSite:
+    """
+    Local stand-in for sejm.gov.pl, serves PAGE with one validator and answers
+    a matching conditional request with 304 Not Modified.
+    """
+
+    def __init__(self):
+        site = self
+        self.requests = []
+        self.bodies_sent = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(dict(self.headers))
+                # /etag -> ETag validator, /modified -> Last-Modified validator
+                if self.path.startswith('/etag'):
+                    validator, header, conditional = ETAG, 'ETag', 'If-None-Match'
+                else:
+                    validator, header, conditional = LAST_MODIFIED, 'Last-Modified', 'If-Modified-Since'
+
+                if self.headers.get(conditional) == validator:
+                    self.send_response(304)
+                    self.send_header(header, validator)
+                    self.end_headers()
+                    return
+
+                body = PAGE.encode('utf-8')
+                site.bodies_sent += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header(header, validator)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def site():
+    site = StandInSite()
+    yield site
+    site.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / 'http'))
+    yield cache
+    cache.close()
+
+
+def page(i):
+    # different pages of about the same compressed size
+    return f'<html><p>{i:03d}</p>{os.urandom(2048).hex()}</html>'
+
+
+# ---------------------------------- storage --------------------------------- #
+
+
+def test_body_round_trips_compressed(cache, tmp_path):
+    digest = cache.put('https://sejm.gov.pl/posel.xsp?id=001', PAGE, etag=ETAG)
+
+    entry = cache.get('https://sejm.gov.pl/posel.xsp?id=001')
+    assert entry.html == PAGE
+    assert entry.digest == digest == digest_of(PAGE)
+    assert entry.etag == ETAG
+
+    [blob] = glob.glob(str(tmp_path / 'http' / '*' / '*.z'))
+    with open(blob, 'rb') as f:
+        data = f.read()
+    assert zlib.decompress(data).decode('utf-8') == PAGE
+    assert len(data) < len(PAGE.encode('utf-8'))
+    assert cache.size == len(data)
+
+
+def test_same_body_is_stored_once(cache):
+    cache.put('https://sejm.gov.pl/posel.xsp?id=001', PAGE)
+    size = cache.size
+    cache.put('https://sejm.gov.pl/posel.xsp?id=002', PAGE)
+
+    assert cache.size == size
+    assert cache.get('https://sejm.gov.pl/posel.xsp?id=002').html == PAGE
+
+
+def test_least_recently_used_bodies_are_evicted(tmp_path):
+    urls = [f'https://sejm.gov.pl/posel.xsp?id={i:03d}' for i in range(4)]
+    cache = HttpCache(str(tmp_path / 'http'), max_size=1024 ** 3)
+    try:
+        for i, url in enumerate(urls[:3]):
+            cache.put(url, page(i))
+            time.sleep(0.01)
+        # room for the three pages only
+        cache.max_size = cache.size + 100
+
+        # read -> the first page is more recent than the second one
+        assert cache.get(urls[0]) is not None
+        time.sleep(0.01)
+
+        cache.put(urls[3], page(3))
+
+        # down to 90% of the bound -> the two least recently used pages go, the first one was read
+        assert [cache.get(url) is not None for url in urls] == [True, False, False, True]
+        assert cache.size <= cache.max_size * 0.9
+    finally:
+        cache.close()
+
+
+# ------------------------------- revalidation ------------------------------- #
+
+
+@pytest.mark.parametrize('path, conditional, validator', [
+    ('/etag', 'If-None-Match', ETAG),
+    ('/modified', 'If-Modified-Since', LAST_MODIFIED),
+])
+def test_not_modified_page_comes_from_the_cache(site, cache, path, conditional, validator):
+    fetcher = HttpFetcher(timeout=2, cache=cache)
+    try:
+        first = fetcher.fetch(site.url + path)
+        fetched_at = cache.get(site.url + path).fetched_at
+        time.sleep(0.01)
+        second = fetcher.fetch(site.url + path)
+    finally:
+        fetcher.close()
+
+    assert first == second == PAGE
+    # the second request was conditional and got no body
+    assert conditional not in site.requests[0]
+    assert site.requests[1][conditional] == validator
+    assert site.bodies_sent == 1
+    # revalidated -> fresh again
+    assert cache.get(site.url + path).fetched_at > fetched_at
@@ -0,0 +1,34 @@
+import pytest
+
+import mp
+from mp import MP_Site
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    # the listings fetched per (term, type), instead of the network
+    fetched = []
+    ids = {'A': ['001', '002'], 'B': ['469']}
+
+    def get_mp_ids(term, mp_type='A'):
+        fetched.append((term, mp_type))
+        return ids[mp_type]
+
+    monkeypatch.setattr(mp, 'get_mp_ids', get_mp_ids)
+    return fetched
+
+
+def test_expired_listing_is_not_fetched_unless_asked_for(listings):
+    with pytest.raises(ValueError):
+        MP_Site('469', 9)
+    assert listings == [(9, 'A')]
+
+
+def test_expired_mp_is_valid_when_asked_for(listings):
+    assert MP_Site('469', 9, expired=True).mp_info_site.endswith('/Sejm9.nsf/posel.xsp?id=469')
+    assert (9, 'B') in listings
+
+
+def test_active_mp_needs_only_the_active_listing(listings):
+    MP_Site(2, 9, expired=True)
+    assert listings == [(9, 'A')]
@@ -0,0 +1,68 @@
+import dataclasses
+import os
+
+import pandas as pd
+
+import main
+import mp
+from mp import records_to_df
+from page_parser import parse_mp_page
+from paths import fixtures_folder
+from store import ResultStore
+
+FIXTURE_IDS = ['001', '002', '003', '469']
+
+
+def fixture_records():
+    records = []
+    for mp_id in FIXTURE_IDS:
+        with open(os.path.join(fixtures_folder, f'posel_{mp_id}.html'), encoding='utf-8') as f:
+            url = f'https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id={mp_id}'
+            records.append(main.parse_mp_data(mp_id, url, f.read(), None, 9))
+    return records
+
+
+def test_records_and_store_build_the_same_table(tmp_path):
+    records = fixture_records()
+
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    try:
+        for record in records:
+            store.add(record.to_row(), 9)
+        normalized = store.to_typed_df(9)
+    finally:
+        store.close()
+
+    # the records batch and normalize() of the stored strings agree on values and dtypes
+    pd.testing.assert_frame_equal(
+        records_to_df(records).sort_values('id', ignore_index=True),
+        normalized.sort_values('id', ignore_index=True))
+
+
+def test_variant_club_spelling_is_canonicalized_on_both_paths(tmp_path, monkeypatch):
+    monkeypatch.setitem(mp.CLUB_ALIASES, 'Klub Parlamentarny "Lewica"', 'KP Lewica')
+    records = fixture_records()
+    # the same club as the page may spell it: nbsp, doubled spaces, typographic quotes
+    records[0] = dataclasses.replace(records[0], club='  Klub\xa0Parlamentarny  „Lewica” ')
+
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    try:
+        for record in records:
+            store.add(record.to_row(), 9)
+        from_records = records_to_df(store.mps(9))
+        normalized = store.to_typed_df(9)
+    finally:
+        store.close()
+
+    pd.testing.assert_frame_equal(from_records.sort_values('id', ignore_index=True),
+                                  normalized.sort_values('id', ignore_index=True))
+    assert from_records.loc[from_records['id'] == records[0].id, 'club'].item() == 'KP Lewica'
+
+
+def test_page_club_name_is_canonicalized():
+    with open(os.path.join(fixtures_folder, 'posel_001.html'), encoding='utf-8') as f:
+        page = parse_mp_page(f.read())
+    page = page._replace(club_name='Klub Parlamentarny “Lewica”')
+    record = mp.MP.from_page('001', 'https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id=001', page)
+
+    assert record.club == 'Klub Parlamentarny "Lewica"'
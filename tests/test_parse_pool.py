@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+import pytest
+
+from main import parse_mp_data
+from parse_pool import ParsePool
+from paths import fixtures_folder
+
+FIXTURE_IDS = ['001', '002', '003', '006', '469']
+
+
+def fixture_pages():
+    pages = []
+    for mp_id in FIXTURE_IDS:
+        with open(os.path.join(fixtures_folder, f'posel_{mp_id}.html'), encoding='utf-8') as f:
+            pages.append((mp_id, f.read()))
+    # every page a few times -> more items than workers and pending slots
+    return [(f'{mp_id}-{i}', html) for i in range(4) for mp_id, html in pages]
+
+
+def parse_args(item, html):
+    mp_id = item.split('-')[0]
+    return mp_id, f'https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id={mp_id}', html, None, 9
+
+
+def run_pool(pool, pages, consume_delay=0.0):
+    """
+    Parse the pages in the pool -> (item, record id, error) in the order they came out,
+    and the most items produced but not consumed yet at any time.
+    """
+    counts = {'produced': 0, 'consumed': 0, 'peak': 0}
+
+    async def source():
+        for item, html in pages:
+            counts['produced'] += 1
+            counts['peak'] = max(counts['peak'], counts['produced'] - counts['consumed'])
+            yield item, parse_args(item, html), None
+
+    async def consume():
+        results = []
+        async for item, mp, error in pool.map(parse_mp_data, source(), [item for item, _ in pages]):
+            counts['consumed'] += 1
+            results.append((item, mp.id if mp is not None else None, error))
+            await asyncio.sleep(consume_delay)
+        return results
+
+    try:
+        return asyncio.run(consume()), counts['peak']
+    finally:
+        pool.close()
+
+
+def test_ordered_mode_keeps_the_submit_order():
+    pages = fixture_pages()
+    results, _ = run_pool(ParsePool(2, ordered=True), pages)
+
+    assert [item for item, _, _ in results] == [item for item, _ in pages]
+    assert all(error is None and mp_id == item.split('-')[0] for item, mp_id, error in results)
+
+
+def test_unordered_mode_returns_the_same_results():
+    pages = fixture_pages()
+    ordered, _ = run_pool(ParsePool(2, ordered=True), pages)
+    unordered, _ = run_pool(ParsePool(2), pages)
+
+    assert sorted(unordered) == sorted(ordered)
+
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_pending_pages_stay_within_the_bound(ordered):
+    pool = ParsePool(2, max_pending=3, ordered=ordered)
+    results, peak = run_pool(pool, fixture_pages(), consume_delay=0.01)
+
+    assert len(results) == len(fixture_pages())
+    # ordered -> the item next in order is admitted even when the bound is reached
+    assert pool.peak_pending <= pool.max_pending + ordered
+    # a slow consumer holds the producer back, one page more is being pulled
+    assert peak <= pool.max_pending + ordered + 1
+
+
+def test_worker_error_reaches_the_caller():
+    pages = fixture_pages()[:6]
+    broken = pages[2][0]
+    pages[2] = (broken, '')
+
+    # close() in run_pool must return, not hang on the failed job
+    results, _ = run_pool(ParsePool(2, ordered=True), pages)
+
+    errors = {item: error for item, _, error in results if error is not None}
+    assert list(errors) == [broken]
+    assert len(results) == len(pages)
@@ -0,0 +1,187 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fetcher import FetchError, HttpFetcher
+from proxies import ProxyPool
+
+PROXIES = ['http://10.0.0.1:3128', 'http://10.0.0.2:3128']
+
+
+class StandInProxy:
+    """
+    Local stand-in for a forward proxy, answers every request with `status` itself.
+    """
+
+    def __init__(self, status=200):
+        status_code = status
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = b'<html>proxied</html>'
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    started = []
+
+    def start(status=200):
+        proxy = StandInProxy(status)
+        started.append(proxy)
+        return proxy
+
+    yield start
+    for proxy in started:
+        proxy.stop()
+
+
+def closed_port_url():
+    # a port nobody listens on -> connection refused
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+
+# ----------------------------------- pool ----------------------------------- #
+
+
+def test_proxy_is_ejected_after_failures_in_a_row():
+    pool = ProxyPool(PROXIES, rate=1000, max_failures=3, cooldown=60)
+
+    pool.record_failure(PROXIES[0], 'HTTP 403')
+    pool.record_failure(PROXIES[0], 'HTTP 403')
+    assert pool.is_admitted(PROXIES[0])
+
+    pool.record_failure(PROXIES[0], 'HTTP 403')
+    assert not pool.is_admitted(PROXIES[0])
+    assert pool.state['http://10.0.0.1:3128']['ejections'] == 1
+
+    # only the healthy exit is picked while the other one cools down
+    assert {pool.acquire() for _ in range(5)} == {PROXIES[1]}
+
+
+def test_success_resets_the_failures_in_a_row():
+    pool = ProxyPool(PROXIES, rate=1000, max_failures=3)
+
+    for _ in range(5):
+        pool.record_failure(PROXIES[0], 'HTTP 429')
+        pool.record_failure(PROXIES[0], 'HTTP 429')
+        pool.record_success(PROXIES[0], 0.1)
+
+    assert pool.is_admitted(PROXIES[0])
+
+
+def test_readmitted_proxy_is_on_probation():
+    pool = ProxyPool(PROXIES, rate=1000, max_failures=3, cooldown=0.05)
+
+    for _ in range(3):
+        pool.record_failure(PROXIES[0], 'HTTP 403')
+    time.sleep(0.06)
+    assert pool.is_admitted(PROXIES[0])
+
+    # a single failure ejects it again, for twice as long
+    pool.record_failure(PROXIES[0], 'HTTP 403')
+    assert not pool.is_admitted(PROXIES[0])
+    time.sleep(0.06)
+    assert not pool.is_admitted(PROXIES[0])
+    assert pool.state['http://10.0.0.1:3128']['ejections'] == 2
+
+
+def test_fast_healthy_proxy_is_preferred():
+    pool = ProxyPool(PROXIES, rate=1000)
+
+    pool.record_success(PROXIES[0], 0.2)
+    pool.record_success(PROXIES[1], 0.1)
+    assert pool.best() == PROXIES[1]
+
+    # errors inflate the cost of the faster exit above the slower one
+    pool.record_failure(PROXIES[1], 'timeout')
+    assert pool.is_admitted(PROXIES[1])
+    assert pool.best() == PROXIES[0]
+
+    # and successes bring it back
+    for _ in range(5):
+        pool.record_success(PROXIES[1], 0.1)
+    assert pool.best() == PROXIES[1]
+
+
+def test_site_overload_does_not_count_against_the_proxy():
+    assert ProxyPool.is_proxy_failure(status=429)
+    assert ProxyPool.is_proxy_failure(status=407)
+    assert not ProxyPool.is_proxy_failure(status=503)
+    assert not ProxyPool.is_proxy_failure(status=404)
+    assert ProxyPool.is_proxy_failure(error=requests.exceptions.ProxyError())
+    assert not ProxyPool.is_proxy_failure(error=ValueError())
+
+
+# ---------------------------------- fetcher --------------------------------- #
+
+
+def fetch_through(proxy_url, max_failures=3):
+    pool = ProxyPool([proxy_url], rate=1000, max_failures=max_failures)
+    fetcher = HttpFetcher(timeout=2, proxy_pool=pool)
+    try:
+        try:
+            html = fetcher.fetch('http://sejm.invalid/posel.xsp?id=001')
+        except (FetchError, requests.RequestException) as e:
+            html = e
+    finally:
+        fetcher.close()
+    return pool, html
+
+
+def test_fetcher_reports_success_with_latency(stand_in):
+    proxy = stand_in(200)
+    pool, html = fetch_through(proxy.url)
+
+    assert html == '<html>proxied</html>'
+    state = pool.state[proxy.url]
+    assert state['requests'] == 1
+    assert state['latency'] is not None
+    assert state['error_rate'] == 0
+
+
+def test_fetcher_reports_a_blocked_exit(stand_in):
+    proxy = stand_in(403)
+    pool, error = fetch_through(proxy.url, max_failures=1)
+
+    assert isinstance(error, FetchError) and error.status == 403
+    assert not pool.is_admitted(proxy.url)
+
+
+def test_fetcher_does_not_blame_the_proxy_for_a_site_error(stand_in):
+    proxy = stand_in(503)
+    pool, error = fetch_through(proxy.url, max_failures=1)
+
+    assert isinstance(error, FetchError) and error.status == 503
+    assert pool.is_admitted(proxy.url)
+    assert pool.state[proxy.url]['error_rate'] == 0
+
+
+def test_fetcher_reports_a_dead_proxy():
+    url = closed_port_url()
+    pool, error = fetch_through(url, max_failures=1)
+
+    assert isinstance(error, requests.RequestException)
+    assert not pool.is_admitted(url)
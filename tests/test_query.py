@@ -0,0 +1,80 @@
+import dataclasses
+import datetime
+import os
+
+import pytest
+
+import main
+from paths import fixtures_folder
+from query import MPQuery, StoreSource
+from store import ResultStore
+
+FIXTURE_IDS = ['001', '002', '003', '006']
+
+
+def fixture_record(mp_id):
+    with open(os.path.join(fixtures_folder, f'posel_{mp_id}.html'), encoding='utf-8') as f:
+        url = f'https://sejm.gov.pl/Sejm9.nsf/posel.xsp?id={mp_id}'
+        return main.parse_mp_data(mp_id, url, f.read(), None, 9)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    for mp_id in FIXTURE_IDS[:3]:
+        store.add(fixture_record(mp_id).to_row(), 9)
+    yield store
+    store.close()
+
+
+def query(store, check_interval=0):
+    return MPQuery(StoreSource(store, terms=[9]), check_interval=check_interval, today=datetime.date(2024, 1, 1))
+
+
+def test_changed_record_invalidates_the_cached_aggregates(store):
+    q = query(store)
+    record = fixture_record(FIXTURE_IDS[0])
+    counts = q.count(by='club')
+    votes = q.votes()
+    # served from the cache while the store is unchanged
+    assert q.count(by='club') is counts
+    version = q.version
+
+    store.add(dataclasses.replace(record, club='Klub Testowy', no_of_votes=record.no_of_votes + 1000).to_row(), 9)
+
+    assert q.count(by='club')['Klub Testowy'] == 1
+    assert q.count(by='club').sum() == counts.sum()
+    assert q.votes() == votes + 1000
+    assert q.version == version + 1
+
+
+def test_new_record_invalidates_the_cached_aggregates(store):
+    q = query(store)
+    assert q.count() == 3
+    ages = q.age_stats()
+
+    store.add(fixture_record(FIXTURE_IDS[3]).to_row(), 9)
+
+    assert q.count() == 4
+    assert q.age_stats()['count'] == ages['count'] + 1
+
+
+def test_expiration_invalidates_the_cached_aggregates(store):
+    q = query(store)
+    assert q.count(active=True) == 3
+
+    store.add(dataclasses.replace(fixture_record(FIXTURE_IDS[0]), expiration_date=datetime.date(2023, 11, 12)).to_row(), 9)
+
+    assert q.count(active=True) == 2
+
+
+def test_source_is_checked_at_most_every_interval(store):
+    q = query(store, check_interval=3600)
+    assert q.count() == 3
+
+    store.add(fixture_record(FIXTURE_IDS[3]).to_row(), 9)
+
+    # within the interval -> the cached result, a reload picks the change up
+    assert q.count() == 3
+    q.reload()
+    assert q.count() == 4
@@ -0,0 +1,67 @@
+import functools
+import os
+
+import pytest
+
+import main
+from archive import PageArchive
+from checkpoint import Checkpoint
+from paths import fixtures_folder
+from store import ResultStore
+
+FIXTURE_IDS = ['001', '002', '003']
+
+
+def profile_url(mp_id, term=9):
+    return f'https://sejm.gov.pl/Sejm{term}.nsf/posel.xsp?id={mp_id}'
+
+
+@pytest.fixture
+def archived(tmp_path, monkeypatch):
+    # archive of the fixture pages, in place of data/archive/
+    folder = str(tmp_path / 'archive')
+    archive = PageArchive(folder)
+    for mp_id in FIXTURE_IDS:
+        with open(os.path.join(fixtures_folder, f'posel_{mp_id}.html'), encoding='utf-8') as f:
+            archive.add(profile_url(mp_id), f.read())
+    archive.close()
+
+    monkeypatch.setattr(main, 'PageArchive', functools.partial(PageArchive, folder))
+    return tmp_path
+
+
+def test_replay_marks_the_replayed_mps_done(archived):
+    # a checkpoint of an earlier run -> not seeded from the replayed store
+    checkpoint = Checkpoint(str(archived / 'mps.sqlite'))
+    checkpoint.mark_done('460', term=9)
+    checkpoint.close()
+
+    store = ResultStore(str(archived / 'mps.sqlite'), csv_path=str(archived / 'mps.csv'))
+    args = main.parse_args(['--replay', '--profile', '--terms', '9'])
+    try:
+        main.replay_archive(store, args)
+        assert len(store) == len(FIXTURE_IDS)
+    finally:
+        store.close()
+
+    # a later normal run has nothing left to scrape
+    checkpoint = Checkpoint(str(archived / 'mps.sqlite'))
+    try:
+        assert list(checkpoint.pending(FIXTURE_IDS, 9)) == []
+    finally:
+        checkpoint.close()
+
+
+def test_replay_reports_metrics(archived):
+    store = ResultStore(str(archived / 'mps.sqlite'), csv_path=str(archived / 'mps.csv'))
+    metrics_file = str(archived / 'sejm.prom')
+    args = main.parse_args(['--replay', '--profile', '--no-events', '--metrics-file', metrics_file])
+    try:
+        with main.collect_metrics(args):
+            main.replay_archive(store, args)
+    finally:
+        store.close()
+
+    with open(metrics_file, encoding='utf-8') as f:
+        exported = f.read()
+    assert f'pages_total{{result="replayed"}} {len(FIXTURE_IDS)}' in exported
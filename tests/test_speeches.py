@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+import mp
+from mp import MP_Site
+from speeches import LIST_SYMBOL, SpeechStore, crawl_mp_speeches
+
+# list page -> the list pages it links to, the site only shows a window of page links
+PAGE_LINKS = {1: [2, 3], 2: [1, 3, 4], 3: [1, 2, 4, 5], 4: [3, 5, 6], 5: [4, 6], 6: [5]}
+
+
+def page_url(list_url, page):
+    return list_url if page == 1 else f'{list_url}&page={page}'
+
+
+def list_page(list_url, page):
+    links = ''.join(f'<a href="{page_url(list_url, other)}">{other}</a>' for other in PAGE_LINKS[page])
+    row = (f'<tr><td>{page}</td><td>2020-01-{page:02d}</td>'
+           f'<td><a href="/speech?page={page}">Speech of page {page}</a></td></tr>')
+    return f'<html><body><table>{row}</table>{links}</body></html>'
+
+
+class FakeCrawler:
+    # serves the list and speech pages from memory, in place of AsyncCrawler
+    def __init__(self, list_url):
+        self.pages = {page_url(list_url, page): list_page(list_url, page) for page in PAGE_LINKS}
+        self.fetched = []
+
+    async def fetch(self, url):
+        self.fetched.append(url)
+        if url in self.pages:
+            return self.pages[url]
+        return f'<html><body><div class="stenogram">Text of {url}</div></body></html>'
+
+    async def crawl(self, items, job, buffer=0):
+        for item in items:
+            try:
+                yield item, await job(item), None
+            except Exception as e:
+                yield item, None, e
+
+
+@pytest.fixture(autouse=True)
+def listing(monkeypatch):
+    monkeypatch.setattr(mp, 'get_mp_ids', lambda term, mp_type='A': ['001'])
+
+
+def test_list_pages_beyond_the_first_window_are_crawled(tmp_path):
+    list_url = MP_Site('001', 9).mp_speech_site
+    assert LIST_SYMBOL in list_url
+    crawler = FakeCrawler(list_url)
+
+    with SpeechStore(str(tmp_path / 'speeches.sqlite')) as store:
+        added = asyncio.run(crawl_mp_speeches(crawler, store, 9, '001'))
+        store.commit()
+        assert added == len(PAGE_LINKS)
+        assert {speech.sitting for speech in store.search('Speech', mp_id='001')} == set(PAGE_LINKS)
+
+    # every list page once, pages 4-6 are only linked from later pages
+    list_fetches = [url for url in crawler.fetched if url in crawler.pages]
+    assert sorted(list_fetches) == sorted(crawler.pages)
@@ -0,0 +1,91 @@
+import pytest
+
+from store import EXPIRE, INSERT, UPDATE, ResultStore
+
+
+def mp_record(mp_id, **fields):
+    return {'id': mp_id, 'name': f'Poseł {mp_id}', 'club': 'KP Lewica', 'expiration_date': None, **fields}
+
+
+@pytest.fixture
+def store(tmp_path):
+    # csv_path in tmp_path -> a new store does not import data/mps.csv
+    store = ResultStore(str(tmp_path / 'mps.sqlite'), csv_path=str(tmp_path / 'mps.csv'))
+    yield store
+    store.close()
+
+
+def ops(store, since=0):
+    return [(change['id'], change['op']) for change in store.changes(since)]
+
+
+def test_new_record_is_logged_as_insert(store):
+    assert store.add(mp_record('001')) == INSERT
+
+    [change] = store.changes()
+    assert (change['id'], change['op']) == ('001', INSERT)
+    assert change['data'] == mp_record('001')
+
+
+def test_update_logs_the_changed_fields_only(store):
+    store.add(mp_record('001'))
+    since = store.last_change()
+
+    assert store.add(mp_record('001', club='KP PiS')) == UPDATE
+
+    [change] = store.changes(since)
+    assert change['op'] == UPDATE
+    assert change['data'] == {'club': ['KP Lewica', 'KP PiS']}
+
+
+def test_unchanged_record_is_not_logged(store):
+    store.add(mp_record('001'))
+    since = store.last_change()
+
+    assert store.add(mp_record('001')) is None
+    assert ops(store, since) == []
+
+
+def test_mps_missing_from_the_listing_are_expired_once(store):
+    store.add(mp_record('001'))
+    store.add(mp_record('002'))
+    since = store.last_change()
+
+    assert store.expire_missing(9, ['001']) == ['002']
+    assert ops(store, since) == [('002', EXPIRE)]
+    # already expired -> not expired again
+    assert store.expire_missing(9, ['001']) == []
+    assert ops(store, since) == [('002', EXPIRE)]
+
+
+def test_rescraped_expired_mp_stays_expired(store):
+    # --expired run: the MP left the listing, then its page is scraped from the expired one
+    store.add(mp_record('002'))
+    store.expire_missing(9, ['001'])
+    since = store.last_change()
+
+    expired = mp_record('002', expiration_date='2023-11-12', expiration_reason='wybór na posła do PE')
+    assert store.add(expired) == UPDATE
+    assert store.expire_missing(9, ['001']) == []
+
+    # the new fields only, no 'back on the listing' and no second expiration
+    [change] = store.changes(since)
+    assert change['op'] == UPDATE
+    assert 'expired_at' not in change['data']
+    assert change['data']['expiration_date'] == [None, '2023-11-12']
+
+    # rescraped again with the same content -> nothing to log
+    assert store.add(expired) is None
+    assert store.expire_missing(9, ['001']) == []
+    assert len(ops(store, since)) == 1
+
+
+def test_mp_back_on_the_listing_is_logged(store):
+    store.add(mp_record('002'))
+    store.expire_missing(9, ['001'])
+    since = store.last_change()
+
+    assert store.add(mp_record('002')) == UPDATE
+    [change] = store.changes(since)
+    assert change['data']['expired_at'][1] is None
+    assert store.expire_missing(9, ['001', '002']) == []
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import AsyncCrawler
+from fetcher import FetchError, HttpFetcher
+from throttle import AdaptiveThrottle, Throttle
+
+
+class ThrottlingServer:
+    """
+    Local stand-in for sejm.gov.pl capped at `rate_limit` requests per second,
+    answers 429 with Retry-After above it, like the site does under load.
+    """
+
+    def __init__(self, rate_limit=20, latency=0.005):
+        self.rate_limit = rate_limit
+        self.throttled = 0
+
+        # token bucket of a single request
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                if server.admit():
+                    status, body = 200, b'<html><body>page</body></html>'
+                else:
+                    status, body = 429, b'Too Many Requests'
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def admit(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThrottlingServer(rate_limit=20)
+    yield server
+    server.stop()
+
+
+def test_burst_of_failures_cuts_the_rate_once():
+    throttle = AdaptiveThrottle(rate=50, max_rate=50, min_rate=0.05)
+    started = time.monotonic()
+
+    # 8 requests in flight when the server starts throttling
+    for _ in range(8):
+        throttle.record_failure(FetchError('url', 429), started)
+
+    assert throttle.rate == 25
+    assert throttle.failures == 1
+
+
+def test_failure_after_the_cut_starts_a_new_window():
+    throttle = AdaptiveThrottle(rate=50, max_rate=50)
+    throttle.record_failure(FetchError('url', 503), time.monotonic())
+    throttle.record_failure(FetchError('url', 503), time.monotonic())
+
+    assert throttle.rate == 12.5
+    assert throttle.failures == 2
+
+
+def test_client_errors_do_not_slow_down():
+    throttle = AdaptiveThrottle(rate=4, max_rate=4)
+    throttle.record_failure(FetchError('url', 404), time.monotonic())
+
+    assert throttle.rate == 4
+    assert not Throttle.is_retryable(FetchError('url', 404))
+
+
+def test_request_timeout_is_retried_and_slows_down():
+    throttle = AdaptiveThrottle(rate=4, max_rate=4)
+    throttle.record_failure(FetchError('url', 408), time.monotonic())
+
+    assert throttle.rate == 2
+    assert Throttle.is_retryable(FetchError('url', 408))
+
+
+def test_crawl_converges_near_the_server_limit(throttling_server):
+    limit = throttling_server.rate_limit
+    crawler = AsyncCrawler(HttpFetcher(pool_size=8), concurrency=8, rate=100, per_host=8)
+    urls = [f'{throttling_server.url}/Sejm9.nsf/posel.xsp?id={mp_id:03d}' for mp_id in range(1, 61)]
+    rates = []
+
+    async def crawl():
+        errors = []
+        async for url, html, error in crawler.crawl(urls, crawler.fetch):
+            rates.append(crawler.throttle.rate)
+            if error is not None:
+                errors.append(error)
+        return errors
+
+    try:
+        errors = asyncio.run(crawl())
+    finally:
+        crawler.close()
+
+    assert not errors
+    assert throttling_server.throttled > 0
+    # cut a few times below the limit, never collapsed towards min_rate
+    assert min(rates) >= limit / 4
+    assert limit / 4 <= crawler.throttle.rate <= limit * 1.5
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import datetime
+import types
+
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('lxml')
+
+import mp
+import voting
+from checkpoint import Checkpoint
+from mp import MP_Site
+from voting import crawl_votes, load_votes
+
+
+def listing_page(sittings):
+    rows = ''.join(f'<tr><td><a href="/glosowania?day={day}">{sitting}</a></td><td>{sitting}</td><td>{day}</td></tr>'
+                   for sitting, day in sittings)
+    return f'<html><body><table>{rows}</table></body></html>'
+
+
+def day_page(day, votes=2):
+    rows = ''.join(f'<tr><td>{no}</td><td>10:0{no}</td><td>Topic {day} {no}</td><td>Za</td></tr>'
+                   for no in range(1, votes + 1))
+    return (f'<html><body><table><tr><th>Nr</th><th>Godz.</th><th>Temat</th><th>Głos</th></tr>'
+            f'{rows}</table></body></html>')
+
+
+class FakeCrawler:
+    # serves the sitting list and the sitting day pages from memory, in place of AsyncCrawler
+    def __init__(self, sittings):
+        self.listing_url = MP_Site('001', 9).mp_voting_site
+        self.sittings = sittings
+        self.fetched = []
+        self.concurrency = 1
+        self.throttle = types.SimpleNamespace(state={})
+
+    async def fetch(self, url):
+        self.fetched.append(url)
+        if url == self.listing_url:
+            return listing_page(self.sittings)
+        return day_page(url.rsplit('=', 1)[1])
+
+    async def crawl(self, items, job, buffer=0):
+        for item in items:
+            try:
+                yield item, await job(item), None
+            except Exception as e:
+                yield item, None, e
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def listing(monkeypatch):
+    monkeypatch.setattr(mp, 'get_mp_ids', lambda term, mp_type='A': ['001'])
+
+
+def crawl(tmp_path, monkeypatch, sittings):
+    crawler = FakeCrawler(sittings)
+    monkeypatch.setattr(voting, 'build_crawler', lambda fetcher, args: crawler)
+    args = argparse.Namespace(folder=str(tmp_path / 'votes'), chunk_size=3, expired=False)
+
+    checkpoint = Checkpoint(str(tmp_path / 'mps.sqlite'), table='votes_checkpoint')
+    try:
+        asyncio.run(crawl_votes([(9, '001')], None, checkpoint, args))
+        assert checkpoint.is_done('001')
+    finally:
+        checkpoint.close()
+    return [url for url in crawler.fetched if url != crawler.listing_url]
+
+
+def test_rerun_fetches_the_new_sittings_only(tmp_path, monkeypatch):
+    first = [(1, '2023-11-13'), (1, '2023-11-14')]
+    assert len(crawl(tmp_path, monkeypatch, first)) == 2
+
+    # a new sitting since -> its day and the newest known day are fetched, the older day is kept
+    fetched = crawl(tmp_path, monkeypatch, first + [(2, '2023-11-21')])
+    assert sorted(url.rsplit('=', 1)[1] for url in fetched) == ['2023-11-14', '2023-11-21']
+
+    votes = load_votes(str(tmp_path / 'votes')).to_table().to_pylist()
+    assert len(votes) == 6
+    days = sorted({(vote['sitting'], vote['date']) for vote in votes})
+    assert days == [(1, datetime.date(2023, 11, 13)), (1, datetime.date(2023, 11, 14)),
+                    (2, datetime.date(2023, 11, 21))]
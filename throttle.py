@@ -2,6 +2,17 @@ import random
 import time
 import logging
 
+from metrics import metrics
+
+
+# raised when the server does not respond after all retries
+class NoResponseError(Exception):
+    pass
+
+
+# http statuses that mean the server wants us to slow down, 408 -> it timed out waiting for us
+THROTTLING_STATUSES = (408, 429, 503)
+
 
 class Throttle:
     def __init__(self, mean):
@@ -13,28 +24,188 @@ class Throttle:
         delay = max(delay, 0)
         time.sleep(delay)
 
-    # try a few times to get a response from server, use browser_manager
-    def try_get_response(self, url, browser):
-        for _ in range(5):
-            # wait max 5 seconds for a response
+    # hooks -> called after every request, adaptive throttles tune the rate here
+    def record_success(self, latency):
+        pass
+
+    def record_failure(self, error, started=None):
+        pass
+
+    # client errors (404, ...) will not go away on retry, timeouts, 5xx and throttling statuses might
+    @staticmethod
+    def is_retryable(error):
+        status = getattr(error, 'status', None)
+        return status is None or status >= 500 or status in THROTTLING_STATUSES
+
+    # try a few times to get a response from server, use fetcher -> returns html
+    def try_get_response(self, url, fetcher, retries=5):
+        for attempt in range(1, retries + 1):
+            start = time.monotonic()
             try:
-                browser.get(url)
-                return
-            except Exception:
-                logging.info("No response from server. Retrying...")
-                self.wait()
-        self.no_response()
-    # detect no response from server -> exit program
-
-    def no_response(self):
-
-        exit_message = """
-        No response from server. Exiting program...
+                with metrics.time('fetch', url=url, attempt=attempt):
+                    html = fetcher.fetch(url)
+            except Exception as e:
+                metrics.inc('requests_total', outcome='error')
+                self.record_failure(e, start)
+                if not self.is_retryable(e):
+                    raise
+                logging.info(
+                    f"No response from server for {url} ({e}). Retrying...")
+                if attempt < retries:
+                    with metrics.time('wait', url=url, reason='retry'):
+                        self.wait()
+                continue
+            metrics.inc('requests_total', outcome='ok')
+            metrics.inc('bytes_total', len(html))
+            self.record_success(time.monotonic() - start)
+            return html
+        self.no_response(url)
+
+    # detect no response from server -> raise, caller decides whether to go on
+    def no_response(self, url):
+
+        message = f"""
+        No response from server for {url}.
         Please check your internet connection and try again. You might also want to try using a proxy.
         Program will continue scraping from the last MP index.
         """
 
-        logging.info(exit_message)
-        print(exit_message)
+        logging.info(message)
+
+        raise NoResponseError(url)
+
+
+class AdaptiveThrottle(Throttle):
+    """
+    AIMD rate controller.
+
+    The request rate grows additively while responses are fast and healthy and
+    shrinks multiplicatively on timeouts, 5xx and 429 responses. Consecutive
+    failures also block all requests for an exponentially growing, jittered
+    backoff, extended to the server's Retry-After when one is sent.
+
+    The rate is cut at most once per congestion window: failures of requests
+    that started before the last cut report the congestion that cut already
+    answered, so a burst of concurrent 429s costs a single decrease.
+    """
+
+    def __init__(self, rate=1.0, min_rate=0.05, max_rate=4.0, increase=0.1, decrease=0.5,
+                 target_latency=1.0, base_backoff=1.0, max_backoff=300.0):
+        """
+        Initialize the AdaptiveThrottle instance.
+
+        Parameters:
+        - rate (float): Initial requests per second.
+        - min_rate (float): Lower bound of the rate.
+        - max_rate (float): Upper bound of the rate -> politeness ceiling.
+        - increase (float): Requests per second added after a fast, healthy response.
+        - decrease (float): Factor the rate is multiplied by after a failure.
+        - target_latency (float): Responses slower than this (seconds) do not speed us up.
+        - base_backoff (float): Backoff after the first failure, in seconds.
+        - max_backoff (float): Upper bound of the backoff, in seconds.
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.failures = 0
+        self.backoff = 0.0
+        self.latency = None
+
+        self._next_request = 0.0
+        self._blocked_until = 0.0
+        # monotonic time of the last decrease -> start of the congestion window
+        self._last_decrease = float('-inf')
+
+    # mean delay -> keeps the Throttle interface
+    @property
+    def mean(self):
+        return 1 / self.rate
+
+    @property
+    def state(self):
+        """
+        Get the current controller state, for logging and tuning.
+
+        Returns:
+        - dict: rate, delay, failures, backoff, blocked_for and last latency.
+        """
+        return {
+            'rate': round(self.rate, 3),
+            'delay': round(self.mean, 3),
+            'failures': self.failures,
+            'backoff': round(self.backoff, 3),
+            'blocked_for': round(self.blocked_for(), 3),
+            'latency': None if self.latency is None else round(self.latency, 3),
+        }
+
+    def blocked_for(self):
+        """
+        Get the number of seconds left until the backoff expires.
+        """
+        return max(self._blocked_until - time.monotonic(), 0.0)
+
+    def delay(self):
+        """
+        Get the number of seconds to wait before the next request may start.
+        """
+        now = time.monotonic()
+        return max(self._next_request - now, self._blocked_until - now, 0.0)
+
+    def wait(self):
+        time.sleep(self.delay())
+        self._next_request = time.monotonic() + self.mean
+
+    def record_success(self, latency):
+        self.latency = latency
+        self.failures = 0
+        self.backoff = 0.0
+
+        # additive increase, only while the server keeps up
+        if latency <= self.target_latency:
+            self.rate = min(self.rate + self.increase, self.max_rate)
+
+    def record_failure(self, error, started=None):
+        """
+        Slow down after a timeout, 5xx or throttling response.
+
+        Parameters:
+        - error (Exception): The error, its status and retry_after are used if set.
+        - started (float): time.monotonic() when the failed request started (default now).
+        """
+        status = getattr(error, 'status', None)
+
+        # plain client errors say nothing about server load
+        if status is not None and status < 500 and status not in THROTTLING_STATUSES:
+            return
+
+        now = time.monotonic()
+        retry_after = getattr(error, 'retry_after', None)
+
+        # sent before the last cut -> same congestion window, only honour Retry-After
+        if started is not None and started < self._last_decrease:
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + min(retry_after, self.max_backoff))
+            return
+
+        # multiplicative decrease, escalated once per window
+        self._last_decrease = now
+        self.failures += 1
+        self.rate = max(self.rate * self.decrease, self.min_rate)
+
+        # exponential backoff with jitter, at least as long as Retry-After
+        backoff = min(self.base_backoff * 2 ** (self.failures - 1), self.max_backoff)
+        backoff = random.uniform(backoff / 2, backoff)
+
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_backoff))
+
+        self.backoff = backoff
+        self._blocked_until = max(self._blocked_until, now + backoff)
 
-        exit()
+        logging.info(f"Server throttling ({error}), backing off: {self.state}")
@@ -0,0 +1,346 @@
+# ---------------------------------- imports --------------------------------- #
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+from urllib.parse import urljoin
+
+# pyarrow -> columnar output, optional
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# lxml -> fast html parsing, optional
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# local imports
+from checkpoint import Checkpoint
+from cli import add_common_args, build_crawler, open_fetcher, setup_logging
+from fetcher import FETCHERS
+from mp import MP_Site, to_date
+from page_parser import CELL_DATE_RE, first_int, to_iso_date
+from paths import data_folder
+from registry import get_term_mp_ids
+from store import STORE_PATH
+
+# ------------------------------------- < ------------------------------------ #
+
+# votes dataset -> data/votes/term=9/votes_001.parquet
+VOTES_FOLDER = f"{data_folder}/votes"
+
+# rows buffered before they are written out as a parquet row group
+DEFAULT_CHUNK_SIZE = 10000
+
+# MPs whose votes were scraped longer ago than this are revisited for new sittings, in days
+DEFAULT_STALE_DAYS = 1.0
+
+# table header prefix -> column, 'głos' is the MP's vote and 'wynik' the result of the voting
+HEADER_COLUMNS = (
+    ('nr', 'voting_no'),
+    ('godz', 'time'),
+    ('temat', 'topic'),
+    ('głos', 'vote'),
+    ('wynik', 'result'),
+)
+
+
+# columns of a vote row, the term comes from the partition folder
+def vote_schema():
+    return pa.schema([
+        ('mp_id', pa.string()),
+        ('sitting', pa.int32()),
+        ('date', pa.date32()),
+        ('voting_no', pa.int32()),
+        ('time', pa.string()),
+        ('topic', pa.string()),
+        ('vote', pa.string()),
+        ('result', pa.string()),
+    ])
+
+
+# the term of the partition folder -> schema of the whole dataset
+def dataset_schema():
+    return vote_schema().append(pa.field('term', pa.int32()))
+
+
+def require_dependencies():
+    if pa is None:
+        raise ImportError("pyarrow is required to scrape voting records.")
+    if lxml_html is None:
+        raise ImportError("lxml is required to scrape voting records.")
+
+
+# ---------------------------------- parsing --------------------------------- #
+
+
+def parse_sittings(html, base_url):
+    """
+    Parse the links to the per-sitting voting pages of an MP.
+
+    Parameters:
+    - html (str): The html of the MP's voting page (MP_Site.mp_voting_site).
+    - base_url (str): Url of the page, to resolve relative links.
+
+    Returns:
+    - list: A dict per sitting day -> url, sitting number and date.
+    """
+    doc = lxml_html.fromstring(html)
+
+    sittings = []
+    seen = set()
+    for row in doc.iter('tr'):
+        link = row.find('.//a[@href]')
+        if link is None:
+            continue
+
+        url = urljoin(base_url, link.get('href'))
+        if url in seen or url == base_url:
+            continue
+        seen.add(url)
+
+        cells = [cell.text_content().strip() for cell in row.iter('td')]
+        sittings.append({
+            'url': url,
+            'sitting': next((first_int(cell) for cell in cells if cell.isdigit()), None),
+            'date': next((to_iso_date(cell) for cell in cells if CELL_DATE_RE.search(cell)), None),
+        })
+
+    return sittings
+
+
+def iter_votes(html):
+    """
+    Parse the votes of a sitting day page, one row at a time.
+
+    Yields:
+    - dict: voting_no, time, topic, the MP's vote and the result (if shown) of a single voting.
+    """
+    doc = lxml_html.fromstring(html)
+
+    for table in doc.iter('table'):
+        # map columns from the header, fall back to the usual order
+        headers = [cell.text_content().strip().lower() for cell in table.iter('th')]
+        columns = []
+        for header in headers:
+            columns.append(next((column for prefix, column in HEADER_COLUMNS if header.startswith(prefix)), None))
+        if not any(columns):
+            columns = ['voting_no', 'time', 'topic', 'vote']
+
+        for row in table.iter('tr'):
+            cells = [cell.text_content().strip() for cell in row.findall('td')]
+            if not cells:
+                continue
+
+            vote = dict(zip(columns, cells))
+            vote.pop(None, None)
+            if 'vote' not in vote:
+                continue
+
+            yield {
+                'voting_no': first_int(vote.get('voting_no')),
+                'time': vote.get('time'),
+                'topic': vote.get('topic'),
+                'vote': vote['vote'],
+                'result': vote.get('result'),
+            }
+
+
+# ----------------------------------- sink ----------------------------------- #
+
+
+class ParquetSink:
+    """
+    Streams rows into a parquet file, one bounded row group at a time.
+
+    The file is written under a temporary name and only renamed into place by
+    close(), so an interrupted crawl never leaves a partial file behind.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.rows = 0
+
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self._tmp_path = path + '.tmp'
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._writer = pq.ParquetWriter(self._tmp_path, vote_schema(), compression='zstd')
+
+    def write(self, rows):
+        for row in rows:
+            self._buffer.append(row)
+            if len(self._buffer) >= self._chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=vote_schema()))
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._writer.close()
+        os.remove(self._tmp_path)
+
+
+def votes_path(term, mp_id, folder=VOTES_FOLDER):
+    return os.path.join(folder, f'term={term}', f'votes_{mp_id}.parquet')
+
+
+def read_votes(path) -> list:
+    """
+    Read the vote rows of an MP's file written by an earlier crawl, cast to the current schema.
+
+    Returns:
+    - list: A dict per vote, empty if the MP was not scraped yet.
+    """
+    if not os.path.exists(path):
+        return []
+    return ds.dataset(path, schema=vote_schema(), format='parquet').to_table().to_pylist()
+
+
+def load_votes(folder=VOTES_FOLDER):
+    """
+    Open the votes dataset lazily, partitioned by term.
+
+    Returns:
+    - pyarrow.dataset.Dataset: Filter and project it before calling to_table().
+    """
+    require_dependencies()
+    # explicit schema -> files written before the result column and the date type are cast to it
+    return ds.dataset(folder, schema=dataset_schema(), format='parquet', partitioning='hive')
+
+
+# ---------------------------------- crawl ----------------------------------- #
+
+
+async def crawl_mp_votes(crawler, term, mp_id, sink, expired=False, known=()):
+    """
+    Crawl the sitting pages of an MP, streaming their votes to the sink.
+
+    Parameters:
+    - known (set): (sitting, date) of the sitting days already scraped, skipped.
+
+    Returns:
+    - int: Number of sitting days crawled.
+    """
+    listing_url = MP_Site(mp_id, term, expired).mp_voting_site
+    sittings = parse_sittings(await crawler.fetch(listing_url), listing_url)
+    sittings = [sitting for sitting in sittings if (sitting['sitting'], to_date(sitting['date'])) not in known]
+
+    async def job(sitting):
+        return await crawler.fetch(sitting['url'])
+
+    # bounded -> at most `concurrency` sitting pages wait for the sink
+    async for sitting, html, error in crawler.crawl(sittings, job, buffer=crawler.concurrency):
+        if error is not None:
+            raise error
+
+        date = to_date(sitting['date'])
+        sink.write(
+            {'mp_id': mp_id, 'sitting': sitting['sitting'], 'date': date, **vote}
+            for vote in iter_votes(html)
+        )
+
+    return len(sittings)
+
+
+async def crawl_votes(tasks, fetcher, checkpoint, args):
+    """
+    Crawl the votes of every (term, id) task, one MP file at a time.
+
+    An MP scraped before keeps the votes of its earlier sitting days, only
+    new ones are crawled; the newest known day is crawled again, it may have
+    been scraped while the sitting was still going on.
+    """
+    crawler = build_crawler(fetcher, args)
+
+    try:
+        for term, mp_id in tasks:
+            path = votes_path(term, mp_id, args.folder)
+            rows = read_votes(path)
+            last_date = max((row['date'] for row in rows if row['date'] is not None), default=None)
+            rows = [row for row in rows if row['date'] is None or row['date'] != last_date]
+
+            sink = ParquetSink(path, args.chunk_size)
+            try:
+                # earlier sitting days -> copied into the new file, not fetched again
+                sink.write(rows)
+                crawled = await crawl_mp_votes(crawler, term, mp_id, sink, args.expired,
+                                               known={(row['sitting'], row['date']) for row in rows})
+            except Exception as e:
+                sink.abort()
+                logging.error(f"Failed to scrape votes of MP index: {mp_id} of term {term} ({e})")
+                checkpoint.mark_failed(mp_id, e, term)
+                continue
+
+            sink.close()
+            checkpoint.mark_done(mp_id, term=term)
+            logging.info(f"Scraped {sink.rows - len(rows)} votes of {crawled} sitting days "
+                         f"of MP index: {mp_id} of term {term}, {sink.rows} in total")
+    finally:
+        logging.info(f"Throttle state: {crawler.throttle.state}")
+        crawler.close()
+
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description="Scrape voting records of Polish MPs from sejm.gov.pl")
+
+    add_common_args(parser, concurrency_help="number of sitting pages in flight")
+    parser.add_argument('--fetcher', choices=FETCHERS, default='http')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="vote rows buffered in memory before they are written")
+    parser.add_argument('--folder', default=VOTES_FOLDER,
+                        help="folder of the votes dataset")
+    parser.add_argument('--stale-days', type=float, default=DEFAULT_STALE_DAYS,
+                        help="revisit MPs whose votes were scraped more than this many days ago for new sittings")
+
+    return parser.parse_args()
+
+
+def main():
+
+    require_dependencies()
+
+    args = parse_args()
+
+    # resume index of MPs whose votes are complete
+    checkpoint = Checkpoint(STORE_PATH, table='votes_checkpoint')
+
+    # done MPs -> revisited for new sittings once stale
+    stale_after = datetime.timedelta(days=args.stale_days)
+
+    tasks = []
+    for term in args.terms:
+        ids = get_term_mp_ids(term, args.expired)
+        pending = checkpoint.pending(ids, term, only_failed=args.only_failed, stale_after=stale_after)
+        logging.info(f"Votes of {len(pending)} of {len(ids)} MPs of term {term} to scrape")
+        tasks.extend((term, mp_id) for mp_id in pending)
+
+    try:
+        # voting pages are rendered server side -> no markers, chrome is never needed
+        with open_fetcher(args, markers=(), wait_for=()) as (fetcher, args):
+            asyncio.run(crawl_votes(tasks, fetcher, checkpoint, args))
+    finally:
+        checkpoint.close()
+
+
+if __name__ == "__main__":
+
+    setup_logging()
+
+    main()